@@ -0,0 +1,156 @@
+"""
+Multi-Candidate SQL Generation
+Author: Mayank Goyal
+Reference: "Text-to-SQL Agents in Practice"
+
+Generates several SQL candidates concurrently (one deterministic, the rest at
+increasing temperatures), checks each statically, executes the valid ones in
+parallel on read-only connections and picks the candidate whose result set
+most other candidates agree on.
+"""
+
+import asyncio
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from agents.fast_path import fast_path_agent, fast_path_agent_async
+from agents.planning import planning_agent, planning_agent_async
+from agents.sql_generation import sql_generation_agent, sql_generation_agent_async
+from execution.run_query import execute_sql
+from execution.sql_repair import repair_sql
+from execution.static_verifier import static_verify
+from utils import tracing
+
+# Number of candidates per question (1 disables multi-candidate generation)
+PIPELINE_CANDIDATES = int(os.getenv("PIPELINE_CANDIDATES", "1"))
+CANDIDATE_TEMPERATURES = [
+    float(t) for t in os.getenv("CANDIDATE_TEMPERATURES", "0.0,0.4,0.7,1.0").split(",") if t.strip()
+]
+
+def candidate_temperatures(n: int) -> list:
+    """n temperatures, reusing the last configured one if n exceeds the list"""
+    temperatures = CANDIDATE_TEMPERATURES or [0.0]
+    return [temperatures[min(i, len(temperatures) - 1)] for i in range(n)]
+
+def result_signature(execution: dict) -> str:
+    """Order-insensitive fingerprint of a result set (column names are ignored)"""
+    rows = sorted(
+        repr(tuple(round(v, 6) if isinstance(v, float) else v for v in row))
+        for row in execution.get("rows", [])
+    )
+    digest = hashlib.sha256()
+    digest.update(str(len(execution.get("columns", []))).encode())
+    for row in rows:
+        digest.update(row.encode())
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+def _candidate(index: int, temperature: float, plan=None, sql=None, error=None) -> dict:
+    return {"index": index, "temperature": temperature, "plan": plan, "sql": sql, "error": error}
+
+def _error(e: Exception) -> str:
+    """Error text of a failed candidate; unexpected exceptions keep their type"""
+    return str(e) if isinstance(e, ValueError) else f"{type(e).__name__}: {str(e)}"
+
+def generate_candidates(question: str, schema_context: dict, n: int, use_fast_path: bool = True) -> list:
+    """
+    Generate n candidates in parallel threads; a failed generation (bad
+    output, provider error, timeout, ...) carries an error instead of raising
+    """
+    temperatures = candidate_temperatures(n)
+    plan = None if use_fast_path else planning_agent(question, schema_context)
+
+    def generate(index, temperature):
+        try:
+            if use_fast_path:
+                fused = fast_path_agent(question, schema_context, temperature=temperature)
+                return _candidate(index, temperature, fused["query_plan"], fused["sql"])
+            sql = sql_generation_agent(schema_context, plan, temperature=temperature)
+            return _candidate(index, temperature, plan, sql)
+        except Exception as e:
+            return _candidate(index, temperature, plan, error=_error(e))
+
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        futures = [
+            pool.submit(tracing.run_in_context(generate), i, t) for i, t in enumerate(temperatures)
+        ]
+        return [f.result() for f in futures]
+
+async def generate_candidates_async(question: str, schema_context: dict, n: int, use_fast_path: bool = True) -> list:
+    """Async variant of generate_candidates"""
+    temperatures = candidate_temperatures(n)
+    plan = None if use_fast_path else await planning_agent_async(question, schema_context)
+
+    async def generate(index, temperature):
+        try:
+            if use_fast_path:
+                fused = await fast_path_agent_async(question, schema_context, temperature=temperature)
+                return _candidate(index, temperature, fused["query_plan"], fused["sql"])
+            sql = await sql_generation_agent_async(schema_context, plan, temperature=temperature)
+            return _candidate(index, temperature, plan, sql)
+        except Exception as e:
+            return _candidate(index, temperature, plan, error=_error(e))
+
+    return list(await asyncio.gather(*(generate(i, t) for i, t in enumerate(temperatures))))
+
+def _check(db_path: str, candidate: dict) -> dict:
+    """Static check (with rule-based repair), then read-only execution of one candidate"""
+    if candidate["error"]:
+        return candidate
+    try:
+        return _check_sql(db_path, candidate)
+    except Exception as e:
+        candidate["error"] = _error(e)
+        return candidate
+
+def _check_sql(db_path: str, candidate: dict) -> dict:
+    static = static_verify(db_path, candidate["sql"], candidate["plan"])
+    repaired = repair_sql(db_path, candidate["sql"]) if static["errors"] else None
+    if repaired:
+        candidate["sql"] = repaired["sql"]
+        static = static_verify(db_path, candidate["sql"], candidate["plan"])
+    candidate["warnings"] = static["warnings"]
+    if static["errors"]:
+        candidate["error"] = "; ".join(static["errors"])
+        return candidate
+    execution = execute_sql(db_path, candidate["sql"])
+    candidate["execution"] = execution
+    if not execution["success"]:
+        candidate["error"] = execution["error"]
+    else:
+        candidate["signature"] = result_signature(execution)
+    return candidate
+
+def _select(candidates: list) -> dict | None:
+    """Winner by result-set agreement, then non-empty results, fewer warnings, lower temperature"""
+    groups = {}
+    for candidate in candidates:
+        if not candidate["error"]:
+            groups.setdefault(candidate["signature"], []).append(candidate)
+    if not groups:
+        tracing.set_attr("agreement", 0)
+        return None
+
+    def rank(group):
+        best = min(group, key=lambda c: (len(c["warnings"]), c["index"]))
+        return (len(group), best["execution"]["row_count"] > 0, -len(best["warnings"]), -best["index"])
+
+    group = max(groups.values(), key=rank)
+    winner = min(group, key=lambda c: (len(c["warnings"]), c["index"]))
+    winner["agreement"] = len(group)
+    tracing.set_attr("agreement", len(group))
+    tracing.set_attr("distinct_results", len(groups))
+    return winner
+
+def select_candidate(db_path: str, candidates: list) -> dict | None:
+    """Check and execute all candidates in parallel; returns the consensus winner or None"""
+    with tracing.span("candidate_selection", candidates=len(candidates)):
+        with ThreadPoolExecutor(max_workers=max(1, len(candidates))) as pool:
+            checked = list(pool.map(tracing.run_in_context(_check), [db_path] * len(candidates), candidates))
+        return _select(checked)
+
+async def select_candidate_async(db_path: str, candidates: list) -> dict | None:
+    """Async variant of select_candidate"""
+    with tracing.span("candidate_selection", candidates=len(candidates)):
+        checked = await asyncio.gather(*(asyncio.to_thread(_check, db_path, c) for c in candidates))
+        return _select(list(checked))
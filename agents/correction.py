@@ -5,7 +5,10 @@ Reference: "Text-to-SQL Agents in Practice"
 """
 
 import json
-from utils.llm import call_llm
+from utils.llm import call_llm, call_llm_async
+from utils.tracing import traced
+from utils import prompts
+from utils.prompt_compaction import json_section, plan_section, schema_section
 
 def clean_sql(sql: str) -> str:
     """Clean SQL by removing markdown backticks and extra whitespace"""
@@ -23,37 +26,33 @@ def clean_sql(sql: str) -> str:
         sql = sql[1:]
     return sql.strip()
 
-def correction_agent(
+def _build_prompts(
     schema_context: dict,
     query_plan: dict,
     sql: str,
     verification_issues: dict,
     execution_feedback: str = "",
     distinct_values: dict | None = None
-) -> dict:
-    system_prompt = open("prompts/correction.txt").read()
-
-    user_prompt = f"""
-SCHEMA CONTEXT
-{json.dumps(schema_context, indent=2)}
-
-QUERY PLAN
-{json.dumps(query_plan, indent=2)}
-
-GENERATED SQL
-{sql}
-
-VERIFICATION ISSUES
-{json.dumps(verification_issues, indent=2)}
+) -> tuple:
+    system_prompt = prompts.system_prompt("correction")
 
-EXECUTION FEEDBACK
-{execution_feedback or "None"}
+    # Execution errors arrive both as an issue and as feedback; send the text once
+    issues = verification_issues.get("issues", []) if isinstance(verification_issues, dict) else []
+    if execution_feedback and any(execution_feedback in str(issue) for issue in issues):
+        execution_feedback = "See verification issues"
 
-KNOWN DISTINCT VALUES
-{json.dumps(distinct_values, indent=2) if distinct_values else "None"}
-"""
+    user_prompt = prompts.render(
+        "user/correction",
+        schema_context=schema_section(schema_context, query_plan),
+        query_plan=plan_section(query_plan),
+        sql=sql,
+        verification_issues=json_section(verification_issues),
+        execution_feedback=execution_feedback or "None",
+        distinct_values=json_section(distinct_values) if distinct_values else "None"
+    )
+    return system_prompt, user_prompt
 
-    response = call_llm(system_prompt, user_prompt)
+def _parse_response(response: str) -> dict:
     result = json.loads(response)
     
     # Clean the corrected SQL if present
@@ -61,3 +60,33 @@ KNOWN DISTINCT VALUES
         result["corrected_sql"] = clean_sql(result["corrected_sql"])
     
     return result
+
+@traced("correction")
+def correction_agent(
+    schema_context: dict,
+    query_plan: dict,
+    sql: str,
+    verification_issues: dict,
+    execution_feedback: str = "",
+    distinct_values: dict | None = None
+) -> dict:
+    system_prompt, user_prompt = _build_prompts(
+        schema_context, query_plan, sql, verification_issues, execution_feedback, distinct_values
+    )
+    response = call_llm(system_prompt, user_prompt, agent="correction")
+    return _parse_response(response)
+
+@traced("correction")
+async def correction_agent_async(
+    schema_context: dict,
+    query_plan: dict,
+    sql: str,
+    verification_issues: dict,
+    execution_feedback: str = "",
+    distinct_values: dict | None = None
+) -> dict:
+    system_prompt, user_prompt = _build_prompts(
+        schema_context, query_plan, sql, verification_issues, execution_feedback, distinct_values
+    )
+    response = await call_llm_async(system_prompt, user_prompt, agent="correction")
+    return _parse_response(response)
@@ -0,0 +1,66 @@
+"""
+Fast Path Agent
+Author: Mayank Goyal
+Reference: "Text-to-SQL Agents in Practice"
+
+Plans the question and generates its SQL in a single LLM call. The pipeline
+falls back to the separate planning and SQL generation agents when the fused
+response cannot be parsed or its SQL fails verification.
+"""
+
+import json
+from utils.llm import call_llm, call_llm_async
+from utils.tracing import traced
+from utils import prompts
+from utils.prompt_compaction import schema_section
+from agents.sql_generation import STATEMENT_START, clean_sql, first_statement
+
+def extract_json(text):
+    """Extract JSON from text, handling markdown code blocks"""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("```")[1]
+        if text.startswith("json"):
+            text = text[4:]
+    text = text.strip()
+    return json.loads(text)
+
+def _build_prompts(question: str, schema_context: dict) -> tuple:
+    system_prompt = prompts.system_prompt("fast_path")
+    user_prompt = prompts.render(
+        "user/fast_path",
+        schema_context=schema_section(schema_context),
+        question=question
+    )
+    return system_prompt, user_prompt
+
+def _parse_response(response: str) -> dict:
+    """Split the fused response into query_plan and sql; raises ValueError if either is unusable"""
+    try:
+        data = extract_json(response)
+    except json.JSONDecodeError:
+        raise ValueError(f"Fast path returned invalid JSON. Raw: {response[:200]}")
+
+    plan = data.get("plan") if isinstance(data, dict) else None
+    raw_sql = data.get("sql") if isinstance(data, dict) else None
+    if not isinstance(plan, dict) or not plan:
+        raise ValueError("Fast path response has no plan.")
+    if not isinstance(raw_sql, str) or not STATEMENT_START.search("\n" + raw_sql.strip()):
+        raise ValueError(f"Fast path response has no SELECT query. Raw: {str(raw_sql)[:200]}")
+
+    sql = clean_sql(first_statement(raw_sql))
+    if sql.count(";") > 1:
+        raise ValueError(f"Fast path produced multiple queries. Raw: {sql}")
+    return {"query_plan": plan, "sql": sql}
+
+@traced("fast_path")
+def fast_path_agent(question: str, schema_context: dict, temperature: float = 0.0) -> dict:
+    system_prompt, user_prompt = _build_prompts(question, schema_context)
+    response = call_llm(system_prompt, user_prompt, temperature, agent="fast_path")
+    return _parse_response(response)
+
+@traced("fast_path")
+async def fast_path_agent_async(question: str, schema_context: dict, temperature: float = 0.0) -> dict:
+    system_prompt, user_prompt = _build_prompts(question, schema_context)
+    response = await call_llm_async(system_prompt, user_prompt, temperature, agent="fast_path")
+    return _parse_response(response)
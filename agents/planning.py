@@ -5,7 +5,10 @@ Reference: "Text-to-SQL Agents in Practice"
 """
 
 import json
-from utils.llm import call_llm
+from utils.llm import call_llm, call_llm_async
+from utils.tracing import traced
+from utils import prompts
+from utils.prompt_compaction import schema_section
 
 def extract_json(text):
     """Extract JSON from text, handling markdown code blocks"""
@@ -17,19 +20,16 @@ def extract_json(text):
     text = text.strip()
     return json.loads(text)
 
-def planning_agent(question: str, schema_context: dict) -> dict:
-    system_prompt = open("prompts/planning.txt").read()
-
-    user_prompt = f"""
-SCHEMA CONTEXT (approved tables and columns):
-{json.dumps(schema_context, indent=2)}
-
-QUESTION
-{question}
-
-Return JSON only:"""
+def _build_prompts(question: str, schema_context: dict) -> tuple:
+    system_prompt = prompts.system_prompt("planning")
+    user_prompt = prompts.render(
+        "user/planning",
+        schema_context=schema_section(schema_context),
+        question=question
+    )
+    return system_prompt, user_prompt
 
-    response = call_llm(system_prompt, user_prompt)
+def _parse_response(question: str, response: str) -> dict:
     try:
         return extract_json(response)
     except json.JSONDecodeError as e:
@@ -43,3 +43,15 @@ Return JSON only:"""
             "grouping": [],
             "ambiguities": ["Unable to parse agent response"]
         }
+
+@traced("planning")
+def planning_agent(question: str, schema_context: dict) -> dict:
+    system_prompt, user_prompt = _build_prompts(question, schema_context)
+    response = call_llm(system_prompt, user_prompt, agent="planning")
+    return _parse_response(question, response)
+
+@traced("planning")
+async def planning_agent_async(question: str, schema_context: dict) -> dict:
+    system_prompt, user_prompt = _build_prompts(question, schema_context)
+    response = await call_llm_async(system_prompt, user_prompt, agent="planning")
+    return _parse_response(question, response)
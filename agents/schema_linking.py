@@ -2,10 +2,30 @@
 Schema Linking Agent
 Author: Mayank Goyal
 Reference: "Text-to-SQL Agents in Practice"
+
+When a database path is given, the local schema index (utils.schema_index)
+links the question first; the LLM is only asked when the local confidence is
+below SCHEMA_LINK_CONFIDENCE. The LLM sees the schema pruned to the tables
+most relevant to the question (utils.schema_pruning), within
+SCHEMA_PRUNE_TOKEN_BUDGET tokens. Its relationships are then replaced by the
+foreign-key join tree of the tables it picked (utils.join_graph), with any
+bridge tables added, so join paths do not depend on the LLM.
 """
 
+import asyncio
 import json
-from utils.llm import call_llm
+import os
+from utils.llm import call_llm, call_llm_async
+from utils.tracing import traced
+from utils import prompts, tracing
+from utils.join_graph import JOIN_PATHS_ENABLED, get_join_graph
+from utils.schema_index import get_schema_index
+from utils.schema_pruning import SCHEMA_PRUNING_ENABLED, prune_schema
+from utils.value_index import get_value_index
+
+# "auto" (local index, LLM below the confidence threshold), "llm" or "local"
+SCHEMA_LINKER = os.getenv("SCHEMA_LINKER", "auto").lower()
+SCHEMA_LINK_CONFIDENCE = float(os.getenv("SCHEMA_LINK_CONFIDENCE", "0.8"))
 
 def extract_json(text):
     """Extract JSON from text, handling markdown code blocks and comments"""
@@ -39,19 +59,22 @@ def extract_json(text):
     
     return json.loads(text)
 
-def schema_linking_agent(question: str, schema: str) -> dict:
-    system_prompt = open("prompts/schema_linking.txt").read()
-
-    user_prompt = f"""
-DATABASE SCHEMA
-{schema}
-
-QUESTION
-{question}
+def _build_prompts(question: str, schema: str) -> tuple:
+    system_prompt = prompts.system_prompt("schema_linking")
+    user_prompt = prompts.render("user/schema_linking", schema=schema, question=question)
+    return system_prompt, user_prompt
 
-Return JSON only:"""
+def _linker_schema(question: str, schema: str, db_path: str | None) -> str:
+    """Schema text for the LLM linker: pruned for the question when possible"""
+    if not db_path or not SCHEMA_PRUNING_ENABLED:
+        return schema
+    try:
+        return prune_schema(db_path, question)
+    except Exception as e:
+        print(f"Warning: Schema pruning failed ({str(e)}). Using the full schema.")
+        return schema
 
-    response = call_llm(system_prompt, user_prompt)
+def _parse_response(response: str) -> dict:
     try:
         return extract_json(response)
     except json.JSONDecodeError as e:
@@ -62,3 +85,80 @@ Return JSON only:"""
             "relationships": [],
             "ambiguities": ["Unable to parse agent response"]
         }
+
+def _with_join_paths(context: dict, db_path: str | None) -> dict:
+    """
+    Relationships from the FK join tree of the linked tables, bridge tables
+    added with their key columns; unchanged unless all tables are FK-connected.
+    The linker's relationships are kept when the tree has none (e.g. a single
+    table without a self reference).
+    """
+    if not db_path or not JOIN_PATHS_ENABLED:
+        return context
+    table_key = "tables" if "tables" in context else "relevant_tables"
+    column_key = "columns" if "columns" in context else "relevant_columns"
+    tables = [t for t in context.get(table_key) or [] if isinstance(t, str)]
+    if not tables:
+        return context
+    try:
+        tree = get_join_graph(db_path).connect(tables)
+    except Exception as e:
+        print(f"Warning: Join path lookup failed ({str(e)}). Keeping the linker's relationships.")
+        return context
+    if tree["unknown"] or not tree["connected"]:
+        return context
+
+    context = dict(context)
+    context[table_key] = tables + tree["bridges"]
+    if tree["relationships"]:
+        context["relationships"] = tree["relationships"]
+    columns = context.get(column_key)
+    if tree["bridges"] and isinstance(columns, dict):
+        columns = dict(columns)
+        for bridge in tree["bridges"]:
+            columns[bridge] = list(dict.fromkeys(
+                ref.split(".", 1)[1] for fk in tree["relationships"] for ref in (fk["from"], fk["to"])
+                if ref.split(".", 1)[0] == bridge
+            ))
+        context[column_key] = columns
+    tracing.set_attr("join_path_bridges", len(tree["bridges"]))
+    return context
+
+def _link_locally(question: str, db_path: str | None) -> dict | None:
+    """Schema context from the local index, or None if the LLM linker should be used"""
+    if not db_path or SCHEMA_LINKER == "llm":
+        return None
+    try:
+        result = get_schema_index(db_path).link(question, value_index=get_value_index(db_path))
+    except Exception as e:
+        print(f"Warning: Local schema linking failed ({str(e)}). Using the LLM linker.")
+        return None
+
+    tracing.set_attr("local_confidence", result["confidence"])
+    if not result["schema_context"]["tables"]:
+        return None
+    if SCHEMA_LINKER != "local" and result["confidence"] < SCHEMA_LINK_CONFIDENCE:
+        return None
+    tracing.set_attr("linker", "local")
+    return result["schema_context"]
+
+@traced("schema_linking")
+def schema_linking_agent(question: str, schema: str, db_path: str | None = None) -> dict:
+    local = _link_locally(question, db_path)
+    if local is not None:
+        return local
+
+    system_prompt, user_prompt = _build_prompts(question, _linker_schema(question, schema, db_path))
+    response = call_llm(system_prompt, user_prompt, agent="schema_linking")
+    return _with_join_paths(_parse_response(response), db_path)
+
+@traced("schema_linking")
+async def schema_linking_agent_async(question: str, schema: str, db_path: str | None = None) -> dict:
+    local = await asyncio.to_thread(_link_locally, question, db_path)
+    if local is not None:
+        return local
+
+    schema = await asyncio.to_thread(_linker_schema, question, schema, db_path)
+    system_prompt, user_prompt = _build_prompts(question, schema)
+    response = await call_llm_async(system_prompt, user_prompt, agent="schema_linking")
+    return await asyncio.to_thread(_with_join_paths, _parse_response(response), db_path)
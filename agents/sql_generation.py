@@ -4,8 +4,23 @@ Author: Mayank Goyal
 Reference: "Text-to-SQL Agents in Practice"
 """
 
-from utils.llm import call_llm
-import json
+from utils.llm import call_llm, call_llm_async
+from utils.logging import get_logger
+from utils.tracing import traced
+from utils import prompts
+from utils.prompt_compaction import plan_section, schema_section
+import os
+import re
+
+logger = get_logger()
+
+# Stream generation and stop as soon as a complete statement has been produced
+SQL_GENERATION_STREAMING = os.getenv("SQL_GENERATION_STREAMING", "true").lower() in ("1", "true", "yes")
+
+STATEMENT_START = re.compile(
+    r"(?:^|\n)[ \t]*(SELECT\b|WITH\s+(?:RECURSIVE\s+)?\w+\s*(?:\([^)]*\)\s*)?AS\b)",
+    re.IGNORECASE
+)
 
 def clean_sql(sql: str) -> str:
     """Clean SQL by removing markdown backticks, extra whitespace, and explanatory text"""
@@ -72,42 +87,141 @@ def clean_sql(sql: str) -> str:
     
     return result.strip()
 
-def sql_generation_agent(
+class IncrementalSQLExtractor:
+    """
+    Detects the end of the first SQL statement in a streamed response.
+
+    feed() each text delta; it returns True once a statement-terminating ';' or a
+    closing code fence has been seen outside string literals and comments, which
+    is the point where clean_sql would discard everything that follows.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.complete = False
+        self._start = None  # index where the statement begins
+        self._end = None    # index just past the statement once complete
+        self._pos = 0       # next unscanned index
+        self._state = "code"
+
+    def feed(self, chunk: str) -> bool:
+        if self.complete:
+            return True
+        self.buffer += chunk
+        while not self.complete:
+            if self._start is None:
+                match = STATEMENT_START.search(self.buffer, self._pos)
+                if not match:
+                    return False
+                self._start = self._pos = match.start(1)
+            if not self._scan():
+                break
+        return self.complete
+
+    def _scan(self) -> bool:
+        """Scan buffered text; returns True if the statement start must be searched again"""
+        buf = self.buffer
+        i = self._pos
+        while i < len(buf):
+            c = buf[i]
+            nxt = buf[i + 1] if i + 1 < len(buf) else None
+            state = self._state
+            if state == "code":
+                if c == ";":
+                    self.complete = True
+                    self._end = i + 1
+                    i += 1
+                    break
+                if c == "`":
+                    if len(buf) - i < 3:
+                        break  # wait for the rest of a possible fence
+                    if buf.startswith("```", i):
+                        if "```" in buf[:self._start]:
+                            self.complete = True
+                            self._end = i
+                            break
+                        # An opening fence: what we took for SQL was prose
+                        self._start = None
+                        self._pos = i + 3
+                        return True
+                elif c in "-/":
+                    if nxt is None:
+                        break
+                    if c == "-" and nxt == "-":
+                        self._state = "line_comment"
+                        i += 1
+                    elif c == "/" and nxt == "*":
+                        self._state = "block_comment"
+                        i += 1
+                elif c == "'":
+                    self._state = "single_quote"
+                elif c == '"':
+                    self._state = "double_quote"
+            elif state in ("single_quote", "double_quote"):
+                quote = "'" if state == "single_quote" else '"'
+                if c == quote:
+                    if nxt is None:
+                        break  # could be an escaped quote
+                    if nxt == quote:
+                        i += 1
+                    else:
+                        self._state = "code"
+            elif state == "line_comment":
+                if c == "\n":
+                    self._state = "code"
+            elif state == "block_comment":
+                if c == "*":
+                    if nxt is None:
+                        break
+                    if nxt == "/":
+                        self._state = "code"
+                        i += 1
+            i += 1
+        self._pos = i
+        return False
+
+    @property
+    def statement(self) -> str:
+        """The detected statement text, or the raw buffer if no statement start was found"""
+        if self._start is None:
+            return self.buffer
+        return self.buffer[self._start:self._end]
+
+def first_statement(text: str) -> str:
+    """Trim a complete response to its first SQL statement (see IncrementalSQLExtractor)"""
+    extractor = IncrementalSQLExtractor()
+    extractor.feed(text)
+    return extractor.statement
+
+def _build_prompts(
     schema_context: dict,
     query_plan: dict,
-    retrieved_examples: str = "",
     previous_sql: str = "",
     error_feedback: str = ""
-) -> str:
-    system_prompt = open("prompts/sql_generation.txt").read()
+) -> tuple:
+    system_prompt = prompts.system_prompt("sql_generation")
 
     error_context = ""
     if previous_sql and error_feedback:
-        error_context = f"""
-
-PREVIOUS ATTEMPT THAT FAILED:
-SQL: {previous_sql}
-Error: {error_feedback}
-
-Generate a corrected SQL query that fixes the above error."""
+        error_context = prompts.render(
+            "user/sql_generation_error", previous_sql=previous_sql, error_feedback=error_feedback
+        )
 
-    user_prompt = f"""
-APPROVED TABLES AND COLUMNS:
-{json.dumps(schema_context, indent=2)}
+    user_prompt = prompts.render(
+        "user/sql_generation",
+        schema_context=schema_section(schema_context, query_plan),
+        query_plan=plan_section(query_plan),
+        error_context=error_context
+    )
+    return system_prompt, user_prompt
 
-PLAN TO IMPLEMENT:
-{json.dumps(query_plan, indent=2)}{error_context}
-
-Write SQLite SQL that implements this plan. Return ONLY the SQL query, nothing else:"""
-
-    raw_response = call_llm(system_prompt, user_prompt).strip()
-    print(f"\n[DEBUG] Raw LLM Response (length: {len(raw_response)}):")
-    print(f"[DEBUG] {repr(raw_response[:500])}")  # Print first 500 chars with repr to see whitespace
-    print(f"[DEBUG] Full response:\n{raw_response}\n")
+def _parse_response(raw_response: str) -> str:
+    raw_response = raw_response.strip()
+    logger.debug(f"Raw LLM Response (length: {len(raw_response)}): {repr(raw_response[:500])}")
+    logger.debug(f"Full response:\n{raw_response}")
     
-    cleaned = clean_sql(raw_response)
-    print(f"[DEBUG] Cleaned SQL (length: {len(cleaned)}):")
-    print(f"[DEBUG] {cleaned}\n")
+    cleaned = clean_sql(first_statement(raw_response))
+    logger.debug(f"Cleaned SQL (length: {len(cleaned)}): {cleaned}")
     
     # Check if multiple queries were detected
     semicolon_count = cleaned.count(';')
@@ -115,3 +229,30 @@ Write SQLite SQL that implements this plan. Return ONLY the SQL query, nothing e
         raise ValueError(f"SQL generator produced multiple queries or invalid format. This agent generates ONLY single queries. If your question requires multiple queries, rephrase it as a single combined query. Raw: {cleaned}")
     
     return cleaned
+
+@traced("sql_generation")
+def sql_generation_agent(
+    schema_context: dict,
+    query_plan: dict,
+    retrieved_examples: str = "",
+    previous_sql: str = "",
+    error_feedback: str = "",
+    temperature: float = 0.0
+) -> str:
+    system_prompt, user_prompt = _build_prompts(schema_context, query_plan, previous_sql, error_feedback)
+    # A fresh extractor per stream attempt: a failed stream must not leave its state behind
+    stop_factory = (lambda: IncrementalSQLExtractor().feed) if SQL_GENERATION_STREAMING else None
+    return _parse_response(call_llm(system_prompt, user_prompt, temperature, agent="sql_generation", stop_factory=stop_factory))
+
+@traced("sql_generation")
+async def sql_generation_agent_async(
+    schema_context: dict,
+    query_plan: dict,
+    retrieved_examples: str = "",
+    previous_sql: str = "",
+    error_feedback: str = "",
+    temperature: float = 0.0
+) -> str:
+    system_prompt, user_prompt = _build_prompts(schema_context, query_plan, previous_sql, error_feedback)
+    stop_factory = (lambda: IncrementalSQLExtractor().feed) if SQL_GENERATION_STREAMING else None
+    return _parse_response(await call_llm_async(system_prompt, user_prompt, temperature, agent="sql_generation", stop_factory=stop_factory))
@@ -2,10 +2,26 @@
 Verification Agent
 Author: Mayank Goyal
 Reference: "Text-to-SQL Agents in Practice"
+
+When a database path is given, the static verifier (execution.static_verifier)
+runs first. Static errors make the SQL invalid without an LLM call; the LLM
+only checks semantics when VERIFICATION_MODE asks for it (see below).
 """
 
+import asyncio
 import json
-from utils.llm import call_llm
+import os
+from execution.static_verifier import static_verify
+from utils.llm import call_llm, call_llm_async
+from utils.tracing import traced
+from utils import prompts, tracing
+from utils.prompt_compaction import plan_section, schema_section
+
+# "auto": LLM check only if static checks warn or the query is complex
+# "llm": LLM check after every static pass; "static": never call the LLM
+VERIFICATION_MODE = os.getenv("VERIFICATION_MODE", "auto").lower()
+# Joins + subqueries + set operations from which "auto" still asks the LLM
+VERIFICATION_LLM_COMPLEXITY = int(os.getenv("VERIFICATION_LLM_COMPLEXITY", "3"))
 
 def extract_json(text):
     """Extract JSON from text, handling markdown code blocks"""
@@ -17,33 +33,88 @@ def extract_json(text):
     text = text.strip()
     return json.loads(text)
 
+def _build_prompts(schema_context: dict, query_plan: dict, sql: str) -> tuple:
+    system_prompt = prompts.system_prompt("verification")
+    user_prompt = prompts.render(
+        "user/verification",
+        schema_context=schema_section(schema_context, query_plan),
+        query_plan=plan_section(query_plan),
+        sql=sql
+    )
+    return system_prompt, user_prompt
+
+def _parse_response(response: str, static: dict | None = None) -> dict:
+    try:
+        verification = extract_json(response)
+    except json.JSONDecodeError as e:
+        print(f"Warning: Verification agent returned invalid JSON. Raw:\n{response[:200]}")
+        # Unparseable is not a pass: only static checks (if they ran) can vouch for the SQL
+        return {
+            "is_valid": static is not None,
+            "issues": ["Verification agent returned invalid JSON; semantic checks were not performed"],
+            "severity": "non_critical",
+            "checked_by": "static" if static is not None else "none"
+        }
+    verification["checked_by"] = "static+llm" if static is not None else "llm"
+    return verification
+
+def _static_verdict(db_path: str | None, query_plan: dict, sql: str):
+    """
+    Run the static checks; returns (static result, verdict). The verdict is the
+    final verification dict when no LLM call is needed, else None.
+    """
+    if not db_path:
+        return None, None
+    static = static_verify(db_path, sql, query_plan)
+    if static["errors"]:
+        tracing.set_attr("checked_by", "static")
+        return static, {
+            "is_valid": False,
+            "issues": static["errors"] + static["warnings"],
+            "severity": "critical",
+            "checked_by": "static"
+        }
+
+    needs_llm = VERIFICATION_MODE == "llm" or (
+        VERIFICATION_MODE == "auto"
+        and (static["warnings"] or static["complexity"] >= VERIFICATION_LLM_COMPLEXITY)
+    )
+    if needs_llm:
+        return static, None
+    tracing.set_attr("checked_by", "static")
+    return static, {
+        "is_valid": True,
+        "issues": static["warnings"],
+        "severity": "non_critical",
+        "checked_by": "static"
+    }
+
+@traced("verification")
 def verification_agent(
     schema_context: dict,
     query_plan: dict,
-    sql: str
+    sql: str,
+    db_path: str | None = None
 ) -> dict:
-    system_prompt = open("prompts/verification.txt").read()
+    static, verdict = _static_verdict(db_path, query_plan, sql)
+    if verdict is not None:
+        return verdict
 
-    user_prompt = f"""
-SCHEMA CONTEXT
-{json.dumps(schema_context, indent=2)}
+    system_prompt, user_prompt = _build_prompts(schema_context, query_plan, sql)
+    response = call_llm(system_prompt, user_prompt, agent="verification")
+    return _parse_response(response, static)
 
-QUERY PLAN
-{json.dumps(query_plan, indent=2)}
-
-GENERATED SQL
-{sql}
-
-OUTPUT ONLY VALID JSON. NO MARKDOWN, NO EXTRA TEXT.
-"""
+@traced("verification")
+async def verification_agent_async(
+    schema_context: dict,
+    query_plan: dict,
+    sql: str,
+    db_path: str | None = None
+) -> dict:
+    static, verdict = await asyncio.to_thread(_static_verdict, db_path, query_plan, sql)
+    if verdict is not None:
+        return verdict
 
-    response = call_llm(system_prompt, user_prompt)
-    try:
-        return extract_json(response)
-    except json.JSONDecodeError as e:
-        print(f"Warning: Verification agent returned invalid JSON. Raw:\n{response[:200]}")
-        return {
-            "is_valid": True,
-            "issues": [],
-            "severity": "non_critical"
-        }
+    system_prompt, user_prompt = _build_prompts(schema_context, query_plan, sql)
+    response = await call_llm_async(system_prompt, user_prompt, agent="verification")
+    return _parse_response(response, static)
@@ -0,0 +1,253 @@
+"""
+Columnar Query Results
+Author: Mayank Goyal
+Reference: "Text-to-SQL Agents in Practice"
+
+Compact result layout: one sequence per column instead of a dict (or tuple)
+per row. Integer and real columns are stored in array.array ('q' / 'd') with
+a null mask when they contain NULLs; other columns stay lists. Rows are
+materialized only on demand, as small __slots__ views over the columns.
+
+Usage:
+    result = execute_sql(db_path, sql, layout="columnar")
+    table = result["columnar"]
+    table["Total"]        # array('d', [...])
+    table.row(0)["Name"]  # row view
+    table.to_csv()
+"""
+
+import csv
+import io
+import json
+import sys
+from array import array
+from collections.abc import Mapping
+
+INT64_MIN, INT64_MAX = -(2 ** 63), 2 ** 63 - 1
+
+class Column:
+    """Values of one column; typed array storage while the values allow it"""
+
+    __slots__ = ("values", "nulls")
+
+    def __init__(self):
+        self.values = None  # array('q'), array('d') or list, chosen by the first non-null value
+        self.nulls = None   # bytearray mask, only once a NULL is seen (before or in an array column)
+
+    def extend(self, values):
+        start = 0
+        while self.values is None and start < len(values):
+            self.append(values[start])
+            start += 1
+        rest = values[start:]
+        current = self.values
+        if isinstance(current, list):
+            current.extend(rest)
+            return
+        if current is not None and self.nulls is None:
+            # Whole batch in one typed copy; anything that does not fit goes value by value
+            try:
+                if current.typecode == "d" and not all(type(v) is float for v in rest):
+                    raise TypeError
+                current.extend(array(current.typecode, rest))
+                return
+            except (TypeError, OverflowError):
+                pass
+        for value in rest:
+            self.append(value)
+
+    def append(self, value):
+        values = self.values
+        if values is None:
+            if value is None:
+                if self.nulls is None:
+                    self.nulls = bytearray()
+                self.nulls.append(1)
+                return
+            values = self.values = self._storage_for(value)
+            if self.nulls is not None:  # leading NULLs
+                if isinstance(values, list):
+                    values.extend([None] * len(self.nulls))
+                    self.nulls = None
+                else:
+                    values.extend([0] * len(self.nulls))
+        if value is None:
+            if isinstance(values, list):
+                values.append(None)
+                return
+            if self.nulls is None:
+                self.nulls = bytearray(len(values))
+            self.nulls.append(1)
+            values.append(0)
+            return
+        if isinstance(values, array):
+            if not self._fits(values, value):
+                self._to_list()
+                self.values.append(value)
+                return
+            if self.nulls is not None:
+                self.nulls.append(0)
+        values.append(value)
+
+    @staticmethod
+    def _storage_for(value):
+        if type(value) is int and INT64_MIN <= value <= INT64_MAX:
+            return array("q")
+        if type(value) is float:
+            return array("d")
+        return []
+
+    @staticmethod
+    def _fits(values: array, value) -> bool:
+        if values.typecode == "q":
+            return type(value) is int and INT64_MIN <= value <= INT64_MAX
+        return type(value) is float
+
+    def _to_list(self):
+        """Fall back to a list once a value does not fit the array type"""
+        values = list(self.values)
+        if self.nulls is not None:
+            values = [None if null else v for v, null in zip(values, self.nulls)]
+        self.values, self.nulls = values, None
+
+    def __len__(self):
+        if self.values is None:
+            return len(self.nulls) if self.nulls is not None else 0
+        return len(self.values)
+
+    def __getitem__(self, index):
+        if self.nulls is not None and self.nulls[index]:
+            return None
+        return self.values[index]
+
+    def to_list(self) -> list:
+        if self.values is None:
+            return [None] * len(self)
+        if self.nulls is None:
+            return list(self.values)
+        return [None if null else v for v, null in zip(self.values, self.nulls)]
+
+    def nbytes(self) -> int:
+        if self.values is None:
+            return len(self)
+        if isinstance(self.values, array):
+            size = self.values.itemsize * len(self.values)
+            return size + (len(self.nulls) if self.nulls is not None else 0)
+        size = sys.getsizeof(self.values)
+        for value in self.values:
+            size += len(value) + 49 if isinstance(value, (str, bytes)) else 24 if value is not None else 0
+        return size
+
+class Row:
+    """Read-only view of one row; indexable by position or column name"""
+
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, table: "ColumnarResult", index: int):
+        self._table = table
+        self._index = index
+
+    def __getitem__(self, key):
+        table = self._table
+        if isinstance(key, str):
+            key = table.positions[key]
+        return table.columns_data[key][self._index]
+
+    def __len__(self):
+        return len(self._table.columns)
+
+    def __iter__(self):
+        index = self._index
+        return (column[index] for column in self._table.columns_data)
+
+    def as_tuple(self) -> tuple:
+        return tuple(self)
+
+    def as_dict(self) -> dict:
+        return dict(zip(self._table.columns, self))
+
+    def __eq__(self, other):
+        if isinstance(other, Row):
+            other = other.as_tuple()
+        return self.as_tuple() == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Row({self.as_dict()!r})"
+
+class ColumnarResult(Mapping):
+    """Column name -> values mapping of a result set, with row views on demand"""
+
+    __slots__ = ("columns", "positions", "columns_data")
+
+    def __init__(self, columns: list):
+        self.columns = list(columns)
+        self.positions = {name: i for i, name in enumerate(self.columns)}
+        self.columns_data = [Column() for _ in self.columns]
+
+    @classmethod
+    def from_rows(cls, columns: list, rows) -> "ColumnarResult":
+        table = cls(columns)
+        table.extend_rows(rows)
+        return table
+
+    def extend_rows(self, rows):
+        """Append row tuples (e.g. one cursor.fetchmany batch)"""
+        for i, values in enumerate(zip(*rows)):
+            self.columns_data[i].extend(values)
+
+    # Mapping over columns: table["Name"] -> values
+    def __getitem__(self, name):
+        column = self.columns_data[self.positions[name]]
+        return column.values if column.nulls is None and column.values is not None else column.to_list()
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def __len__(self):
+        return len(self.columns)
+
+    @property
+    def row_count(self) -> int:
+        return len(self.columns_data[0]) if self.columns_data else 0
+
+    def row(self, index: int) -> Row:
+        if not -self.row_count <= index < self.row_count:
+            raise IndexError(index)
+        return Row(self, index % self.row_count)
+
+    def rows(self):
+        """Row views, created one at a time"""
+        return (Row(self, i) for i in range(self.row_count))
+
+    def tuples(self) -> list:
+        return list(zip(*(column.to_list() for column in self.columns_data))) if self.columns_data else []
+
+    def records(self) -> list:
+        return [dict(zip(self.columns, row)) for row in self.tuples()]
+
+    def to_json(self, orient: str = "columns") -> str:
+        """JSON text: {"columns": [...], "data": {name: values}} or, with orient="records", [{...}, ...]"""
+        if orient == "records":
+            return json.dumps(self.records(), default=str)
+        return json.dumps({
+            "columns": self.columns,
+            "data": {name: column.to_list() for name, column in zip(self.columns, self.columns_data)}
+        }, default=str)
+
+    def to_csv(self, file=None) -> str | None:
+        """Write CSV (header + rows) to file, or return it as a string"""
+        out = file or io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(self.columns)
+        for row in self.rows():
+            writer.writerow(row)
+        return None if file else out.getvalue()
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the column data"""
+        return sum(column.nbytes() for column in self.columns_data)
+
+    def __repr__(self):
+        return f"ColumnarResult(columns={self.columns!r}, rows={self.row_count})"
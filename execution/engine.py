@@ -0,0 +1,126 @@
+"""
+SQLite Execution Engine
+Author: Mayank Goyal
+Reference: "Text-to-SQL Agents in Practice"
+
+Pool of read-only connections per database file. Connections are opened
+with a mode=ro URI and PRAGMA query_only, tuned once (page cache, mmap,
+in-memory temp store) and kept warm between queries, so the schema is
+parsed once per connection and each connection's prepared-statement cache
+is reused. A connection is checked out by one thread at a time, which makes
+the pool safe to share across threads and asyncio.to_thread workers.
+
+Usage:
+    from execution import engine
+    with engine.connection("data/chinook.db") as conn:
+        rows = conn.execute("SELECT Name FROM Artist").fetchall()
+"""
+
+import atexit
+import os
+import sqlite3
+import threading
+from collections import deque
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "8"))                   # idle connections kept per database
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))       # page cache per connection
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # bytes, 0 disables mmap
+SQLITE_STATEMENT_CACHE = int(os.getenv("SQLITE_STATEMENT_CACHE", "256"))     # prepared statements per connection
+
+def read_only_connection(db_path: str) -> sqlite3.Connection:
+    """New tuned read-only connection (prefer connection() to reuse pooled ones)"""
+    conn = sqlite3.connect(
+        f"file:{os.path.abspath(db_path)}?mode=ro",
+        uri=True,
+        check_same_thread=False,
+        cached_statements=SQLITE_STATEMENT_CACHE
+    )
+    conn.execute("PRAGMA query_only = ON")
+    conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+class ConnectionPool:
+    """Idle read-only connections to one database, handed out one thread at a time"""
+
+    def __init__(self, db_path: str, size: int = SQLITE_POOL_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+
+    def acquire(self) -> sqlite3.Connection:
+        with self._lock:
+            if self._idle:
+                self.reused += 1
+                return self._idle.pop()
+            self.opened += 1
+        return read_only_connection(self.db_path)
+
+    def release(self, conn: sqlite3.Connection, broken: bool = False):
+        """Return a connection to the pool (closed instead if broken or the pool is full)"""
+        if not broken:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                broken = True
+        with self._lock:
+            if not broken and len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+        except (sqlite3.InterfaceError, sqlite3.ProgrammingError):
+            broken = True
+            raise
+        finally:
+            self.release(conn, broken)
+
+    def close(self):
+        with self._lock:
+            while self._idle:
+                self._idle.pop().close()
+
+    def stats(self) -> dict:
+        return {"opened": self.opened, "reused": self.reused, "idle": len(self._idle)}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_path: str) -> ConnectionPool:
+    """Process-wide pool for a database file"""
+    key = os.path.abspath(db_path)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(key)
+    return pool
+
+def connection(db_path: str):
+    """Context manager lending a pooled read-only connection"""
+    return get_pool(db_path).connection()
+
+def close_pools():
+    """Close every pooled connection (called automatically at exit)"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+atexit.register(close_pools)
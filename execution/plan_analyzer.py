@@ -0,0 +1,564 @@
+"""
+Query Plan Analyzer and Index Advisor
+Author: Mayank Goyal
+Reference: "Text-to-SQL Agents in Practice"
+
+Runs EXPLAIN QUERY PLAN on generated SQL (nothing executes) and flags what
+makes SQLite slow on larger databases:
+- full table scans, especially inside a join loop
+- automatic indexes SQLite builds on every run
+- temporary B-trees for ORDER BY / GROUP BY / DISTINCT
+- correlated subqueries re-run for each outer row
+
+Cost is a rough count of rows visited: nested loops multiply, PK lookups
+cost log2(rows), index lookups add their fan-out (sqlite_stat1 when the
+database has been analyzed, otherwise a fixed guess). The pipeline analyzes
+every statement before it runs (cached per normalized SQL and schema
+version) and records the findings on the trace. They are passed to the
+correction agent as performance feedback when the query breaches a resource
+guard or its estimated cost reaches PLAN_FEEDBACK_MIN_COST.
+
+The offline advisor aggregates plans across the query memory and recommends
+covering indexes; with --shadow it creates them in a copy of the database
+and reports the estimated cost before and after.
+
+Usage:
+    python -m execution.plan_analyzer data/chinook.db "SELECT ..."
+    python -m execution.plan_analyzer data/chinook.db --advise [--shadow data/chinook_shadow.db] [queries.json|.sql ...]
+"""
+
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from dotenv import load_dotenv
+from execution import engine
+from execution.result_cache import normalize_sql
+from execution.static_verifier import get_catalog, table_refs, token_spans, tokenize
+from utils import schema_catalog, tracing
+
+load_dotenv()
+
+PLAN_ANALYSIS_ENABLED = os.getenv("PLAN_ANALYSIS_ENABLED", "true").lower() in ("1", "true", "yes")
+PLAN_MIN_SCAN_ROWS = int(os.getenv("PLAN_MIN_SCAN_ROWS", "1000"))  # smaller scans and sorts are not reported
+# Estimated row visits from which findings reach the correction agent without a tripped guard
+PLAN_FEEDBACK_MIN_COST = int(os.getenv("PLAN_FEEDBACK_MIN_COST", "100000"))
+
+# Execution failures the query plan can explain
+PERFORMANCE_ERROR_TYPES = {"timeout", "vm_budget", "too_many_rows"}
+
+# Rows per key assumed for a non-unique index lookup without sqlite_stat1
+DEFAULT_INDEX_FANOUT = 10
+# Share of a table a range lookup (col > ?) is assumed to return
+RANGE_SELECTIVITY = 0.25
+# Widest index the advisor recommends (key plus covered columns)
+MAX_INDEX_COLUMNS = 5
+# Analyses kept per process (statements planned so far)
+PLAN_CACHE_SIZE = 1024
+
+SEED_QUERIES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                 "query_memory", "seed_questions.json")
+
+_ACCESS = re.compile(r"^(SCAN|SEARCH)(?: TABLE)? (\S+)(?: AS (\S+))?(?: USING (.*?))?(?: \((.*)\))?$")
+_SUBQUERY = re.compile(r"^(?:MATERIALIZE|CO-ROUTINE) (.+)$")
+
+_stats = {}
+_stats_lock = threading.Lock()
+_analyses = {}
+_analyses_lock = threading.Lock()
+
+def table_stats(db_path: str) -> dict:
+    """
+    Row estimates and indexes from the schema catalog, rebuilt when the schema
+    version changes: {"rows": {table: n}, "rowid_aliases": {table: column},
+    "indexes": {index: {"table", "unique", "columns", "fanout"}}}
+    """
+    catalog = schema_catalog.get_catalog(db_path)
+    key = os.path.abspath(db_path)
+    cached = _stats.get(key)
+    if cached and cached["schema_version"] == catalog.schema_version:
+        return cached
+
+    rows, rowid_aliases, indexes = {}, {}, {}
+    for name in catalog.table_names():
+        entry = catalog.tables[name]
+        rows[name.lower()] = entry["row_count"] or 0
+        # An INTEGER PRIMARY KEY is the rowid: the table is already ordered by it
+        primary_key = [c for c in entry["columns"] if c["pk"]]
+        if len(primary_key) == 1 and primary_key[0]["type"].upper() == "INTEGER":
+            rowid_aliases[name.lower()] = primary_key[0]["name"].lower()
+        for index in entry["indexes"]:
+            stat = index["stat"]
+            indexes[index["name"].lower()] = {
+                "table": name.lower(),
+                "unique": index["unique"],
+                "columns": [c.lower() for c in index["columns"]],
+                "fanout": stat[1] if stat and len(stat) > 1 else None
+            }
+
+    stats = {"schema_version": catalog.schema_version, "rows": rows, "rowid_aliases": rowid_aliases,
+             "indexes": indexes}
+    with _stats_lock:
+        _stats[key] = stats
+    return stats
+
+def explain_plan(db_path: str, sql: str) -> list:
+    """EXPLAIN QUERY PLAN rows as (id, parent, detail)"""
+    with engine.connection(db_path) as conn:
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {sql.strip().rstrip(';')}").fetchall()
+    return [(row[0], row[1], row[3]) for row in rows]
+
+def _scopes(tokens: list) -> tuple:
+    """
+    Scope of every token (0 is the outer query, each parenthesized SELECT opens
+    one; the parentheses belong to the enclosing scope), the parent of each
+    scope and the aliases each scope's FROM list defines ({alias: table})
+    """
+    scope_of, parents, stack, depth = [], [None], [(0, 0)], 0
+    for i, token in enumerate(tokens):
+        if token == ("op", "(") and i + 1 < len(tokens) and tokens[i + 1] in (("keyword", "select"), ("keyword", "with")):
+            scope_of.append(stack[-1][0])
+            depth += 1
+            parents.append(stack[-1][0])
+            stack.append((len(parents) - 1, depth))
+            continue
+        if token == ("op", ")"):
+            if len(stack) > 1 and stack[-1][1] == depth:
+                stack.pop()
+            depth -= 1
+        elif token == ("op", "("):
+            depth += 1
+        scope_of.append(stack[-1][0])
+
+    aliases = []
+    for scope in range(len(parents)):
+        found, _ = table_refs([t for t, s in zip(tokens, scope_of) if s == scope])
+        # table_refs also maps an aliased table's own name; only its alias is in scope
+        aliases.append({a: t for a, t in found.items() if a != t or list(found.values()).count(t) == 1})
+    return scope_of, parents, aliases
+
+def _column_refs(tokens: list, tables: dict) -> tuple:
+    """
+    {alias: [columns]} maps, in order of appearance: every referenced column,
+    columns compared with a value (=, IN) and columns joined to another column.
+    Columns resolve per scope like SQLite does (innermost FROM list first), so
+    a table read twice, e.g. by a self-join or a correlated subquery, keeps
+    each reference's columns apart under the alias the query plan shows.
+    """
+    scope_of, parents, aliases = _scopes(tokens)
+    referenced, filtered, joined = {}, {}, {}
+
+    def column_at(i):
+        if not 0 <= i < len(tokens) or tokens[i][0] != "word" \
+                or (i + 1 < len(tokens) and tokens[i + 1] in (("op", "."), ("op", "("))):
+            return None
+        qualifier = tokens[i - 2][1] if i >= 2 and tokens[i - 1] == ("op", ".") and tokens[i - 2][0] == "word" else None
+        scope = scope_of[i]
+        while scope is not None:
+            if qualifier is not None:
+                if qualifier in aliases[scope]:
+                    table = aliases[scope][qualifier]
+                    return (qualifier, tokens[i][1]) if table in tables and tokens[i][1] in tables[table] else None
+            else:
+                owners = [a for a, t in aliases[scope].items() if t in tables and tokens[i][1] in tables[t]]
+                if owners:
+                    return (owners[0], tokens[i][1]) if len(owners) == 1 else None
+            scope = parents[scope]
+        return None
+
+    def add(target, ref):
+        columns = target.setdefault(ref[0], [])
+        if ref[1] not in columns:
+            columns.append(ref[1])
+
+    for i, token in enumerate(tokens):
+        ref = column_at(i)
+        if ref:
+            add(referenced, ref)
+        if token == ("keyword", "in") and (left := column_at(i - 1)):
+            add(filtered, left)
+        elif token in (("op", "="), ("op", "==")):
+            left = column_at(i - 1)
+            qualified = i + 2 < len(tokens) and tokens[i + 2] == ("op", ".")
+            right = column_at(i + 3 if qualified else i + 1)
+            if left and right:
+                add(joined, left)
+                add(joined, right)
+            elif left or right:
+                add(filtered, left or right)
+    return referenced, filtered, joined
+
+def _lookup_columns(constraint: str) -> list:
+    """Columns of an index constraint such as "AlbumId=? AND Name>?" (equalities first)"""
+    columns = re.findall(r"(\w+)\s*(=|>|<)", constraint or "")
+    return [c.lower() for c, _ in sorted(columns, key=lambda item: item[1] != "=") if c.lower() != "rowid"]
+
+def _candidate(table: str, key: list, referenced: list, rowid: str | None, reason: str) -> dict:
+    """
+    Index on the key columns, covering the other referenced columns when it
+    stays narrow; every index entry already holds the rowid (alias)
+    """
+    columns = list(key)
+    covered = [c for c in referenced if c not in columns and c != rowid]
+    if len(columns) + len(covered) <= MAX_INDEX_COLUMNS:
+        columns += covered
+    return {"table": table, "key_columns": list(key), "columns": columns, "reason": reason}
+
+def analyze_plan(db_path: str, sql: str) -> dict | None:
+    """
+    Analyze the SQL's query plan; None if SQLite cannot plan it. Returns
+    {"steps": [...], "estimated_cost": int, "estimated_rows": int,
+    "full_scans": [...], "temp_btrees": [...], "automatic_indexes": [...],
+    "correlated_subqueries": int, "findings": [...], "index_candidates": [...]}.
+    Cached per database, schema version and normalized SQL.
+    """
+    with tracing.span("plan_analysis") as span:
+        try:
+            stats = table_stats(db_path)
+        except sqlite3.Error as e:
+            span.set("error", str(e))
+            return None
+        key = (os.path.abspath(db_path), stats["schema_version"], normalize_sql(sql))
+        span.set("cache_hit", key in _analyses)
+        if key in _analyses:
+            result = _analyses[key]
+        else:
+            try:
+                plan = explain_plan(db_path, sql)
+                result = _PlanWalk(sql, stats, get_catalog(db_path)["tables"]).run(plan)
+            except sqlite3.Error as e:
+                span.set("error", str(e))
+                result = None
+            with _analyses_lock:
+                if len(_analyses) >= PLAN_CACHE_SIZE:
+                    _analyses.clear()
+                _analyses[key] = result
+        if result is not None:
+            span.set("estimated_cost", result["estimated_cost"])
+            span.set("findings", result["findings"])
+    return result
+
+class _PlanWalk:
+    """Cost and findings of one query plan, walked as nested loops"""
+
+    def __init__(self, sql: str, stats: dict, tables: dict):
+        self.stats = stats
+        self.tables = tables
+        tokens = tokenize(sql)
+        self.aliases, self.ctes = table_refs(tokens)
+        self.referenced, self.filtered, self.joined = _column_refs(
+            tokens, {t: entry["columns"] for t, entry in tables.items()}
+        )
+        self.subquery_rows = {}
+        self.result = {
+            "steps": [],
+            "full_scans": [],
+            "temp_btrees": [],
+            "automatic_indexes": [],
+            "correlated_subqueries": 0,
+            "findings": [],
+            "index_candidates": []
+        }
+
+    def run(self, plan: list) -> dict:
+        self.children = {}
+        for node_id, parent, detail in plan:
+            self.children.setdefault(parent, []).append((node_id, detail))
+        cost, rows = self.chain(0, 0, 1.0)
+        result = self.result
+        result["estimated_cost"] = round(cost)
+        result["estimated_rows"] = round(rows)
+
+        # Skip candidates an existing index already leads with
+        existing = [(index["table"], index["columns"]) for index in self.stats["indexes"].values()]
+        unique = {}
+        for candidate in result["index_candidates"]:
+            key_columns = candidate["key_columns"]
+            if not any(t == candidate["table"] and columns[:len(key_columns)] == key_columns for t, columns in existing):
+                unique.setdefault((candidate["table"], tuple(candidate["columns"])), candidate)
+        result["index_candidates"] = list(unique.values())
+        return result
+
+    def finding(self, message: str):
+        if message not in self.result["findings"]:
+            self.result["findings"].append(message)
+
+    def name(self, table: str) -> str:
+        return self.tables[table]["name"] if table in self.tables else table
+
+    def chain(self, parent: int, depth: int, outer: float) -> tuple:
+        """(cost, output rows) of the nested loop formed by a node's children, run outer times"""
+        result = self.result
+        cost, loops = 0.0, 1.0
+        for node_id, detail in self.children.get(parent, []):
+            result["steps"].append("  " * depth + detail)
+            access = _ACCESS.match(detail)
+            if access:
+                step_cost, fanout = self.access(*access.groups(), loops * outer)
+                cost += loops * step_cost
+                loops *= fanout
+                continue
+            if "TEMP B-TREE" in detail:
+                cost += loops * math.log2(loops + 1)
+                if detail.startswith("USE TEMP B-TREE"):
+                    purpose = detail.split(" FOR ", 1)[-1]
+                    result["temp_btrees"].append(purpose)
+                    if loops >= PLAN_MIN_SCAN_ROWS:
+                        self.finding(f"Sorts ~{loops:,.0f} rows in a temporary B-tree for {purpose}")
+            if detail.startswith("CORRELATED"):
+                result["correlated_subqueries"] += 1
+                sub_cost, _ = self.chain(node_id, depth + 1, loops * outer)
+                cost += loops * sub_cost
+                if loops > 1:
+                    self.finding(f"Correlated subquery re-runs for each of ~{loops:,.0f} outer rows; "
+                                 f"rewrite it as a JOIN or a grouped CTE")
+                continue
+            sub_cost, sub_rows = self.chain(node_id, depth + 1, outer)
+            cost += sub_cost
+            materialized = _SUBQUERY.match(detail)
+            if materialized:
+                self.subquery_rows[materialized.group(1).lower()] = sub_rows
+            elif detail in ("COMPOUND QUERY", "LEFT-MOST SUBQUERY"):
+                loops = sub_rows
+            elif detail.startswith(("UNION", "EXCEPT", "INTERSECT")):
+                loops += sub_rows
+        return cost, loops
+
+    def access(self, kind: str, name: str, alias: str | None, using: str | None, constraint: str | None,
+               runs: float) -> tuple:
+        """(cost per run, rows produced per run) of one SCAN/SEARCH step executed runs times"""
+        result = self.result
+        name, using = (alias or name).lower(), using or ""
+        table = self.aliases.get(name, name)
+        if table in self.ctes or name in self.subquery_rows or table not in self.stats["rows"]:
+            rows = self.subquery_rows.get(name, self.subquery_rows.get(table, 1.0))
+            return (rows, rows) if kind == "SCAN" else (math.log2(rows + 1), 1.0)
+        rows = max(self.stats["rows"][table], 1)
+        probe = math.log2(rows + 1)
+        rowid = self.stats["rowid_aliases"].get(table)
+        referenced = self.referenced.get(name, [])
+
+        if kind == "SCAN":
+            result["full_scans"].append(self.name(table))
+            # The rowid alias is looked up without an index, so it never leads one
+            joined = [c for c in self.joined.get(name, []) if c != rowid]
+            filtered = [c for c in self.filtered.get(name, []) if c != rowid]
+            if runs > 1:
+                message = (f"Full scan of {self.name(table)} (~{rows:,} rows) repeated for each of "
+                           f"~{runs:,.0f} outer rows")
+                keys = joined or filtered
+            elif filtered and rows >= PLAN_MIN_SCAN_ROWS:
+                message = f"Full scan of {self.name(table)} (~{rows:,} rows) although it is filtered on " \
+                          f"{', '.join(self.tables[table]['columns'][c] for c in filtered)}"
+                keys = filtered
+            else:
+                return rows, rows
+            if keys:
+                result["index_candidates"].append(_candidate(table, keys[:1], referenced, rowid, message))
+                message += "; join or filter it on an indexed key column instead"
+            elif runs > 1:
+                message += "; it has no join condition (Cartesian product)"
+            self.finding(message)
+            return rows, rows
+
+        columns = _lookup_columns(constraint)
+        if "AUTOMATIC" in using:
+            shown = ", ".join(self.tables[table]["columns"].get(c, c) for c in columns)
+            result["automatic_indexes"].append(f"{self.name(table)}({shown})")
+            message = f"SQLite builds a temporary index on {self.name(table)}({shown}) every time the query runs"
+            self.finding(message)
+            if columns:
+                result["index_candidates"].append(_candidate(table, columns, referenced, rowid, message))
+            # Building the index is paid once, not per run
+            fanout = min(DEFAULT_INDEX_FANOUT, rows)
+            return rows * probe / max(runs, 1) + probe + fanout, fanout
+
+        if "=" not in (constraint or "").replace(">=", "").replace("<=", ""):
+            fanout = rows * RANGE_SELECTIVITY
+            return probe + fanout, fanout
+        if "PRIMARY KEY" in using:
+            return probe, 1.0
+        index = self.stats["indexes"].get(using.rsplit(" ", 1)[-1].lower(), {})
+        if index.get("unique") and len(columns) >= len(index["columns"]):
+            return probe, 1.0
+        fanout = min(index.get("fanout") or DEFAULT_INDEX_FANOUT, rows)
+        return probe + fanout, fanout
+
+def performance_feedback(db_path: str, sql: str, error_type: str | None = None) -> str:
+    """
+    Plan findings as text for the correction agent: after a tripped resource
+    guard (error_type in PERFORMANCE_ERROR_TYPES) or for plans estimated at
+    PLAN_FEEDBACK_MIN_COST row visits or more; "" otherwise
+    """
+    analysis = analyze_plan(db_path, sql) if PLAN_ANALYSIS_ENABLED else None
+    if not analysis or not analysis["findings"]:
+        return ""
+    if error_type not in PERFORMANCE_ERROR_TYPES and analysis["estimated_cost"] < PLAN_FEEDBACK_MIN_COST:
+        return ""
+    lines = [f"Query plan (estimated ~{analysis['estimated_cost']:,} row visits):"]
+    lines += [f"- {finding}" for finding in analysis["findings"]]
+    return "\n".join(lines)
+
+def split_statements(text: str) -> list:
+    """Statements of a SQL script, split on semicolons outside strings and comments"""
+    statements, start = [], 0
+    for kind, value, begin, end in token_spans(text):
+        if (kind, value) == ("op", ";"):
+            statements.append(text[start:begin].strip())
+            start = end
+    statements.append(text[start:].strip())
+    return [s for s in statements if s]
+
+def load_queries(paths: list | None = None) -> list:
+    """
+    SQL to advise on: the given .json ([{"sql": ...}] or [str]) and .sql files,
+    or else the query memory (Chroma store, if available) plus the seed questions
+    """
+    queries = []
+    if not paths:
+        try:
+            from query_memory.store import get_collection
+            collection = get_collection()
+            if collection is not None:
+                metadatas = collection.get(include=["metadatas"])["metadatas"] or []
+                queries += [m["sql"] for m in metadatas if m and m.get("sql")]
+        except Exception as e:
+            print(f"Warning: query memory unavailable ({str(e)}); using the seed questions only")
+        paths = [SEED_QUERIES_PATH]
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            if path.endswith(".json"):
+                queries += [entry["sql"] if isinstance(entry, dict) else entry for entry in json.load(f)]
+            else:
+                queries += split_statements(f.read())
+
+    seen, unique = set(), []
+    for sql in queries:
+        key = normalize_sql(sql)
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(sql)
+    return unique
+
+def index_statement(table: str, columns: list, db_path: str | None = None) -> str:
+    """CREATE INDEX statement with the schema's spelling of names when db_path is given"""
+    entry = get_catalog(db_path)["tables"].get(table, {}) if db_path else {}
+    table_name = entry.get("name", table)
+    column_names = [entry.get("columns", {}).get(c, c) for c in columns]
+    index_name = f"idx_{table_name}_{'_'.join(column_names)}"
+    quoted = ", ".join(f'"{c}"' for c in column_names)
+    return f'CREATE INDEX IF NOT EXISTS "{index_name}" ON "{table_name}" ({quoted})'
+
+def advise(db_path: str, queries: list) -> dict:
+    """
+    Aggregate index candidates across queries. Candidates with the same table
+    and key merge into the widest covering column list; recommendations are
+    ranked by the estimated cost of the queries that need them.
+    """
+    merged, failed, costs = {}, 0, []
+    for sql in queries:
+        analysis = analyze_plan(db_path, sql)
+        if analysis is None:
+            failed += 1
+            continue
+        costs.append(analysis["estimated_cost"])
+        for candidate in analysis["index_candidates"]:
+            key = (candidate["table"], tuple(candidate["key_columns"]))
+            entry = merged.setdefault(key, {
+                "table": candidate["table"],
+                "key_columns": candidate["key_columns"],
+                "columns": list(candidate["key_columns"]),
+                "queries": 0,
+                "total_cost": 0,
+                "reasons": []
+            })
+            entry["queries"] += 1
+            entry["total_cost"] += analysis["estimated_cost"]
+            for column in candidate["columns"]:
+                if column not in entry["columns"] and len(entry["columns"]) < MAX_INDEX_COLUMNS:
+                    entry["columns"].append(column)
+            if candidate["reason"] not in entry["reasons"]:
+                entry["reasons"].append(candidate["reason"])
+
+    recommendations = sorted(merged.values(), key=lambda e: (-e["total_cost"], -e["queries"]))
+    for entry in recommendations:
+        entry["statement"] = index_statement(entry["table"], entry["columns"], db_path)
+    return {
+        "queries": len(queries),
+        "failed": failed,
+        "total_cost": sum(costs),
+        "recommendations": recommendations
+    }
+
+def build_shadow(db_path: str, shadow_path: str, recommendations: list, queries: list) -> dict:
+    """
+    Copy the database to shadow_path, create the recommended indexes there,
+    ANALYZE it and compare the queries' estimated cost before and after
+    """
+    if os.path.abspath(shadow_path) == os.path.abspath(db_path):
+        raise ValueError("The shadow copy must not overwrite the database")
+    source = engine.read_only_connection(db_path)
+    shadow = sqlite3.connect(shadow_path)
+    try:
+        source.backup(shadow)
+        for entry in recommendations:
+            shadow.execute(entry["statement"])
+        shadow.execute("ANALYZE")
+        shadow.commit()
+    finally:
+        source.close()
+        shadow.close()
+
+    before = after = 0
+    for sql in queries:
+        old, new = analyze_plan(db_path, sql), analyze_plan(shadow_path, sql)
+        if old and new:
+            before += old["estimated_cost"]
+            after += new["estimated_cost"]
+    return {"shadow_path": shadow_path, "indexes": len(recommendations), "cost_before": before, "cost_after": after}
+
+if __name__ == "__main__":
+    import sys
+
+    args = sys.argv[1:]
+    if len(args) < 2:
+        print("Usage: python -m execution.plan_analyzer <db_path> <sql>")
+        print("       python -m execution.plan_analyzer <db_path> --advise [--shadow <path>] [queries.json|.sql ...]")
+        sys.exit(1)
+    db = args.pop(0)
+
+    if args[0] != "--advise":
+        analysis = analyze_plan(db, args[0])
+        if analysis is None:
+            print("SQLite cannot plan this query")
+            sys.exit(1)
+        print("\n".join(analysis["steps"]))
+        print(f"\nEstimated cost: ~{analysis['estimated_cost']:,} row visits, ~{analysis['estimated_rows']:,} rows")
+        for finding in analysis["findings"]:
+            print(f"  - {finding}")
+        for candidate in analysis["index_candidates"]:
+            print(f"  {index_statement(candidate['table'], candidate['columns'], db)};")
+        sys.exit(0)
+
+    args.pop(0)
+    shadow_path = None
+    if "--shadow" in args:
+        position = args.index("--shadow")
+        shadow_path = args[position + 1]
+        del args[position:position + 2]
+    queries = load_queries(args)
+    report = advise(db, queries)
+    print(f"Analyzed {report['queries']} queries ({report['failed']} could not be planned), "
+          f"estimated cost ~{report['total_cost']:,} row visits")
+    if not report["recommendations"]:
+        print("No indexes to recommend")
+    for entry in report["recommendations"]:
+        print(f"\n{entry['statement']};")
+        print(f"  helps {entry['queries']} quer{'y' if entry['queries'] == 1 else 'ies'} "
+              f"(estimated cost ~{entry['total_cost']:,}): {entry['reasons'][0]}")
+    if shadow_path and report["recommendations"]:
+        shadow = build_shadow(db, shadow_path, report["recommendations"], queries)
+        print(f"\nShadow copy {shadow['shadow_path']} with {shadow['indexes']} new indexes: "
+              f"estimated cost ~{shadow['cost_before']:,} -> ~{shadow['cost_after']:,} row visits")
@@ -0,0 +1,169 @@
+"""
+Query Result Cache
+Author: Mayank Goyal
+Reference: "Text-to-SQL Agents in Practice"
+
+In-memory LRU cache of execute_sql results. Entries are keyed by the
+normalized SQL (comments, whitespace runs and keyword case do not matter;
+every quoted token is kept verbatim, since SQLite reads "x" as a string when
+no column x exists), the row window and the database's state:
+file size and mtime (plus its WAL file) and the PRAGMA data_version seen by a
+watcher connection, which changes whenever another connection commits. Any
+change to the database therefore misses, and stale entries age out through
+LRU eviction.
+
+Memory is bounded by entry count and by an estimate of each result's size,
+so one large result displaces many small ones.
+"""
+
+import hashlib
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+from execution import engine
+from execution.static_verifier import KEYWORDS
+
+load_dotenv()
+
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "512"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Results larger than this share of the byte budget are not cached
+MAX_ENTRY_SHARE = 0.25
+
+# Failures worth remembering: re-running them costs a full budget
+CACHED_ERROR_TYPES = {"timeout", "vm_budget", "too_many_rows"}
+
+# Comments, quoted tokens ('string', "name", `name`, [name]), words, whitespace, anything else
+_TOKEN = re.compile(r"""
+    (?P<comment>--[^\n]*|/\*.*?(?:\*/|$))
+  | (?P<quoted>'(?:[^']|'')*'|"(?:[^"]|"")*"|`(?:[^`]|``)*`|\[[^\]]*\])
+  | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+  | (?P<space>\s+)
+  | (?P<other>.)
+""", re.VERBOSE | re.DOTALL)
+
+def normalize_sql(sql: str) -> str:
+    """
+    Canonical text of a statement: comments and whitespace runs become one
+    space and keywords are lowercased; quoted tokens and everything else are
+    kept as written. No trailing semicolon.
+    """
+    parts = []
+    for match in _TOKEN.finditer(sql):
+        kind, text = match.lastgroup, match.group()
+        if kind in ("comment", "space"):
+            if parts and parts[-1] != " ":
+                parts.append(" ")
+        elif kind == "word" and text.lower() in KEYWORDS:
+            parts.append(text.lower())
+        else:
+            parts.append(text)
+    normalized = "".join(parts).strip()
+    while normalized.endswith(";"):
+        normalized = normalized[:-1].rstrip()
+    return normalized
+
+def estimate_size(result: dict) -> int:
+    """Approximate bytes held by a result's rows (tuples or columnar)"""
+    size = 256 + 64 * len(result.get("columns", []))
+    if not dict.__contains__(result, "rows") and dict.__contains__(result, "columnar"):
+        return size + result["columnar"].nbytes()
+    for row in result.get("rows", []):
+        size += sys.getsizeof(row)
+        for value in row:
+            size += len(value) + 49 if isinstance(value, (str, bytes)) else 24
+    return size
+
+class ResultCache:
+    """Thread-safe, size-aware LRU cache of query results"""
+
+    def __init__(self, max_entries: int = RESULT_CACHE_MAX_ENTRIES, max_bytes: int = RESULT_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (result, size)
+        self._watchers = {}            # db path -> connection reading data_version
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _db_state(self, db_path: str) -> tuple:
+        """Identity of the database's current contents"""
+        path = os.path.abspath(db_path)
+        stat = os.stat(path)
+        try:
+            wal = os.stat(path + "-wal")
+            wal_state = (wal.st_mtime_ns, wal.st_size)
+        except FileNotFoundError:
+            wal_state = None
+        with self._lock:
+            watcher = self._watchers.get(path)
+            if watcher is None:
+                watcher = self._watchers[path] = engine.read_only_connection(path)
+            data_version = watcher.execute("PRAGMA data_version").fetchone()[0]
+        return path, stat.st_mtime_ns, stat.st_size, wal_state, data_version
+
+    def key(self, db_path: str, sql: str, window: tuple) -> str:
+        payload = repr((self._db_state(db_path), normalize_sql(sql), window))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, result: dict):
+        if not result["success"] and result.get("error_type") not in CACHED_ERROR_TYPES:
+            return
+        size = estimate_size(result)
+        if size > self.max_bytes * MAX_ENTRY_SHARE:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[1]
+            self._entries[key] = (result, size)
+            self.bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self.bytes > self.max_bytes):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "evictions": self.evictions
+        }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> ResultCache:
+    """Process-wide cache instance, created on first use"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache()
+    return _cache
@@ -2,41 +2,264 @@
 SQL Query Execution
 Author: Mayank Goyal
 Reference: "Text-to-SQL Agents in Practice"
+
+Queries run on pooled read-only connections (execution.engine). Results are
+fetched in batches up to a row cap (SQL_MAX_ROWS); rows beyond it stay in the
+database and can be paged in with offset=result["next_offset"], or consumed
+lazily with stream_sql().
+
+Read-only results are served from an in-memory cache (execution.result_cache)
+while the database is unchanged; cached results carry "cached": True.
+
+Every query runs under resource guards enforced by a SQLite progress handler:
+a wall-clock budget (SQL_TIMEOUT_SECONDS) and a VM instruction budget
+(SQL_MAX_VM_STEPS). Rows past the cap are counted (not kept) up to
+SQL_MAX_RESULT_ROWS. A breach fails the query with error_type "timeout",
+"vm_budget" or "too_many_rows" and an error message the correction agent can
+act on.
 """
 
+import os
 import sqlite3
+import time
+from contextlib import closing, contextmanager
+from dotenv import load_dotenv
+from execution import engine, result_cache
+from execution.columnar import ColumnarResult
+from utils import tracing
+
+load_dotenv()
+
+SQL_MAX_ROWS = int(os.getenv("SQL_MAX_ROWS", "1000"))       # rows returned per query, 0 = no cap
+SQL_FETCH_BATCH = int(os.getenv("SQL_FETCH_BATCH", "256"))  # rows fetched from the cursor at a time
+
+# Resource guards (0 disables a guard)
+SQL_TIMEOUT_SECONDS = float(os.getenv("SQL_TIMEOUT_SECONDS", "10"))
+SQL_MAX_VM_STEPS = int(os.getenv("SQL_MAX_VM_STEPS", "200000000"))
+SQL_MAX_RESULT_ROWS = int(os.getenv("SQL_MAX_RESULT_ROWS", "100000"))
+
+# VM instructions between progress handler calls
+PROGRESS_INTERVAL = 10000
+
+GUARD_MESSAGES = {
+    "timeout": "Query exceeded the {limit:g}s time budget and was interrupted",
+    "vm_budget": "Query exceeded the budget of {limit:,} SQLite VM steps and was interrupted",
+    "too_many_rows": "Query returned more than {limit:,} rows"
+}
+GUARD_HINT = (
+    "; likely a Cartesian product (a join without a join condition) or a filter that does not restrict the rows."
+    " Check every JOIN has an ON condition on the foreign keys."
+)
+
+class ResourceLimitExceeded(Exception):
+    def __init__(self, error_type: str, limit):
+        super().__init__(GUARD_MESSAGES[error_type].format(limit=limit) + GUARD_HINT)
+        self.error_type = error_type
+
+class QueryResult(dict):
+    """
+    execute_sql's result. The rows are held once, either as "rows" (tuples) or
+    as "columnar" (ColumnarResult); the other form and "data" (one dict per
+    row) are built on first access.
+    """
+
+    def __missing__(self, key):
+        if key == "rows" and dict.__contains__(self, "columnar"):
+            value = self["columnar"].tuples()
+        elif key == "columnar" and dict.__contains__(self, "rows"):
+            value = ColumnarResult.from_rows(self["columns"], self["rows"])
+        elif key == "data":
+            columns, rows = self["columns"], self["rows"]
+            value = [dict(zip(columns, row)) for row in rows] if columns else list(rows)
+        else:
+            raise KeyError(key)
+        self[key] = value
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
 
-def execute_sql(db_path: str, sql: str) -> dict:
-    """Execute SQL against the SQLite database and return results with detailed information"""
+def stream_sql(db_path: str, sql: str, batch_size: int = SQL_FETCH_BATCH,
+               timeout: float = SQL_TIMEOUT_SECONDS, max_vm_steps: int = SQL_MAX_VM_STEPS):
+    """
+    Yield (columns, rows) batches as they are fetched. The pooled connection is
+    held until the generator is exhausted or closed. The stream runs under the
+    same time and VM-step guards as execute_sql (the time budget covers the
+    whole stream); a breach raises ResourceLimitExceeded with its error_type.
+    """
+    with engine.connection(db_path) as conn:
+        with _guarded(conn, timeout, max_vm_steps) as breach, closing(conn.cursor()) as cur:
+            try:
+                cur.execute(sql)
+                columns = [d[0] for d in cur.description] if cur.description else []
+                while True:
+                    rows = cur.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield columns, rows
+            except sqlite3.OperationalError:
+                if breach:
+                    raise ResourceLimitExceeded(breach["error_type"], breach["limit"])
+                raise
+
+def execute_sql(
+    db_path: str,
+    sql: str,
+    read_only: bool = True,
+    max_rows: int | None = SQL_MAX_ROWS,
+    offset: int = 0,
+    timeout: float = SQL_TIMEOUT_SECONDS,
+    max_vm_steps: int = SQL_MAX_VM_STEPS,
+    layout: str = "rows"
+) -> QueryResult:
+    """
+    Execute SQL against the SQLite database and return results with detailed information.
+
+    At most max_rows rows (None or 0 = all) are returned, starting at offset;
+    "truncated" tells whether more rows exist, "next_offset" where they start
+    and "total_rows" how many there are (None if not counted). Failures carry
+    an "error_type": "sql_error" or a breached guard (see module docstring).
+    layout="columnar" stores the rows as a ColumnarResult (execution.columnar)
+    instead of tuples; either form is derived from the other on access.
+    read_only=False runs on a one-off writable connection instead of the pool.
+    """
+    cache_key = None
+    if read_only and result_cache.RESULT_CACHE_ENABLED:
+        try:
+            cache_key = result_cache.get_cache().key(
+                db_path, sql, (max_rows or None, offset, timeout, max_vm_steps, layout)
+            )
+        except (OSError, sqlite3.Error):
+            cache_key = None
+
+    with tracing.span("execute_sql") as span:
+        cached = result_cache.get_cache().get(cache_key) if cache_key else None
+        if cached is not None:
+            tracing.incr("result_cache_hits")
+            result = QueryResult(cached, cached=True)
+        else:
+            result = _execute(db_path, sql, read_only, max_rows or None, offset, timeout, max_vm_steps, layout)
+            if cache_key:
+                result_cache.get_cache().put(cache_key, QueryResult(result))
+        span.set("cache_hit", cached is not None)
+        span.set("success", result["success"])
+        span.set("row_count", result["row_count"])
+        if result["truncated"]:
+            span.set("truncated", True)
+        if result["error"]:
+            span.set("sql_error", result["error"])
+            span.set("error_type", result["error_type"])
+    return result
+
+@contextmanager
+def _guarded(conn: sqlite3.Connection, timeout: float, max_vm_steps: int):
+    """Abort the running statement once a budget is spent; yields the breach holder"""
+    breach = {}
+    if not timeout and not max_vm_steps:
+        yield breach
+        return
+    deadline = time.monotonic() + timeout if timeout else None
+    max_calls = max_vm_steps // PROGRESS_INTERVAL if max_vm_steps else None
+    calls = 0
+
+    def progress():
+        nonlocal calls
+        calls += 1
+        if max_calls is not None and calls > max_calls:
+            breach.update(error_type="vm_budget", limit=max_vm_steps)
+            return 1
+        if deadline is not None and time.monotonic() > deadline:
+            breach.update(error_type="timeout", limit=timeout)
+            return 1
+        return 0
+
+    conn.set_progress_handler(progress, PROGRESS_INTERVAL)
     try:
-        conn = sqlite3.connect(db_path)
-        cur = conn.cursor()
-        cur.execute(sql)
-        rows = cur.fetchall()
-        cols = [d[0] for d in cur.description] if cur.description else []
-        conn.close()
-
-        data = []
-        for row in rows:
-            if cols:
-                data.append(dict(zip(cols, row)))
-            else:
-                data.append(row)
-
-        return {
-            "success": True,
-            "columns": cols,
-            "rows": rows,
-            "data": data,
-            "row_count": len(data),
-            "error": None
-        }
+        yield breach
+    finally:
+        conn.set_progress_handler(None, 0)
+
+def _fetch(cur: sqlite3.Cursor, sink, max_rows: int | None, offset: int) -> tuple:
+    """
+    (row_count, truncated, total_rows): skip offset rows, pass up to max_rows
+    rows to sink one batch at a time, then count the rest
+    """
+    skipped = 0
+    while skipped < offset:
+        batch = cur.fetchmany(min(offset - skipped, SQL_FETCH_BATCH))
+        if not batch:
+            return 0, False, skipped
+        skipped += len(batch)
+
+    count = 0
+    while max_rows is None or count < max_rows:
+        size = SQL_FETCH_BATCH if max_rows is None else min(SQL_FETCH_BATCH, max_rows - count)
+        batch = cur.fetchmany(size)
+        if not batch:
+            return count, False, offset + count
+        sink(batch)
+        count += len(batch)
+        if SQL_MAX_RESULT_ROWS and offset + count > SQL_MAX_RESULT_ROWS:
+            raise ResourceLimitExceeded("too_many_rows", SQL_MAX_RESULT_ROWS)
+    if cur.fetchone() is None:
+        return count, False, offset + count
+    if not SQL_MAX_RESULT_ROWS:
+        return count, True, None
+
+    # Count (without keeping) the rows past the cap, up to the result guard
+    total = offset + count + 1
+    while True:
+        batch = cur.fetchmany(SQL_FETCH_BATCH)
+        if not batch:
+            return count, True, total
+        total += len(batch)
+        if total > SQL_MAX_RESULT_ROWS:
+            raise ResourceLimitExceeded("too_many_rows", SQL_MAX_RESULT_ROWS)
+
+def _execute(db_path: str, sql: str, read_only: bool, max_rows: int | None, offset: int,
+             timeout: float, max_vm_steps: int, layout: str) -> QueryResult:
+    try:
+        with engine.connection(db_path) if read_only else closing(sqlite3.connect(db_path)) as conn:
+            with _guarded(conn, timeout, max_vm_steps) as breach, closing(conn.cursor()) as cur:
+                try:
+                    cur.execute(sql)
+                    cols = [d[0] for d in cur.description] if cur.description else []
+                    if layout == "columnar":
+                        table = ColumnarResult(cols)
+                        row_count, truncated, total_rows = _fetch(cur, table.extend_rows, max_rows, offset)
+                        stored = {"columnar": table}
+                    else:
+                        rows = []
+                        row_count, truncated, total_rows = _fetch(cur, rows.extend, max_rows, offset)
+                        stored = {"rows": rows}
+                except sqlite3.OperationalError:
+                    if breach:
+                        raise ResourceLimitExceeded(breach["error_type"], breach["limit"])
+                    raise
+
+        return QueryResult(
+            success=True,
+            columns=cols,
+            **stored,
+            row_count=row_count,
+            truncated=truncated,
+            next_offset=offset + row_count if truncated else None,
+            total_rows=total_rows,
+            error=None,
+            error_type=None
+        )
     except Exception as e:
-        return {
-            "success": False,
-            "columns": [],
-            "rows": [],
-            "data": [],
-            "row_count": 0,
-            "error": str(e)
-        }
+        return QueryResult(
+            success=False,
+            columns=[],
+            rows=[],
+            row_count=0,
+            truncated=False,
+            next_offset=None,
+            total_rows=None,
+            error=str(e),
+            error_type=e.error_type if isinstance(e, ResourceLimitExceeded) else "sql_error"
+        )
@@ -0,0 +1,295 @@
+"""
+Rule-Based SQL Repair
+Author: Mayank Goyal
+Reference: "Text-to-SQL Agents in Practice"
+
+Deterministic fixes for the SQLite errors small models cause most often,
+tried before the LLM correction agent:
+- prose before or after the statement ("syntax error", "one statement at a time")
+- "no such column": closest column of the referenced tables, or the same
+  column re-qualified with the referenced table that has it
+- "no such table": closest table of the schema (customers -> Customer)
+- "ambiguous column name": qualified with the first referenced table that has it
+- "no such function": SQLite equivalents (LEN -> LENGTH, YEAR(x) -> strftime)
+
+Rules are applied one error at a time (a fix may reveal the next error). A
+repair is only returned if the repaired SQL prepares cleanly; otherwise the
+caller falls back to the correction agent.
+
+Usage:
+    python -m execution.sql_repair data/chinook.db "SELECT customer_name FROM customers"
+"""
+
+import difflib
+import re
+import sqlite3
+from execution.static_verifier import KEYWORDS, get_catalog, prepare_error, table_refs, token_spans
+from utils import tracing
+from utils.schema_index import singular
+
+# Errors fixed in a row before giving up
+MAX_REPAIRS = 3
+
+# Minimum similarity of a replacement name (after case/underscore folding)
+NAME_CUTOFF = 0.75
+
+# Trailing lines dropped at most when looking for the end of the statement
+MAX_PROSE_LINES = 5
+
+FUNCTION_RENAMES = {
+    "len": "LENGTH", "char_length": "LENGTH", "character_length": "LENGTH",
+    "substring": "SUBSTR", "lcase": "LOWER", "ucase": "UPPER", "isnull": "IFNULL", "nvl": "IFNULL",
+    "ceiling": "CEIL", "string_agg": "GROUP_CONCAT", "listagg": "GROUP_CONCAT"
+}
+DATE_PARTS = {"year": "%Y", "month": "%m", "day": "%d", "hour": "%H", "minute": "%M", "second": "%S"}
+NOW_FUNCTIONS = {
+    "now": "datetime('now')", "getdate": "datetime('now')", "current_timestamp": "datetime('now')",
+    "curdate": "date('now')", "current_date": "date('now')"
+}
+
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+def _fold(name: str) -> str:
+    """Case, underscore and plural insensitive form of a name"""
+    return singular(re.sub(r"[^a-z0-9]", "", name.lower()))
+
+def _quote(name: str) -> str:
+    if _IDENTIFIER.fullmatch(name) and name.lower() not in KEYWORDS:
+        return name
+    return '"' + name.replace('"', '""') + '"'
+
+def closest_name(name: str, candidates) -> str | None:
+    """The unambiguous closest candidate to name, or None"""
+    folded = {}
+    for candidate in candidates:
+        folded.setdefault(_fold(candidate), set()).add(candidate)
+    key = _fold(name)
+    if key in folded:
+        return next(iter(folded[key])) if len(folded[key]) == 1 else None
+    close = difflib.get_close_matches(key, list(folded), n=2, cutoff=NAME_CUTOFF)
+    if not close or len(folded[close[0]]) > 1:
+        return None
+    if len(close) == 2:
+        ratio = difflib.SequenceMatcher(None, key, close[0]).ratio()
+        if ratio == difflib.SequenceMatcher(None, key, close[1]).ratio():
+            return None
+    return next(iter(folded[close[0]]))
+
+def _splice(sql: str, edits: list) -> str:
+    """Apply (start, end, text) replacements"""
+    for start, end, text in sorted(edits, reverse=True):
+        sql = sql[:start] + text + sql[end:]
+    return sql
+
+def _references(catalog: dict, tokens: list) -> tuple:
+    """
+    (alias -> table map, {table: preferred qualifier}) for catalog tables in the
+    FROM clauses; an unaliased table is qualified with its name as in the schema
+    """
+    aliases, ctes = table_refs([(kind, text) for kind, text, _, _ in tokens])
+    aliases = {a: t for a, t in aliases.items() if t in catalog["tables"] and t not in ctes}
+    preferred = {}
+    for alias, table in aliases.items():
+        if alias != table:
+            preferred[table] = alias
+        elif table not in preferred:
+            preferred[table] = catalog["tables"][table]["name"]
+    return aliases, preferred
+
+def _is_column_token(tokens: list, i: int) -> bool:
+    """Unqualified identifier that is neither a qualifier, a function nor a FROM entry"""
+    if tokens[i][0] != "word":
+        return False
+    if i > 0 and tokens[i - 1][1] in (".", "from", "join", "as"):
+        return False
+    return not (i + 1 < len(tokens) and tokens[i + 1][1] in (".", "("))
+
+# ---------- rules ----------
+
+def _strip_prose(db_path: str, sql: str, error: str, catalog: dict):
+    if not ("syntax error" in error or "one statement at a time" in error or "incomplete input" in error):
+        return None
+    tokens = token_spans(sql)
+    start = next((t[2] for t in tokens if t[1] in ("select", "with")), None)
+    if start is None:
+        return None
+    candidate = sql[start:]
+    ends = [t[3] for t in token_spans(candidate) if t[1] == ";"]
+    if ends and candidate[ends[0]:].strip():
+        return candidate[:ends[0]], "removed text after the statement"
+
+    lines = candidate.rstrip().splitlines()
+    for drop in range(1, min(MAX_PROSE_LINES, len(lines) - 1) + 1):
+        shorter = "\n".join(lines[:-drop])
+        if prepare_error(db_path, shorter) is None:
+            return shorter, f"removed {drop} trailing line(s) of text"
+    if start > 0:
+        return candidate, "removed text before the statement"
+    return None
+
+def _no_such_column(db_path: str, sql: str, error: str, catalog: dict):
+    match = re.match(r"no such column: (?:([^.\s]+)\.)?(\S+)", error)
+    if not match:
+        return None
+    shown = match.group(0)[len("no such column: "):]
+    qualifier, column = (match.group(1) or "").lower(), match.group(2).lower()
+    tokens = token_spans(sql)
+    aliases, preferred = _references(catalog, tokens)
+    tables = catalog["tables"]
+
+    if qualifier:
+        table = aliases.get(qualifier)
+        if table is None:
+            return None
+        replacement = closest_name(column, tables[table]["columns"].values())
+        edits = []
+        if replacement is None:
+            # The column exists on another referenced table: fix the qualifier
+            owners = [t for t in preferred if t != table and column in tables[t]["columns"]]
+            if len(owners) != 1:
+                return None
+            new_qualifier = _quote(preferred[owners[0]])
+            for i in range(len(tokens) - 2):
+                if tokens[i][1] == qualifier and tokens[i + 1][1] == "." and tokens[i + 2][1] == column:
+                    edits.append((tokens[i][2], tokens[i][3], new_qualifier))
+            return _splice(sql, edits), f"{shown} -> {new_qualifier}.{match.group(2)}"
+        for i in range(len(tokens) - 2):
+            if tokens[i][1] == qualifier and tokens[i + 1][1] == "." and tokens[i + 2][1] == column:
+                edits.append((tokens[i + 2][2], tokens[i + 2][3], _quote(replacement)))
+        return _splice(sql, edits), f"{shown} -> {match.group(1)}.{replacement}"
+
+    replacement = closest_name(column, {c for t in preferred for c in tables[t]["columns"].values()})
+    if replacement is None:
+        return None
+    edits = [
+        (tokens[i][2], tokens[i][3], _quote(replacement))
+        for i in range(len(tokens)) if tokens[i][1] == column and _is_column_token(tokens, i)
+    ]
+    return _splice(sql, edits), f"{shown} -> {replacement}"
+
+def _no_such_table(db_path: str, sql: str, error: str, catalog: dict):
+    match = re.match(r"no such table: (?:\S+\.)?(\S+)", error)
+    if not match:
+        return None
+    shown, table = match.group(1), match.group(1).lower()
+    replacement = closest_name(table, [entry["name"] for entry in catalog["tables"].values()])
+    if replacement is None:
+        return None
+    tokens = token_spans(sql)
+    edits = [
+        (start, end, _quote(replacement)) for i, (kind, text, start, end) in enumerate(tokens)
+        if kind == "word" and text == table and not (i > 0 and tokens[i - 1][1] == ".")
+    ]
+    return _splice(sql, edits), f"{shown} -> {replacement}"
+
+def _ambiguous_column(db_path: str, sql: str, error: str, catalog: dict):
+    match = re.match(r"ambiguous column name: (\S+)", error)
+    if not match:
+        return None
+    shown, column = match.group(1), match.group(1).lower()
+    tokens = token_spans(sql)
+    _, preferred = _references(catalog, tokens)
+    owner = next((t for t in preferred if column in catalog["tables"][t]["columns"]), None)
+    if owner is None:
+        return None
+    qualifier = _quote(preferred[owner])
+    edits = []
+    for i in range(len(tokens)):
+        if tokens[i][1] == column and _is_column_token(tokens, i):
+            # Columns inside USING (...) must stay unqualified
+            j = i - 1
+            while j >= 0 and (tokens[j][1] == "," or tokens[j][0] == "word"):
+                j -= 1
+            if j >= 1 and tokens[j][1] == "(" and tokens[j - 1][1] == "using":
+                continue
+            edits.append((tokens[i][2], tokens[i][2], qualifier + "."))
+    if not edits:
+        return None
+    return _splice(sql, edits), f"{shown} -> {qualifier}.{shown}"
+
+def _closing_paren(tokens: list, open_index: int) -> int | None:
+    depth = 0
+    for j in range(open_index, len(tokens)):
+        if tokens[j][1] == "(":
+            depth += 1
+        elif tokens[j][1] == ")":
+            depth -= 1
+            if depth == 0:
+                return j
+    return None
+
+def _no_such_function(db_path: str, sql: str, error: str, catalog: dict):
+    match = re.match(r"no such function: (\S+)", error)
+    if not match:
+        return None
+    shown, name = match.group(1), match.group(1).lower()
+    tokens = token_spans(sql)
+    edits = []
+    for i, (kind, text, start, end) in enumerate(tokens):
+        if text != name or i + 1 >= len(tokens) or tokens[i + 1][1] != "(":
+            continue
+        close = _closing_paren(tokens, i + 1)
+        if close is None:
+            return None
+        if name in FUNCTION_RENAMES:
+            edits.append((start, end, FUNCTION_RENAMES[name]))
+        elif name in DATE_PARTS:
+            argument = sql[tokens[i + 1][3]:tokens[close][2]].strip()
+            edits.append((start, tokens[close][3], f"CAST(strftime('{DATE_PARTS[name]}', {argument}) AS INTEGER)"))
+        elif name in NOW_FUNCTIONS and close == i + 2:
+            edits.append((start, tokens[close][3], NOW_FUNCTIONS[name]))
+    if not edits:
+        return None
+    return _splice(sql, edits), f"{shown}() -> SQLite equivalent"
+
+RULES = [_strip_prose, _no_such_column, _no_such_table, _ambiguous_column, _no_such_function]
+
+def repair_sql(db_path: str, sql: str, error: str | None = None) -> dict | None:
+    """
+    Fix SQL that fails to prepare with deterministic rules.
+
+    error is the SQLite error message (prepared here if not given). Returns
+    {"sql": repaired SQL, "fixes": [descriptions]} if the repaired SQL
+    prepares cleanly, else None.
+    """
+    with tracing.span("sql_repair") as span:
+        result = _repair(db_path, sql, error)
+        span.set("repaired", result is not None)
+        if result:
+            span.set("fixes", len(result["fixes"]))
+    return result
+
+def _repair(db_path: str, sql: str, error: str | None) -> dict | None:
+    try:
+        catalog = get_catalog(db_path)
+        error = error or prepare_error(db_path, sql)
+    except sqlite3.Error:
+        return None
+    fixes = []
+    for _ in range(MAX_REPAIRS):
+        if not error:
+            break
+        for rule in RULES:
+            fixed = rule(db_path, sql, error, catalog)
+            if fixed and fixed[0].strip() and fixed[0] != sql:
+                sql, description = fixed
+                fixes.append(description)
+                break
+        else:
+            return None
+        error = prepare_error(db_path, sql)
+    if error or not fixes:
+        return None
+    return {"sql": sql.strip(), "fixes": fixes}
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 3:
+        print("Usage: python -m execution.sql_repair <db_path> <sql>")
+        sys.exit(1)
+    repaired = repair_sql(sys.argv[1], sys.argv[2])
+    if repaired:
+        print(f"Repaired ({'; '.join(repaired['fixes'])}):\n{repaired['sql']}")
+    else:
+        print("No rule applies")
@@ -0,0 +1,380 @@
+"""
+Static SQL Verifier
+Author: Mayank Goyal
+Reference: "Text-to-SQL Agents in Practice"
+
+Mechanical checks run before the LLM verification agent:
+- the SQL is a single read-only SELECT/WITH statement
+- SQLite can prepare it (EXPLAIN on a read-only connection, nothing executes),
+  which catches syntax errors, unknown tables/columns/functions and ambiguity
+- every alias.column reference resolves against the introspected schema
+- equality joins between two tables follow a foreign key
+- string literals compared with indexed columns exist in the database
+  (utils.value_index); a missing literal with a close match is an error
+
+Errors make the SQL invalid; warnings (non-FK joins, aggregations the plan
+asks for but the SQL lacks, literals with no close match) only lower
+confidence so the LLM verifier is asked.
+"""
+
+import difflib
+import os
+import re
+import sqlite3
+import threading
+from execution import engine
+from utils import schema_catalog, tracing
+from utils.value_index import get_value_index
+
+# Tokens: comments, string literals, quoted identifiers, words, numbers, operators
+_TOKEN = re.compile(r"""
+    (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<quoted>"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\])
+  | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+  | (?P<number>\d+(?:\.\d*)?)
+  | (?P<op><=|>=|<>|!=|==|\|\||[(),.;=<>*+\-/%])
+""", re.VERBOSE | re.DOTALL)
+
+KEYWORDS = {
+    "select", "from", "where", "join", "inner", "left", "right", "full", "outer", "cross", "natural",
+    "on", "using", "group", "by", "order", "having", "limit", "offset", "union", "all", "intersect",
+    "except", "as", "with", "recursive", "and", "or", "not", "in", "is", "null", "like", "glob",
+    "between", "case", "when", "then", "else", "end", "distinct", "asc", "desc", "exists", "window",
+    "over", "partition", "values", "cast", "collate", "escape"
+}
+CLAUSE_END = {"where", "group", "order", "having", "limit", "union", "intersect", "except", "window", "join",
+              "inner", "left", "right", "full", "cross", "natural", "on", "using"}
+# Authorizer actions a SELECT may need while being prepared
+READ_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+AGGREGATES = {"sum", "count", "avg", "min", "max", "total", "group_concat"}
+# A missing literal whose closest indexed value is at least this similar is an error
+LITERAL_ERROR_SIMILARITY = 0.8
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+def get_catalog(db_path: str) -> dict:
+    """
+    Lowercased view of the schema catalog (utils.schema_catalog): tables,
+    columns, primary and foreign keys; rebuilt when the schema version changes
+    """
+    source = schema_catalog.get_catalog(db_path)
+    key = os.path.abspath(db_path)
+    cached = _catalogs.get(key)
+    if cached and cached["schema_version"] == source.schema_version:
+        return cached
+
+    columns, primary_keys = {}, {}
+    for name, entry in source.tables.items():
+        columns[name.lower()] = {"name": name, "columns": {c["name"].lower(): c["name"] for c in entry["columns"]}}
+        primary_keys[name.lower()] = {c["name"].lower() for c in entry["columns"] if c["pk"]}
+    foreign_keys = [((t.lower(), c.lower()), (rt.lower(), rc.lower())) for t, c, rt, rc in source.foreign_keys()]
+
+    catalog = {
+        "schema_version": source.schema_version,
+        "tables": columns,
+        "primary_keys": primary_keys,
+        "foreign_keys": foreign_keys,
+        "references": {src: dst for src, dst in foreign_keys}
+    }
+    with _catalogs_lock:
+        _catalogs[key] = catalog
+    return catalog
+
+def token_spans(sql: str) -> list:
+    """(kind, text, start, end) tokens without comments; identifiers are unquoted and lowercased"""
+    tokens = []
+    for match in _TOKEN.finditer(sql):
+        kind = match.lastgroup
+        text = match.group()
+        if kind == "comment":
+            continue
+        if kind == "quoted":
+            kind, text = "word", text[1:-1]
+        elif kind == "word" and text.lower() in KEYWORDS:
+            kind = "keyword"
+        tokens.append((kind, text.lower() if kind in ("word", "keyword") else text, match.start(), match.end()))
+    return tokens
+
+def tokenize(sql: str) -> list:
+    """(kind, text) tokens without comments; identifiers are unquoted and lowercased"""
+    return [(kind, text) for kind, text, _, _ in token_spans(sql)]
+
+def prepare_error(db_path: str, sql: str) -> str | None:
+    """
+    SQLite's error for preparing the SQL, or None if it prepares. Runs EXPLAIN
+    on a read-only connection, so nothing executes; the authorizer rejects
+    anything but reads (e.g. WITH ... DELETE) while the statement is prepared.
+    """
+    with engine.connection(db_path) as conn:
+        conn.set_authorizer(
+            lambda action, *args: sqlite3.SQLITE_OK if action in READ_ACTIONS else sqlite3.SQLITE_DENY
+        )
+        try:
+            conn.execute(f"EXPLAIN {sql.strip().rstrip(';')}")
+            return None
+        except sqlite3.Error as e:
+            message = str(e)
+            return "statement is not a read-only query" if message == "not authorized" else message
+        finally:
+            conn.set_authorizer(None)
+
+def table_refs(tokens: list) -> tuple:
+    """Alias -> table map for FROM/JOIN references, plus CTE names"""
+    aliases = {}
+    ctes = set()
+    for i, (kind, text) in enumerate(tokens):
+        # WITH name [(cols)] AS (  /  , name AS (
+        if kind == "word" and i + 1 < len(tokens) and tokens[i + 1] == ("keyword", "as") \
+                and i + 2 < len(tokens) and tokens[i + 2] == ("op", "(") \
+                and i > 0 and tokens[i - 1] in (("keyword", "with"), ("keyword", "recursive"), ("op", ",")):
+            ctes.add(text)
+
+    i = 0
+    while i < len(tokens):
+        kind, text = tokens[i]
+        if (kind, text) in (("keyword", "from"), ("keyword", "join")) or (
+            (kind, text) == ("op", ",") and _in_from_list(tokens, i)
+        ):
+            j = i + 1
+            if j < len(tokens) and tokens[j][0] == "word":
+                table = tokens[j][1]
+                j += 1
+                if j < len(tokens) and tokens[j] == ("op", "."):  # schema.table
+                    table = tokens[j + 1][1] if j + 1 < len(tokens) else table
+                    j += 2
+                alias = table
+                if j < len(tokens) and tokens[j] == ("keyword", "as"):
+                    j += 1
+                if j < len(tokens) and tokens[j][0] == "word":
+                    alias = tokens[j][1]
+                aliases[alias] = table
+                aliases.setdefault(table, table)
+        i += 1
+    return aliases, ctes
+
+def _in_from_list(tokens: list, comma_index: int) -> bool:
+    """Whether a comma separates FROM list entries (not select columns or arguments)"""
+    depth = 0
+    for j in range(comma_index - 1, -1, -1):
+        kind, text = tokens[j]
+        if text == ")":
+            depth += 1
+        elif text == "(":
+            if depth == 0:
+                return False
+            depth -= 1
+        elif depth == 0 and kind == "keyword":
+            if text == "from":
+                return True
+            if text in CLAUSE_END or text == "select":
+                return False
+    return False
+
+def _qualified_refs(tokens: list) -> list:
+    """(index, qualifier, column) for every qualifier.column reference"""
+    refs = []
+    for i in range(len(tokens) - 2):
+        if tokens[i][0] == "word" and tokens[i + 1] == ("op", ".") and tokens[i + 2][0] in ("word", "keyword"):
+            if i > 0 and tokens[i - 1] == ("op", "."):
+                continue
+            refs.append((i, tokens[i][1], tokens[i + 2][1]))
+    return refs
+
+def _literal_filters(tokens: list, aliases: dict, ctes: set, tables: dict) -> list:
+    """(table, column, literal) for column = 'literal' and column IN ('a', ...) comparisons"""
+    def column_at(i):
+        """(table, column, first index) of a column reference ending at token i"""
+        if tokens[i][0] != "word":
+            return None
+        if i >= 2 and tokens[i - 1] == ("op", ".") and tokens[i - 2][0] == "word":
+            table = aliases.get(tokens[i - 2][1])
+            return (table, tokens[i][1], i - 2) if table in tables and table not in ctes else None
+        owners = [t for t in set(aliases.values()) if t in tables and tokens[i][1] in tables[t]["columns"]]
+        return (owners[0], tokens[i][1], i) if len(owners) == 1 else None
+
+    def literal(text):
+        return text[1:-1].replace("''", "'")
+
+    filters = []
+    for i, (kind, text) in enumerate(tokens):
+        if kind == "op" and text in ("=", "==") and 0 < i < len(tokens) - 1:
+            left, right = tokens[i - 1], tokens[i + 1]
+            if right[0] == "string" and (ref := column_at(i - 1)):
+                filters.append((ref[0], ref[1], literal(right[1])))
+            elif left[0] == "string" and i + 3 < len(tokens) and tokens[i + 2] == ("op", "."):
+                if ref := column_at(i + 3):
+                    filters.append((ref[0], ref[1], literal(left[1])))
+            elif left[0] == "string" and (ref := column_at(i + 1)):
+                filters.append((ref[0], ref[1], literal(left[1])))
+        elif (kind, text) == ("keyword", "in") and i + 1 < len(tokens) and tokens[i + 1] == ("op", "("):
+            ref = column_at(i - 1) if i > 0 else None
+            if ref is None:
+                continue
+            j = i + 2
+            while j < len(tokens) and tokens[j][0] == "string":
+                filters.append((ref[0], ref[1], literal(tokens[j][1])))
+                if j + 1 < len(tokens) and tokens[j + 1] == ("op", ","):
+                    j += 2
+                else:
+                    break
+    return [(tables[t]["name"], tables[t]["columns"][c], value) for t, c, value in filters
+            if c in tables[t]["columns"]]
+
+def _check_literals(db_path: str, filters: list) -> tuple:
+    """Look literals up in the value index; returns (errors, warnings, distinct_values)"""
+    errors, warnings, distinct_values = [], [], {}
+    index = get_value_index(db_path) if filters else None
+    if index is None:
+        return errors, warnings, distinct_values
+    for table, column, value in filters:
+        resolved = index.resolve_column(table, column)
+        if resolved is None or index.contains(*resolved, value):
+            continue
+        name = f"{resolved[0]}.{resolved[1]}"
+        close = index.lookup(value, *resolved)
+        if close:
+            distinct_values[name] = [match["value"] for match in close]
+        if close and close[0]["similarity"] >= LITERAL_ERROR_SIMILARITY:
+            errors.append(f"Value '{value}' not found in {name}. Did you mean: "
+                          f"{', '.join(repr(v) for v in distinct_values[name][:3])}?")
+        else:
+            warnings.append(f"Value '{value}' not found in {name}; the query will return no rows for it")
+    return errors, warnings, distinct_values
+
+def distinct_values_for(db_path: str, sql: str) -> dict | None:
+    """Closest database values for the SQL's literals that do not exist, for the correction agent"""
+    try:
+        tables = get_catalog(db_path)["tables"]
+    except sqlite3.Error:
+        return None
+    tokens = tokenize(sql)
+    aliases, ctes = table_refs(tokens)
+    _, _, distinct_values = _check_literals(db_path, _literal_filters(tokens, aliases, ctes, tables))
+    return distinct_values or None
+
+def _suggest(name: str, candidates: dict) -> str:
+    """Close matches for a lowercased name among {lowercased: original} candidates"""
+    close = difflib.get_close_matches(name.lower(), list(candidates), n=3, cutoff=0.6)
+    return f" Did you mean: {', '.join(candidates[c] for c in close)}?" if close else ""
+
+def _key_root(catalog: dict, table: str, column: str):
+    """The primary key a column refers to (itself if it is a key)"""
+    ref = catalog["references"].get((table, column))
+    if ref:
+        return ref
+    if column in catalog["primary_keys"].get(table, ()):
+        return (table, column)
+    return None
+
+def static_verify(db_path: str, sql: str, query_plan: dict | None = None) -> dict:
+    """
+    Check SQL without executing it.
+
+    Returns {"errors": [...], "warnings": [...], "complexity": int,
+    "distinct_values": {...}}; any error means the SQL would fail (or is not
+    allowed, or silently match nothing) at execution time.
+    """
+    with tracing.span("static_verification") as span:
+        result = _verify(db_path, sql, query_plan)
+        span.set("errors", len(result["errors"]))
+        span.set("warnings", len(result["warnings"]))
+    return result
+
+def _verify(db_path: str, sql: str, query_plan: dict | None) -> dict:
+    errors, warnings = [], []
+    tokens = tokenize(sql)
+    statement_ends = [i for i, tok in enumerate(tokens) if tok == ("op", ";")]
+    if not tokens:
+        return {"errors": ["Empty SQL statement"], "warnings": [], "complexity": 0, "distinct_values": {}}
+    if any(i < len(tokens) - 1 for i in statement_ends):
+        errors.append("Multiple SQL statements; only one SELECT query is allowed")
+    if tokens[0][1] not in ("select", "with"):
+        errors.append(f"Only SELECT queries are allowed, got '{tokens[0][1].upper()}'")
+
+    try:
+        catalog = get_catalog(db_path)
+    except sqlite3.Error as e:
+        return {"errors": errors + [f"Cannot open database: {str(e)}"], "warnings": warnings,
+                "complexity": 0, "distinct_values": {}}
+
+    # Let SQLite resolve the whole statement without running it
+    if not errors:
+        message = prepare_error(db_path, sql)
+        if message:
+            hint = ""
+            missing = re.match(r"no such (column|table|function): (.+)", message)
+            if missing:
+                what, name = missing.groups()
+                if what == "table":
+                    hint = _suggest(name, {t: entry["name"] for t, entry in catalog["tables"].items()})
+                elif what == "column":
+                    hint = _suggest(name.split(".")[-1], {
+                        c: original for entry in catalog["tables"].values() for c, original in entry["columns"].items()
+                    })
+            errors.append(f"SQLite error: {message.rstrip('.')}.{hint}")
+
+    aliases, ctes = table_refs(tokens)
+    tables = catalog["tables"]
+
+    # Resolve alias.column references
+    for _, qualifier, column in _qualified_refs(tokens):
+        table = aliases.get(qualifier)
+        if table is None or table in ctes:
+            continue
+        if table not in tables:
+            if not any(table in e.lower() for e in errors):
+                errors.append(f"Unknown table '{table}'.{_suggest(table, {t: e['name'] for t, e in tables.items()})}")
+            continue
+        if column != "*" and column not in tables[table]["columns"]:
+            message = f"Unknown column {qualifier}.{column} (table {tables[table]['name']})."
+            message += _suggest(column, tables[table]["columns"])
+            if not any(column in e.lower() for e in errors):
+                errors.append(message)
+
+    # Equality joins between two tables should follow a foreign key
+    refs = {i: (q, c) for i, q, c in _qualified_refs(tokens)}
+    checked = set()
+    for i, (q1, c1) in refs.items():
+        j = i + 3
+        if j < len(tokens) and tokens[j] in (("op", "="), ("op", "==")) and j + 1 in refs:
+            q2, c2 = refs[j + 1]
+            t1, t2 = aliases.get(q1), aliases.get(q2)
+            if not t1 or not t2 or t1 == t2 or t1 in ctes or t2 in ctes:
+                continue
+            if t1 not in tables or t2 not in tables:
+                continue
+            pair = frozenset({(t1, c1), (t2, c2)})
+            if pair in checked:
+                continue
+            checked.add(pair)
+            root1, root2 = _key_root(catalog, t1, c1), _key_root(catalog, t2, c2)
+            if root1 is None or root1 != root2:
+                name1 = f"{tables[t1]['name']}.{tables[t1]['columns'].get(c1, c1)}"
+                name2 = f"{tables[t2]['name']}.{tables[t2]['columns'].get(c2, c2)}"
+                warnings.append(f"Join {name1} = {name2} does not follow a foreign key")
+
+    # Literals compared with low-cardinality columns should exist
+    distinct_values = {}
+    if not errors:
+        literal_errors, literal_warnings, distinct_values = _check_literals(
+            db_path, _literal_filters(tokens, aliases, ctes, tables)
+        )
+        errors.extend(literal_errors)
+        warnings.extend(literal_warnings)
+
+    # Aggregations the plan asks for should appear in the SQL
+    if isinstance(query_plan, dict):
+        used = {text for kind, text in tokens if kind == "word" and text in AGGREGATES}
+        for agg in query_plan.get("aggregations") or []:
+            operation = (agg.get("operation") or agg.get("function")) if isinstance(agg, dict) else agg
+            if isinstance(operation, str) and operation.lower() in AGGREGATES and operation.lower() not in used:
+                warnings.append(f"Plan asks for {operation.upper()} but the SQL does not use it")
+
+    keywords = [text for kind, text in tokens if kind == "keyword"]
+    complexity = (
+        keywords.count("join") + max(0, keywords.count("select") - 1)
+        + keywords.count("union") + keywords.count("intersect") + keywords.count("except")
+    )
+    return {"errors": errors, "warnings": warnings, "complexity": complexity, "distinct_values": distinct_values}
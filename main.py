@@ -5,21 +5,50 @@ Description: Multi-agent system to convert natural language questions to SQL que
 Reference: "Text-to-SQL Agents in Practice"
 """
 
-from agents.schema_linking import schema_linking_agent
-from agents.planning import planning_agent
-from agents.sql_generation import sql_generation_agent
-from agents.verification import verification_agent
-from agents.correction import correction_agent
+from agents.schema_linking import schema_linking_agent, schema_linking_agent_async
+from agents.planning import planning_agent, planning_agent_async
+from agents.sql_generation import sql_generation_agent, sql_generation_agent_async
+from agents.verification import verification_agent, verification_agent_async
+from agents.correction import correction_agent, correction_agent_async
+from agents.fast_path import fast_path_agent, fast_path_agent_async
+from agents.candidates import (
+    PIPELINE_CANDIDATES,
+    generate_candidates,
+    generate_candidates_async,
+    select_candidate,
+    select_candidate_async
+)
 from execution.run_query import execute_sql
-from query_memory.store import retrieve, add
+from execution.plan_analyzer import performance_feedback
+from execution.static_verifier import distinct_values_for
+from execution.sql_repair import repair_sql
+from query_memory.store import retrieve, retrieve_async, add
+from utils.logging import get_logger
+from utils.schema_catalog import get_catalog
+from utils import tracing, transport
+import asyncio
 import json
-import sqlite3
+import os
 
 DB_PATH = "data/chinook.db"
 MAX_VERIFICATION_CORRECTIONS = 2
 MAX_EXECUTION_RETRIES = 3
 MAX_FULL_PIPELINE_RETRIES = 2
 
+# Plan and generate SQL in one LLM call first; the separate agents are the fallback
+PIPELINE_FAST_PATH = os.getenv("PIPELINE_FAST_PATH", "true").lower() in ("1", "true", "yes")
+
+# Async pipelines in flight per event loop; the loop's HTTP clients are closed when it drops to zero
+_active_pipelines = {}
+
+def execution_feedback_for(sql: str, execution: dict) -> str:
+    """Execution error for the correction agent, plus query plan findings when a guard tripped or the plan is costly"""
+    feedback = execution.get('error', '')
+    plan_feedback = performance_feedback(DB_PATH, sql, execution.get("error_type"))
+    if plan_feedback:
+        feedback += "\n" + plan_feedback
+    return feedback
+
 def safe_format_list(items, item_formatter=str):
     """Safely format a list of items, handling both strings and dicts"""
     if not items:
@@ -57,31 +86,109 @@ def normalize_schema_context(schema_context: dict) -> dict:
     
     return normalized
 
-def get_schema_from_db():
-    """Extract schema from actual database"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-    tables = cursor.fetchall()
-    
-    schema_text = "CHINOOK DATABASE SCHEMA\n\nTables:\n\n"
-    for table in tables:
-        table_name = table[0]
-        cursor.execute(f"PRAGMA table_info({table_name})")
-        columns = cursor.fetchall()
-        schema_text += f"{table_name}:\n"
-        for col in columns:
-            col_name = col[1]
-            col_type = col[2]
-            schema_text += f"  - {col_name} ({col_type})\n"
-        schema_text += "\n"
-    
-    conn.close()
-    return schema_text
-
-SCHEMA = get_schema_from_db()
+def get_schema_from_db(db_path: str = DB_PATH) -> str:
+    """Schema text with keys, from the cached catalog (refreshed when the schema changes)"""
+    return get_catalog(db_path).schema_text()
+
+def run_fast_path(question: str, schema_context: dict):
+    """Fused planning + SQL generation; returns (plan, sql) if it parses and verifies, else None"""
+    print("\nStep 3-4: Fast Path (planning + SQL generation in one call)")
+    try:
+        fused = fast_path_agent(question, schema_context)
+    except ValueError as e:
+        tracing.incr("fast_path_fallbacks")
+        print(f" Fast path output unusable: {str(e)}")
+        print(" Falling back to separate planning and SQL generation agents.")
+        return None
+
+    plan, sql = fused["query_plan"], fused["sql"]
+    print(f" Intent: {plan.get('intent', 'Unknown')}")
+    print(f" Generated SQL:\n{sql}")
+
+    print("\nSTEP 5: Verification Agent]")
+    print("Checking fast path SQL...")
+    verification = verification_agent(schema_context, plan, sql, db_path=DB_PATH)
+    if not verification["is_valid"] and verification.get("checked_by") == "static":
+        repaired = repair_sql(DB_PATH, sql)
+        if repaired:
+            tracing.incr("local_repairs")
+            sql = repaired["sql"]
+            print(f" Repaired fast path SQL: {'; '.join(repaired['fixes'])}")
+            verification = verification_agent(schema_context, plan, sql, db_path=DB_PATH)
+    if not verification["is_valid"]:
+        tracing.incr("fast_path_fallbacks")
+        print(f" Fast path SQL failed verification: {', '.join(map(str, verification.get('issues', [])[:3]))}")
+        print(" Falling back to separate planning and SQL generation agents.")
+        return None
+
+    print("SQL passed static verification")
+    return plan, sql
+
+async def run_fast_path_async(question: str, schema_context: dict):
+    """Async variant of run_fast_path without console output"""
+    try:
+        fused = await fast_path_agent_async(question, schema_context)
+    except ValueError as e:
+        tracing.incr("fast_path_fallbacks")
+        get_logger().info(f"Fast path output unusable for {question!r}: {str(e)}")
+        return None
+
+    plan, sql = fused["query_plan"], fused["sql"]
+    verification = await verification_agent_async(schema_context, plan, sql, db_path=DB_PATH)
+    if not verification["is_valid"] and verification.get("checked_by") == "static":
+        repaired = await asyncio.to_thread(repair_sql, DB_PATH, sql)
+        if repaired:
+            tracing.incr("local_repairs")
+            sql = repaired["sql"]
+            verification = await verification_agent_async(schema_context, plan, sql, db_path=DB_PATH)
+    if not verification["is_valid"]:
+        tracing.incr("fast_path_fallbacks")
+        return None
+    return plan, sql
+
+def run_candidates(question: str, schema_context: dict):
+    """Generate PIPELINE_CANDIDATES SQL candidates in parallel; returns (plan, sql) of the consensus winner or None"""
+    print(f"\nStep 3-7: Generating {PIPELINE_CANDIDATES} SQL candidates in parallel")
+    candidates = generate_candidates(question, schema_context, PIPELINE_CANDIDATES, use_fast_path=PIPELINE_FAST_PATH)
+    winner = select_candidate(DB_PATH, candidates)
+    for candidate in candidates:
+        status = "ok" if not candidate["error"] else f"failed: {candidate['error'][:100]}"
+        print(f"  #{candidate['index'] + 1} (temperature {candidate['temperature']}): {status}")
+    if winner is None:
+        tracing.incr("candidate_fallbacks")
+        print(" No candidate executed successfully. Falling back to the step-by-step pipeline.")
+        return None, next((c["error"] for c in candidates if c["error"]), "")
+
+    print(f" Selected candidate #{winner['index'] + 1} ({winner['agreement']}/{len(candidates)} agree on its result)")
+    print(f" SQL:\n{winner['sql']}")
+    return (winner["plan"], winner["sql"]), ""
+
+async def run_candidates_async(question: str, schema_context: dict):
+    """Async variant of run_candidates without console output"""
+    candidates = await generate_candidates_async(
+        question, schema_context, PIPELINE_CANDIDATES, use_fast_path=PIPELINE_FAST_PATH
+    )
+    winner = await select_candidate_async(DB_PATH, candidates)
+    if winner is None:
+        tracing.incr("candidate_fallbacks")
+        return None, next((c["error"] for c in candidates if c["error"]), "")
+    return (winner["plan"], winner["sql"]), ""
 
 def run_text_to_sql_pipeline(question: str) -> dict:
+    with tracing.trace_question(question) as trace:
+        result = _run_text_to_sql_pipeline(question)
+        trace.set("status", result["status"])
+    result["trace_id"] = trace.id
+
+    stages = trace.stage_totals()
+    if stages:
+        print("Timing: " + ", ".join(
+            f"{name} {entry['total_ms']:.0f}ms" + (f" (x{entry['count']})" if entry["count"] > 1 else "")
+            for name, entry in stages.items()
+        ) + f" | total {trace.duration_ms:.0f}ms")
+    return result
+
+def _run_text_to_sql_pipeline(question: str) -> dict:
     print("\n" + "="*80)
     print(f"Question: {question}")
     print("="*80)
@@ -97,7 +204,7 @@ def run_text_to_sql_pipeline(question: str) -> dict:
     #Step 2: Schema Linking (only once- doesn't change with errors)
     print( "\nStep 2: Schema Linking Agent")
     print(" Identifying relevant tables and columns...")
-    schema_linking = schema_linking_agent(question, SCHEMA)
+    schema_linking = schema_linking_agent(question, get_schema_from_db(), db_path=DB_PATH)
     #Normalize schema context keys for consistent access
     schema_context = normalize_schema_context(schema_linking)
 
@@ -138,88 +245,114 @@ def run_text_to_sql_pipeline(question: str) -> dict:
 
     for pipeline_attempt in range(MAX_FULL_PIPELINE_RETRIES):
         if pipeline_attempt > 0:
+            tracing.incr("pipeline_retries")
             print("\n" + "-"*40)
             print(f"PIPELINE RETRY #{pipeline_attempt + 1}")
             print(f"Previous error will be used to improve the query.")
             print("-"*40 + "\n")
 
-        #Step 3: Planning (Regenerated on retry with error feedback)
-        print(f"\nStep 3: Planning Agent{'  -REGENERATING WITH ERROR FEEDBACK' if error_feedback else ''}")
-        print("  Creating query execution plan...")
-        if error_feedback:
-            print(f" Error context:\n{error_feedback}")
+        # Candidates or fast path on the first attempt; retries with error feedback use the separate agents
+        first_pass = None
+        if PIPELINE_CANDIDATES > 1 and pipeline_attempt == 0:
+            first_pass, error_feedback = run_candidates(question, schema_context)
+        elif PIPELINE_FAST_PATH and pipeline_attempt == 0:
+            first_pass = run_fast_path(question, schema_context)
+
+        if first_pass:
+            plan, sql = first_pass
+        else:
+            #Step 3: Planning (Regenerated on retry with error feedback)
+            print(f"\nStep 3: Planning Agent{'  -REGENERATING WITH ERROR FEEDBACK' if error_feedback else ''}")
+            print("  Creating query execution plan...")
+            if error_feedback:
+                print(f" Error context:\n{error_feedback}")
         
-        plan = planning_agent(question, schema_context)
-        print(f" Query Type: {plan.get('query_type', 'Unknown')}")
-        if plan.get('steps'):
-            print(" Execution Steps:")
-            for i, step in enumerate(plan.get('steps', [])[:5], 1):
-                step_text = step if isinstance(step, str) else str(step)
-                print(f"  {i}. {step_text}")
-
-        if plan.get('aggregations'):
-            # Formatting aggregations: handles strings, dicts, etc.
-            def format_agg(agg):
-                if isinstance(agg, str):
-                    func = agg.get('function', agg.get('type', 'AGG'))
-                    col = agg.get('column', agg.get('field', ''))
-                    return f"{func}({col})" if col else func
-                return str(agg)
+            plan = planning_agent(question, schema_context)
+            print(f" Query Type: {plan.get('query_type', 'Unknown')}")
+            if plan.get('steps'):
+                print(" Execution Steps:")
+                for i, step in enumerate(plan.get('steps', [])[:5], 1):
+                    step_text = step if isinstance(step, str) else str(step)
+                    print(f"  {i}. {step_text}")
+
+            if plan.get('aggregations'):
+                # Formatting aggregations: handles strings, dicts, etc.
+                def format_agg(agg):
+                    if isinstance(agg, str):
+                        func = agg.get('function', agg.get('type', 'AGG'))
+                        col = agg.get('column', agg.get('field', ''))
+                        return f"{func}({col})" if col else func
+                    return str(agg)
             
-            agg_display = safe_format_list(plan.get('aggregations', []), format_agg)
-            if agg_display:
-                print(f" Aggregations: {agg_display}")
+                agg_display = safe_format_list(plan.get('aggregations', []), format_agg)
+                if agg_display:
+                    print(f" Aggregations: {agg_display}")
         
-        if plan.get('filters'):
-            print(f"  Filters: {len(plan.get('filters', []))} conditions")
-
-        #Step 4: SQL Generation (Regenerated with error feedback)
-        print(f"\n STEP 4: SQL Generation Agent{' -WITH ERROR FEEDBACK' if error_feedback else ''}")
-        print("  Generating SQL query...")
-        try:
-            sql = sql_generation_agent(schema_context, plan, retrieved_examples, error_feedback=error_feedback)
-            print(f" Generated SQL:\n{sql}")
-        except ValueError as e:
-            print(f" ERROR: {str(e)}")
-            error_feedback = str(e)
-            continue  # Retry the entire pipeline
-
-        # Step 5: Static verification and correction (up to MAX_VERIFICATION_CORRECTIONS times)
-        print("\nSTEP 5: Verification Agent]")
-        print("Checking SQL validity...")
-
-        for attempt in range(MAX_VERIFICATION_CORRECTIONS):
-            verification = verification_agent(schema_context, plan, sql)
-
-            if verification["is_valid"]:
-                print(f"SQL passed static verification")
+            if plan.get('filters'):
+                print(f"  Filters: {len(plan.get('filters', []))} conditions")
+
+            #Step 4: SQL Generation (Regenerated with error feedback)
+            print(f"\n STEP 4: SQL Generation Agent{' -WITH ERROR FEEDBACK' if error_feedback else ''}")
+            print("  Generating SQL query...")
+            try:
+                sql = sql_generation_agent(schema_context, plan, retrieved_examples, error_feedback=error_feedback)
+                print(f" Generated SQL:\n{sql}")
+            except ValueError as e:
+                print(f" ERROR: {str(e)}")
+                error_feedback = str(e)
+                continue  # Retry the entire pipeline
+
+            # Step 5: Static verification and correction (up to MAX_VERIFICATION_CORRECTIONS times)
+            print("\nSTEP 5: Verification Agent]")
+            print("Checking SQL validity...")
+
+            for attempt in range(MAX_VERIFICATION_CORRECTIONS):
+                verification = verification_agent(schema_context, plan, sql, db_path=DB_PATH)
+
+                if verification["is_valid"]:
+                    print(f"SQL passed static verification")
+                    if verification.get('issues'):
+                        print(f"Minor issues noted: {', '.join(verification['issues'][:3])}")
+                    print(f"\nSTEP 6: Correction Agent]")
+                    print("Skipped. No corrections needed")
+                    break  # Exit loop if no issues
+
+                tracing.incr("verification_corrections")
+                print(f"Verification failed (attempt {attempt + 1}/{MAX_VERIFICATION_CORRECTIONS})")
+                print(f"Severity: {verification.get('severity', 'unknown')}")
                 if verification.get('issues'):
-                    print(f"Minor issues noted: {', '.join(verification['issues'][:3])}")
-                print(f"\nSTEP 6: Correction Agent]")
-                print("Skipped. No corrections needed")
-                break  # Exit loop if no issues
-
-            print(f"Verification failed (attempt {attempt + 1}/{MAX_VERIFICATION_CORRECTIONS})")
-            print(f"Severity: {verification.get('severity', 'unknown')}")
-            if verification.get('issues'):
-                print("Issues found:")
-                for issue in verification['issues'][:3]:
-                    print(f"  {issue}")
+                    print("Issues found:")
+                    for issue in verification['issues'][:3]:
+                        print(f"  {issue}")
+
+                # Mechanical SQLite errors are fixed by rules, without the LLM
+                repaired = repair_sql(DB_PATH, sql) if verification.get("checked_by") == "static" else None
+                if repaired:
+                    tracing.incr("local_repairs")
+                    sql = repaired["sql"]
+                    print(f"\n[STEP 6: Rule-Based Repair Attempt {attempt + 1}]")
+                    print(f"Fixed: {'; '.join(repaired['fixes'])}")
+                    print(f"New SQL:\n{sql}")
+                    continue
                 
-            print(f"\n[STEP 6: Correction Agent Attempt {attempt + 1}]")
-            print("Attempting to fix issues...")
-            correction = correction_agent(schema_context, plan, sql, verification)
+                print(f"\n[STEP 6: Correction Agent Attempt {attempt + 1}]")
+                print("Attempting to fix issues...")
+                correction = correction_agent(
+                    schema_context, plan, sql, verification,
+                    execution_feedback=performance_feedback(DB_PATH, sql),
+                    distinct_values=distinct_values_for(DB_PATH, sql)
+                )
         
-            if correction["action"] != "correct_sql":
-                print(f" Correction failed: {correction.get('reasoning', 'Unknown reason')}")
-                error_feedback = f"Verification failed: {', '.join(verification.get('issues', []))}. Correction failed: {correction.get('reasoning', 'Unknown')}."
-                break # break verification-correction loop to regenerate entire pipeline
+                if correction["action"] != "correct_sql":
+                    print(f" Correction failed: {correction.get('reasoning', 'Unknown reason')}")
+                    error_feedback = f"Verification failed: {', '.join(verification.get('issues', []))}. Correction failed: {correction.get('reasoning', 'Unknown')}."
+                    break # break verification-correction loop to regenerate entire pipeline
 
-            sql = correction["corrected_sql"]
-            print("SQL Corrected")
-            if correction.get("reasoning"):
-                print(f"Reasoning: {correction['reasoning']}")
-            print(f"New SQL:\n{sql}")
+                sql = correction["corrected_sql"]
+                print("SQL Corrected")
+                if correction.get("reasoning"):
+                    print(f"Reasoning: {correction['reasoning']}")
+                print(f"New SQL:\n{sql}")
 
         # Step 7: Execute and retry on errors (up to MAX_EXECUTION_RETRIES)
         print(f"\nSTEP 7: SQL Execution")
@@ -227,24 +360,29 @@ def run_text_to_sql_pipeline(question: str) -> dict:
         execution_success = False
 
         for exec_attempt in range(MAX_EXECUTION_RETRIES):
+            plan_feedback = performance_feedback(DB_PATH, sql)
+            if plan_feedback:
+                print(f" {plan_feedback}")
             execution = execute_sql(DB_PATH, sql)
 
             if execution["success"]:
                 print("SQL executed successfully.")
                 
                 #Display Results
-                results_data = execution.get("data", [])
+                results_rows = execution["rows"]
                 print(f"\nSTEP 8: Query Results")
-                print(f" Rows returned: {len(results_data)}")
+                print(f" Rows returned: {len(results_rows)}")
+                if execution["truncated"]:
+                    print(f" Result truncated at {len(results_rows)} rows (SQL_MAX_ROWS); more rows exist.")
 
-                if results_data:
+                if results_rows:
                     #Print first 5 rows
                     print("\n ResultsPreview:")
                     print(f"  {'-'*60}")
-                    for i, row in enumerate(results_data[:10], 1): # Show up to 10 rows
-                        print(f"  {i}. {row}")
-                    if len(results_data) > 10:
-                        print(f"  ... ({len(results_data) - 10} more rows)")
+                    for i, row in enumerate(results_rows[:10], 1): # Show up to 10 rows
+                        print(f"  {i}. {dict(zip(execution['columns'], row))}")
+                    if len(results_rows) > 10:
+                        print(f"  ... ({len(results_rows) - 10} more rows)")
                     print(f"  {'-'*60}")
                 else:
                     print(f" Query executed successfully but returned no rows.")
@@ -278,10 +416,20 @@ def run_text_to_sql_pipeline(question: str) -> dict:
                 }
 
             #Execution failed
+            tracing.incr("execution_retries")
             print(f" Execution failed: (attempt {exec_attempt + 1}/{MAX_EXECUTION_RETRIES})")
             print(f" Error: {execution.get('error', 'Unknown error')}")
 
             if exec_attempt < MAX_EXECUTION_RETRIES - 1:
+                repaired = repair_sql(DB_PATH, sql, execution.get("error"))
+                if repaired:
+                    tracing.incr("local_repairs")
+                    sql = repaired["sql"]
+                    print(f"\nStep 10: Rule-Based Repair")
+                    print(f" Fixed: {'; '.join(repaired['fixes'])}")
+                    print(f"New SQL:\n{sql}")
+                    continue
+
                 print(f"\nStep 10: Correction Agent for Execution Errors Fix")
                 print(" Analyzing execution error to fix SQL...")
                 
@@ -296,7 +444,8 @@ def run_text_to_sql_pipeline(question: str) -> dict:
                     plan,
                     sql,
                     execution_verification,
-                    execution_feedback=execution.get('error', '')
+                    execution_feedback=execution_feedback_for(sql, execution),
+                    distinct_values=distinct_values_for(DB_PATH, sql)
                 )
                 
                 if correction["action"] == "correct_sql" and "corrected_sql" in correction:
@@ -337,18 +486,154 @@ def run_text_to_sql_pipeline(question: str) -> dict:
         "pipeline_attempts": pipeline_attempt + 1
     }
 
+async def run_text_to_sql_pipeline_async(question: str, save_to_memory: bool = False) -> dict:
+    """
+    Async variant of run_text_to_sql_pipeline for serving many questions from one event loop.
+
+    Runs the same agents with the same retry budgets, but without console output or
+    interactive prompts (progress and debug details go to the log). Successful queries
+    are saved to memory only if save_to_memory is set. When the last pipeline running
+    on the event loop finishes, the loop's pooled HTTP clients are closed.
+    """
+    loop = asyncio.get_running_loop()
+    _active_pipelines[loop] = _active_pipelines.get(loop, 0) + 1
+    try:
+        with tracing.trace_question(question) as trace:
+            result = await _run_text_to_sql_pipeline_async(question, save_to_memory)
+            trace.set("status", result["status"])
+    finally:
+        _active_pipelines[loop] -= 1
+        if not _active_pipelines[loop]:
+            del _active_pipelines[loop]
+            await transport.close_async_clients()
+    result["trace_id"] = trace.id
+    return result
+
+async def _run_text_to_sql_pipeline_async(question: str, save_to_memory: bool) -> dict:
+    logger = get_logger()
+
+    retrieved_examples = await retrieve_async(question)
+    schema_linking = await schema_linking_agent_async(question, await asyncio.to_thread(get_schema_from_db), db_path=DB_PATH)
+    schema_context = normalize_schema_context(schema_linking)
+
+    error_feedback = ""
+    sql = None
+    execution = None
+
+    for pipeline_attempt in range(MAX_FULL_PIPELINE_RETRIES):
+        if pipeline_attempt > 0:
+            tracing.incr("pipeline_retries")
+        first_pass = None
+        if PIPELINE_CANDIDATES > 1 and pipeline_attempt == 0:
+            first_pass, error_feedback = await run_candidates_async(question, schema_context)
+        elif PIPELINE_FAST_PATH and pipeline_attempt == 0:
+            first_pass = await run_fast_path_async(question, schema_context)
+
+        if first_pass:
+            plan, sql = first_pass
+        else:
+            plan = await planning_agent_async(question, schema_context)
+
+            try:
+                sql = await sql_generation_agent_async(schema_context, plan, retrieved_examples, error_feedback=error_feedback)
+            except ValueError as e:
+                logger.warning(f"SQL generation failed for {question!r}: {str(e)}")
+                error_feedback = str(e)
+                continue
+
+            for attempt in range(MAX_VERIFICATION_CORRECTIONS):
+                verification = await verification_agent_async(schema_context, plan, sql, db_path=DB_PATH)
+                if verification["is_valid"]:
+                    break
+
+                tracing.incr("verification_corrections")
+                if verification.get("checked_by") == "static":
+                    repaired = await asyncio.to_thread(repair_sql, DB_PATH, sql)
+                    if repaired:
+                        tracing.incr("local_repairs")
+                        sql = repaired["sql"]
+                        continue
+                correction = await correction_agent_async(
+                    schema_context, plan, sql, verification,
+                    execution_feedback=await asyncio.to_thread(performance_feedback, DB_PATH, sql),
+                    distinct_values=await asyncio.to_thread(distinct_values_for, DB_PATH, sql)
+                )
+                if correction["action"] != "correct_sql":
+                    error_feedback = f"Verification failed: {', '.join(verification.get('issues', []))}. Correction failed: {correction.get('reasoning', 'Unknown')}."
+                    break
+                sql = correction["corrected_sql"]
+
+        for exec_attempt in range(MAX_EXECUTION_RETRIES):
+            plan_feedback = await asyncio.to_thread(performance_feedback, DB_PATH, sql)
+            if plan_feedback:
+                logger.info(f"Costly query plan for {question!r}:\n{plan_feedback}")
+            execution = await asyncio.to_thread(execute_sql, DB_PATH, sql)
+
+            if execution["success"]:
+                if save_to_memory:
+                    await asyncio.to_thread(add, question, sql, logger.info)
+                return {
+                    "status": "success",
+                    "sql": sql,
+                    "result": execution,
+                    "pipeline_attempts": pipeline_attempt + 1,
+                    "excecution_attempts": exec_attempt + 1
+                }
+
+            tracing.incr("execution_retries")
+            logger.warning(f"Execution failed for {question!r} (attempt {exec_attempt + 1}): {execution.get('error')}")
+            if exec_attempt < MAX_EXECUTION_RETRIES - 1:
+                repaired = await asyncio.to_thread(repair_sql, DB_PATH, sql, execution.get("error"))
+                if repaired:
+                    tracing.incr("local_repairs")
+                    sql = repaired["sql"]
+                    continue
+                execution_verification = {
+                    "is_valid": False,
+                    "issues": [f"Execution error: {execution.get('error', 'Unknown error')}"],
+                    "severity": "critical"
+                }
+                correction = await correction_agent_async(
+                    schema_context,
+                    plan,
+                    sql,
+                    execution_verification,
+                    execution_feedback=await asyncio.to_thread(execution_feedback_for, sql, execution),
+                    distinct_values=await asyncio.to_thread(distinct_values_for, DB_PATH, sql)
+                )
+                if correction["action"] == "correct_sql" and "corrected_sql" in correction:
+                    sql = correction["corrected_sql"]
+                else:
+                    error_feedback = f"Execution failed: {execution.get('error', 'Unknown error')}. Correction failed: {correction.get('reasoning', 'Unknown')}."
+                    break
+            else:
+                error_feedback = f"Execution failed: {execution.get('error', 'Unknown error')} after {MAX_EXECUTION_RETRIES} attempts."
+
+    return {
+        "status": "failed",
+        "reason": "All pipeline attempts exhausted.",
+        "error_feedback": error_feedback,
+        "sql": sql,
+        "result": execution,
+        "pipeline_attempts": pipeline_attempt + 1
+    }
+
 if __name__ == "__main__":
     print("\n" + "="*80)
     print("TEXT-TO-SQL AGENTS PIPELINE")
     print("="*80 + "\n")
     print("Initializing schema from database...")
-    tables = [t[0] for t in sqlite3.connect(DB_PATH).cursor().execute("SELECT name FROM sqlite_master WHERE type='table';").fetchall()]
+    tables = get_catalog(DB_PATH).table_names()
     print(f" Database loaded with {len(tables)} tables: {', '.join(tables)}\n")
     print("\n Type 'exit' to quit.\n")
 
     while True:
         q = input("\n" + "-"*80 + "\nAsk a question (or exit): ")
         if q.lower() == "exit":
+            summary = tracing.histograms.summary()
+            if summary:
+                print("\nPer-stage latency this session:")
+                print(tracing.format_summary(summary))
             print("Exiting Text-to-SQL Agents Pipeline. Goodbye!")
             break
             
@@ -1,90 +1,144 @@
+"""
+Query Memory Builder
+Author: Mayank Goyal
+Reference: "Text-to-SQL Agents in Practice"
+
+Seeds the query memory with question/SQL pairs (query_memory/seed_questions.json
+by default). Entries are keyed by a hash of the question (store.memory_id), so
+re-running updates entries in place instead of colliding. An entry whose
+question, SQL and embedding model are unchanged is skipped without
+embedding.
+
+Pending questions are embedded MEMORY_BUILD_BATCH_SIZE at a time: one
+request per batch for OpenAI and Ollama's /api/embed, else
+EMBEDDING_CONCURRENCY parallel requests. Each batch is upserted as soon as
+it is embedded, so an interrupted build resumes where it stopped.
+
+Usage:
+    python query_memory/build_memory.py                    # seed_questions.json
+    python query_memory/build_memory.py more_pairs.json --batch-size 256
+    python query_memory/build_memory.py --rebuild          # recreate the memory (after switching models)
+    python query_memory/build_memory.py --prune            # also drop seeds no longer in the files
+"""
+
 import json
-import chromadb
 import os
+import sys
+import time
 from dotenv import load_dotenv
-import requests
 
-import urllib3
-#Disable insecure request warnings for OpenAI calls
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+# Allow running as `python query_memory/build_memory.py` from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import embeddings
+from query_memory import store
 
 load_dotenv()
 
-EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "ollama").lower()  # "ollama" or "openai"
+MEMORY_BUILD_BATCH_SIZE = int(os.getenv("MEMORY_BUILD_BATCH_SIZE", "128"))
 
-OLLAMA_ENDPOINT = os.getenv("OLLAMA_ENDPOINT", "http://localhost:11434")
-OLLAMA_EMBEDDING_MODEL = os.getenv("OLLAMA_EMBEDDING_MODEL", "nomic-embed-text")
+SEED_PATH = "query_memory/seed_questions.json"
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
-OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-large")
+# Ids per collection.get call
+LOOKUP_CHUNK = 500
 
-client = chromadb.Client(
-    chromadb.config.Settings(
-        persist_directory="query_memory/chroma_store"
-    )
-)
+def load_examples(paths: list) -> list:
+    """Question/SQL pairs from JSON files; a question listed twice keeps its last SQL"""
+    examples = {}
+    for path in paths:
+        with open(path) as f:
+            items = json.load(f)
+        for item in items:
+            if not item.get("question") or not item.get("sql"):
+                print(f"Warning: Skipping entry without question or SQL in {path}")
+                continue
+            examples[store.memory_id(item["question"])] = item
+    return list(examples.values())
 
-collection = client.get_or_create_collection(
-    name="query_memory"
-)
+def stored_hashes(collection, ids: list) -> dict:
+    """id -> content hash of the entries already in the collection"""
+    hashes = {}
+    for start in range(0, len(ids), LOOKUP_CHUNK):
+        found = collection.get(ids=ids[start:start + LOOKUP_CHUNK], include=["metadatas"])
+        for entry_id, metadata in zip(found["ids"], found["metadatas"]):
+            hashes[entry_id] = (metadata or {}).get("content_hash")
+    return hashes
 
-def embed_with_ollama(text: str):
-    try:
-        resp = requests.post(
-            f"{OLLAMA_ENDPOINT}/api/embeddings",
-            json={"model": OLLAMA_EMBEDDING_MODEL, "prompt": text}
-        )
-        resp.raise_for_status()
-        return resp.json()["embedding"]
-    except Exception as e:
-        print(f"Error: Ollama embedding failed ({str(e)})")
-        print(f"Make sure Ollama is running: ollama serve")
-        print(f"And pull the model: ollama pull {OLLAMA_EMBEDDING_MODEL}")
-        raise
-
-def embed_with_openai(text: str):
-    try:
-        resp = requests.post(
-            "https://api.openai.com/v1/embeddings",
-            headers={
-                "Authorization": f"Bearer {OPENAI_API_KEY}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": OPENAI_EMBEDDING_MODEL,
-                "input": text
-            },
-            verify=False
-        )
-        resp.raise_for_status()
-        res =  resp.json()
-        return res["data"][0]["embedding"]
-    except Exception as e:
-        print(f"Error: OpenAI embedding failed ({str(e)})")
-        print(f"Make sure your OpenAI API key is correct and has access to the model {OPENAI_EMBEDDING_MODEL}")
-        raise
-
-def embed(text: str):
-    if EMBEDDING_PROVIDER == "openai":
-        return embed_with_openai(text)
+def build(examples: list, batch_size: int = MEMORY_BUILD_BATCH_SIZE, rebuild: bool = False,
+          prune: bool = False) -> dict:
+    """
+    Embed and upsert new or changed examples; returns counts and timings.
+    rebuild recreates the collection first, dropping queries the pipeline stored.
+    """
+    collection = store.reset_collection() if rebuild else store.get_collection()
+    if collection is None:
+        raise RuntimeError("Query Memory is unavailable (is chromadb installed?)")
+
+    started = time.perf_counter()
+    entries = {
+        store.memory_id(item["question"]): (item["question"], item["sql"],
+                                            store.content_hash(item["question"], item["sql"]))
+        for item in examples
+    }
+    current = stored_hashes(collection, list(entries))
+    pending = [(entry_id, *entry) for entry_id, entry in entries.items() if current.get(entry_id) != entry[2]]
+
+    stats = {"total": len(entries), "unchanged": len(entries) - len(pending), "embedded": 0,
+             "failed": 0, "pruned": 0, "embed_seconds": 0.0}
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        embed_started = time.perf_counter()
+        vectors = embeddings.embed_many([question for _, question, _, _ in batch], batch_size=batch_size)
+        stats["embed_seconds"] += time.perf_counter() - embed_started
+
+        done = [(entry, vector) for entry, vector in zip(batch, vectors) if vector is not None]
+        stats["failed"] += len(batch) - len(done)
+        if done:
+            collection.upsert(
+                ids=[entry_id for (entry_id, _, _, _), _ in done],
+                documents=[question for (_, question, _, _), _ in done],
+                embeddings=[vector for _, vector in done],
+                metadatas=[{"sql": sql, "source": "seed", "content_hash": digest} for (_, _, sql, digest), _ in done]
+            )
+            stats["embedded"] += len(done)
+        rate = stats["embedded"] / stats["embed_seconds"] if stats["embed_seconds"] else 0.0
+        print(f"  {min(start + batch_size, len(pending))}/{len(pending)} embedded ({rate:.1f} questions/s)")
+
+    if prune:
+        seeded = collection.get(where={"source": "seed"}, include=[])["ids"]
+        stale = [entry_id for entry_id in seeded if entry_id not in entries]
+        if stale:
+            collection.delete(ids=stale)
+        stats["pruned"] = len(stale)
+
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    batch_size = MEMORY_BUILD_BATCH_SIZE
+    if "--batch-size" in args:
+        position = args.index("--batch-size")
+        batch_size = int(args[position + 1])
+        del args[position:position + 2]
+    rebuild, prune = "--rebuild" in args, "--prune" in args
+    paths = [arg for arg in args if not arg.startswith("--")] or [SEED_PATH]
+
+    print(f"Building Query Memory with {embeddings.EMBEDDING_PROVIDER} embeddings...")
+    if embeddings.EMBEDDING_PROVIDER == "openai":
+        print(f"Using OpenAI Embedding Model: {embeddings.OPENAI_EMBEDDING_MODEL}")
     else:
-        return embed_with_ollama(text)
-    
-print(f"Building Query Memory with {EMBEDDING_PROVIDER} embeddings...")
-if EMBEDDING_PROVIDER == "openai":
-    print(f"Using OpenAI Embedding Model: {OPENAI_EMBEDDING_MODEL}")
-else:
-    print(f"Using Ollama Embedding Model: {OLLAMA_EMBEDDING_MODEL} at {OLLAMA_ENDPOINT}")
-
-with open("query_memory/seed_questions.json") as f:
-    examples = json.load(f)
-
-for idx, item in enumerate(examples):
-    collection.add(
-        ids=[f"seed_{idx}"],
-        documents=[item["question"]],
-        embeddings=[embed(item["question"])],
-        metadatas=[{"sql": item["sql"]}]
-    )
-
-print(f"Seeded {len(examples)} queries into Query Memory")
+        print(f"Using Ollama Embedding Model: {embeddings.OLLAMA_EMBEDDING_MODEL} at {embeddings.OLLAMA_ENDPOINT}")
+
+    examples = load_examples(paths)
+    try:
+        stats = build(examples, batch_size, rebuild=rebuild, prune=prune)
+    except RuntimeError as e:
+        print(f"Error: {str(e)}")
+        sys.exit(1)
+
+    rate = stats["embedded"] / stats["embed_seconds"] if stats["embed_seconds"] else 0.0
+    print(f"Seeded {stats['total']} queries into Query Memory: {stats['embedded']} embedded, "
+          f"{stats['unchanged']} unchanged, {stats['failed']} failed"
+          + (f", {stats['pruned']} pruned" if prune else ""))
+    print(f"Done in {stats['seconds']:.1f}s ({rate:.1f} questions/s embedding, batch size {batch_size})")
+    sys.exit(1 if stats["failed"] else 0)
@@ -3,142 +3,159 @@ Query Memory Store with Semantic Search
 Author: Mayank Goyal
 Reference: "Text-to-SQL Agents in Practice"
 
-Supports embeddings from both Ollama and OpenAI providers
+Embeddings come from utils.embeddings (Ollama or OpenAI)
+
+The Chroma client is created on first use (get_collection), so importing
+this module does not import chromadb or touch the store on disk. The store
+persists under QUERY_MEMORY_PATH. Entries are keyed by a hash of the
+question (memory_id), so storing a question again updates it in place.
 """
 
-import chromadb
+import asyncio
+import hashlib
+import json
 import os
+import threading
 from dotenv import load_dotenv
-import requests
-
-import urllib3
-#Disable insecure request warnings for OpenAI calls
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-import hashlib
-from datetime import datetime
+from utils import embeddings
+from utils.logging import get_logger
 
 load_dotenv()
 
-# Embedding provider configuration
-EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "ollama").lower()  # "ollama" or "openai"
+QUERY_MEMORY_PATH = os.getenv("QUERY_MEMORY_PATH", "query_memory/chroma_store")
 
-# Ollama configuration
-OLLAMA_ENDPOINT = os.getenv("OLLAMA_ENDPOINT", "http://localhost:11434")
-OLLAMA_EMBEDDING_MODEL = os.getenv("OLLAMA_EMBEDDING_MODEL", "nomic-embed-text")
+COLLECTION_NAME = "query_memory"
 
-# OpenAI configuration
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
-OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-large")
+_client = None
+_collection = None
+_collection_lock = threading.Lock()
+_collection_failed = False
 
-try:
-    client = chromadb.Client(
-        chromadb.config.Settings(
-            persist_directory="query_memory/chroma_store"
-        )
-    )
-    collection = client.get_or_create_collection("query_memory")
-    QUERY_MEMORY_ENABLED = True
-except Exception as e:
-    print(f"Warning: Query Memory disabled ({str(e)})")
-    QUERY_MEMORY_ENABLED = False
-
-def embed_with_ollama(text: str):
-    """Generate embeddings using Ollama"""
-    try:
-        resp = requests.post(
-            f"{OLLAMA_ENDPOINT}/api/embeddings",
-            json={"model": OLLAMA_EMBEDDING_MODEL, "prompt": text}
-        )
-        resp.raise_for_status()
-        return resp.json()["embedding"]
-    except Exception as e:
-        print(f"Warning: Ollama embedding failed ({str(e)}). Make sure Ollama is running on {OLLAMA_ENDPOINT}")
-        return None
+def get_collection():
+    """The query memory collection, or None if Chroma is unavailable (warns once)"""
+    global _client, _collection, _collection_failed
+    if _collection is None and not _collection_failed:
+        with _collection_lock:
+            if _collection is None and not _collection_failed:
+                try:
+                    import chromadb
+                    if hasattr(chromadb, "PersistentClient"):
+                        _client = chromadb.PersistentClient(path=QUERY_MEMORY_PATH)
+                    else:
+                        # chromadb < 0.4
+                        _client = chromadb.Client(
+                            chromadb.config.Settings(
+                                chroma_db_impl="duckdb+parquet",
+                                persist_directory=QUERY_MEMORY_PATH
+                            )
+                        )
+                    _collection = _open_collection()
+                except Exception as e:
+                    print(f"Warning: Query Memory disabled ({str(e)})")
+                    _collection_failed = True
+    return _collection
 
-def embed_with_openai(text: str):
-    """Generate embeddings using OpenAI"""
-    try:
-        resp = requests.post(
-            "https://api.openai.com/v1/embeddings",
-            headers={
-                "Authorization": f"Bearer {OPENAI_API_KEY}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": OPENAI_EMBEDDING_MODEL,
-                "input": text
-            },
-            verify=False
-        )
-        resp.raise_for_status()
-        result = resp.json()
-        return result["data"][0]["embedding"]
-    except Exception as e:
-        print(f"Warning: OpenAI embedding failed ({str(e)}). Check your API key and internet connection.")
+def _open_collection():
+    # Cosine space: retrieval reads 1 - distance as the similarity
+    return _client.get_or_create_collection(COLLECTION_NAME, metadata={"hnsw:space": "cosine"})
+
+def reset_collection():
+    """Drop every entry by recreating the collection (e.g. after an embedding model change)"""
+    global _collection
+    if get_collection() is None:
         return None
+    with _collection_lock:
+        _client.delete_collection(COLLECTION_NAME)
+        _collection = _open_collection()
+    return _collection
+
+def memory_id(question: str) -> str:
+    """Stable entry id: hash of the question, whitespace and case normalized"""
+    normalized = " ".join(question.split()).lower()
+    return "qmem_" + hashlib.sha256(normalized.encode()).hexdigest()[:16]
+
+def content_hash(question: str, sql: str) -> str:
+    """Hash of what an entry's embedding and metadata depend on"""
+    payload = json.dumps([question, sql, embeddings.embedding_model()])
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
 
 def embed(text: str):
-    if not QUERY_MEMORY_ENABLED:
+    if get_collection() is None:
+        return None
+    return embeddings.embed(text)
+
+async def embed_async(text: str):
+    if await asyncio.to_thread(get_collection) is None:
         return None
-    
-    if EMBEDDING_PROVIDER == "openai":
-        return embed_with_openai(text)
+    return await embeddings.embed_async(text)
+
+def _nearest_sql(emb, threshold: float, report=print) -> str:
+    """Return the SQL of the closest stored question if it clears the threshold (outcome sent to report)"""
+    try:
+        result = get_collection().query(
+            embeddings=[emb],
+            n_results=1
+        )
+    except TypeError:
+        # Fallback for older chromadb versions
+        result = get_collection().query(
+            query_embeddings=[emb],
+            n_results=1
+        )
+    if not result["distances"] or not result["distances"][0]:
+        return ""
+
+    similarity = 1 - result["distances"][0][0]
+    if similarity >= threshold:
+        similar_question = result["documents"][0][0] if result["documents"] else "N/A"
+        retrieved_sql = result["metadatas"][0][0]["sql"]
+        report(f" Found similar query in memory (similarity: {similarity:.2f}): '{similar_question}'")
+        return retrieved_sql
     else:
-        return embed_with_ollama(text)
+        report(f" No similar query found in memory (highest similarity: {similarity:.2f}, threshold: {threshold})")
+    return ""
 
 def retrieve(question: str, threshold: float = 0.8) -> str:
-    if not QUERY_MEMORY_ENABLED:
+    if get_collection() is None:
         return ""
     try:
         emb = embed(question)
         if emb is None:
             return ""
-        try:
-            result = collection.query(
-                embeddings=[emb],
-                n_results=1
-            )
-        except TypeError:
-            # Fallback for older chromadb versions
-            result = collection.query(
-                query_embeddings=[emb],
-                n_results=1
-            )
-        if not result["distances"] or not result["distances"][0]:
-            return ""
-
-        similarity = 1 - result["distances"][0][0]
-        if similarity >= threshold:
-            similar_question = result["documents"][0][0] if result["documents"] else "N/A"
-            retrieved_sql = result["metadatas"][0][0]["sql"]
-            print(f" Found similar query in memory (similarity: {similarity:.2f}): '{similar_question}'")
-            return retrieved_sql
-        else:
-            print(f" No similar query found in memory (highest similarity: {similarity:.2f}, threshold: {threshold})")
+        return _nearest_sql(emb, threshold)
     except Exception as e:
         print(f"  Query Memory retrieval failed ({str(e)})")
     return ""
 
-def add(question: str, sql: str):
-    if not QUERY_MEMORY_ENABLED:
+async def retrieve_async(question: str, threshold: float = 0.8) -> str:
+    """Async variant of retrieve; the Chroma lookup runs in a worker thread and reports to the log"""
+    if await asyncio.to_thread(get_collection) is None:
+        return ""
+    try:
+        emb = await embed_async(question)
+        if emb is None:
+            return ""
+        return await asyncio.to_thread(_nearest_sql, emb, threshold, get_logger().info)
+    except Exception as e:
+        get_logger().warning(f"Query Memory retrieval failed ({str(e)})")
+    return ""
+
+def add(question: str, sql: str, report=print):
+    if get_collection() is None:
         return
     try:
         emb = embed(question)
-        if emb is not None:
-            print(" Could not generate embedding, skipping addition to Query Memory.")
+        if emb is None:
+            report(" Could not generate embedding, skipping addition to Query Memory.")
             return
-        
-        #Generate unique ID using hash of question and current timestamp
-        question_hash = hashlib.md5(question.encode()).hexdigest()[:8]
-        timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
-        unique_id = f"qmem_{question_hash}_{timestamp}"
 
-        collection.add(
+        unique_id = memory_id(question)
+        get_collection().upsert(
             ids=[unique_id],
             documents=[question],
             embeddings=[emb],
-            metadatas=[{"sql": sql}]
+            metadatas=[{"sql": sql, "source": "pipeline", "content_hash": content_hash(question, sql)}]
         )
-        print(" Added new query to Query Memory (ID: {unique_id}).")
+        report(f" Added new query to Query Memory (ID: {unique_id}).")
     except Exception as e:
         print(f"Warning: Could not add to Query Memory ({str(e)})")
@@ -0,0 +1,50 @@
+"""
+Shared test setup: every cache and log lives in a temporary directory and no
+provider is reachable, so the tests run offline against data/chinook.db.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CHINOOK = os.path.join(ROOT, "data", "chinook.db")
+
+# Set before any repo module is imported (they read their settings at import time)
+_CACHE_DIR = tempfile.mkdtemp(prefix="text2sql-tests-")
+os.environ.update({
+    "LLM_PROVIDER": "ollama",
+    "EMBEDDING_PROVIDER": "ollama",
+    "OLLAMA_ENDPOINT": "http://127.0.0.1:9",
+    "HTTP_CONNECT_TIMEOUT": "0.5",
+    "LLM_CACHE_PATH": os.path.join(_CACHE_DIR, "llm_cache.sqlite"),
+    "SCHEMA_CATALOG_DIR": os.path.join(_CACHE_DIR, "schema_catalog"),
+    "SCHEMA_INDEX_DIR": os.path.join(_CACHE_DIR, "schema_index"),
+    "SCHEMA_INDEX_EMBEDDINGS": "false",
+    "SCHEMA_PRUNE_CACHE_DIR": os.path.join(_CACHE_DIR, "schema_pruning"),
+    "SCHEMA_PRUNE_EMBEDDINGS": "false",
+    "VALUE_INDEX_DIR": os.path.join(_CACHE_DIR, "value_index"),
+    "QUERY_MEMORY_PATH": os.path.join(_CACHE_DIR, "chroma_store"),
+    "TRACE_EXPORT": "false",
+    "TRACE_DIR": os.path.join(_CACHE_DIR, "traces"),
+    "LOG_DIR": os.path.join(_CACHE_DIR, "logs"),
+})
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_CACHE_DIR, ignore_errors=True)
+
+@pytest.fixture
+def chinook() -> str:
+    return CHINOOK
+
+@pytest.fixture
+def chinook_copy(tmp_path) -> str:
+    """A writable copy of the Chinook database"""
+    path = str(tmp_path / "chinook.db")
+    shutil.copyfile(CHINOOK, path)
+    return path
@@ -0,0 +1,109 @@
+import asyncio
+import json
+
+import pytest
+
+import main
+from agents import correction, fast_path, planning, schema_linking, sql_generation, verification
+from conftest import ROOT
+from utils import transport
+
+SQL = {
+    "How many genres are there?": "SELECT COUNT(*) FROM Genre;",
+    "How many artists are there?": "SELECT COUNT(*) FROM Artist;",
+    "How many albums are there?": "SELECT COUNT(*) FROM Album;",
+}
+
+@pytest.fixture
+def llm(monkeypatch, chinook):
+    """
+    Scripted async LLM shared by the agents: answers by agent name and records
+    the calls and how many were in flight at once
+    """
+    state = {"calls": [], "in_flight": 0, "max_in_flight": 0, "sql": dict(SQL), "corrected_sql": None}
+
+    # The planner copies the question into the intent, so later prompts still name it
+    def question_of(user_prompt):
+        return next((q for q in state["sql"] if q in user_prompt), None)
+
+    async def call_llm_async(system_prompt, user_prompt, temperature=0.0, agent=None, stop_factory=None, priority=None):
+        state["calls"].append(agent)
+        state["in_flight"] += 1
+        state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+        await asyncio.sleep(0.01)
+        state["in_flight"] -= 1
+        if agent == "schema_linking":
+            return json.dumps({"relevant_tables": ["Genre", "Artist", "Album"]})
+        if agent == "planning":
+            return json.dumps({"intent": question_of(user_prompt)})
+        if agent == "sql_generation":
+            return state["sql"][question_of(user_prompt)]
+        if agent == "fast_path":
+            return json.dumps({"plan": {"intent": question_of(user_prompt)}, "sql": state["sql"][question_of(user_prompt)]})
+        if agent == "correction":
+            return json.dumps({"action": "correct_sql", "corrected_sql": state["corrected_sql"], "reasoning": "fixed"})
+        raise AssertionError(f"unexpected LLM call for {agent}")
+
+    for module in (schema_linking, planning, sql_generation, fast_path, correction):
+        monkeypatch.setattr(module, "call_llm_async", call_llm_async)
+
+    async def retrieve_async(question, threshold=0.8):
+        return ""
+
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setattr(main, "DB_PATH", chinook)
+    monkeypatch.setattr(main, "retrieve_async", retrieve_async)
+    monkeypatch.setattr(main, "PIPELINE_CANDIDATES", 1)
+    monkeypatch.setattr(main, "PIPELINE_FAST_PATH", False)
+    monkeypatch.setattr(verification, "VERIFICATION_MODE", "static")
+    return state
+
+def run(*questions):
+    async def pipeline():
+        return await asyncio.gather(*(main.run_text_to_sql_pipeline_async(q) for q in questions))
+    return asyncio.run(pipeline())
+
+def test_questions_run_concurrently_on_one_loop(llm, capsys):
+    results = run(*SQL)
+    assert capsys.readouterr().out == ""
+    assert [r["status"] for r in results] == ["success"] * 3
+    assert [r["result"]["rows"][0][0] for r in results] == [25, 275, 347]
+    assert len({r["trace_id"] for r in results}) == 3
+    assert llm["max_in_flight"] == 3
+    assert llm["calls"].count("sql_generation") == 3
+
+def test_fast_path_skips_planning(llm, monkeypatch):
+    monkeypatch.setattr(main, "PIPELINE_FAST_PATH", True)
+    result, = run("How many genres are there?")
+    assert result["status"] == "success" and result["sql"] == "SELECT COUNT(*) FROM Genre;"
+    assert llm["calls"].count("fast_path") == 1
+    assert "planning" not in llm["calls"] and "sql_generation" not in llm["calls"]
+
+def test_static_errors_are_repaired_without_the_llm(llm):
+    llm["sql"]["How many genres are there?"] = "SELECT COUNT(GenreID) FROM Genres;"
+    result, = run("How many genres are there?")
+    assert result["status"] == "success" and result["result"]["rows"][0][0] == 25
+    assert "correction" not in llm["calls"]
+
+def test_execution_errors_go_to_the_correction_agent(llm):
+    llm["sql"]["How many genres are there?"] = "SELECT Name FROM Genre WHERE GenreId = 1 / 0 + abs(-9223372036854775808);"
+    llm["corrected_sql"] = "SELECT COUNT(*) FROM Genre;"
+    result, = run("How many genres are there?")
+    assert result["status"] == "success" and result["sql"] == "SELECT COUNT(*) FROM Genre;"
+    assert llm["calls"].count("correction") == 1
+
+def test_http_clients_close_with_the_last_question(monkeypatch):
+    clients = []
+
+    async def pipeline(question, save_to_memory):
+        client = transport.get_async_client("http://127.0.0.1:9/api/chat")
+        await asyncio.sleep(0.01 if question == "fast" else 0.05)
+        clients.append((question, client, client.is_closed))
+        return {"status": "success"}
+
+    monkeypatch.setattr(main, "_run_text_to_sql_pipeline_async", pipeline)
+    run("fast", "slow")
+    (_, first, first_closed), (_, second, second_closed) = clients
+    # One pooled client is shared while both questions run, then closed
+    assert first is second and not first_closed and not second_closed
+    assert first.is_closed and main._active_pipelines == {}
@@ -0,0 +1,94 @@
+import json
+
+import pytest
+
+from query_memory import build_memory, store
+from utils import embeddings
+
+class MemoryCollection:
+    """In-process stand-in for the Chroma collection API the builder uses"""
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, ids=None, where=None, include=None):
+        keys = [i for i in (ids if ids is not None else self.entries) if i in self.entries]
+        if where:
+            keys = [i for i in keys if all(self.entries[i]["metadata"].get(k) == v for k, v in where.items())]
+        return {"ids": keys, "metadatas": [self.entries[i]["metadata"] for i in keys]}
+
+    def upsert(self, ids, documents, embeddings, metadatas):
+        for entry_id, document, vector, metadata in zip(ids, documents, embeddings, metadatas):
+            self.entries[entry_id] = {"document": document, "embedding": vector, "metadata": metadata}
+
+    def delete(self, ids):
+        for entry_id in ids:
+            self.entries.pop(entry_id, None)
+
+@pytest.fixture
+def collection(monkeypatch):
+    collection = MemoryCollection()
+    monkeypatch.setattr(store, "get_collection", lambda: collection)
+    return collection
+
+@pytest.fixture
+def embedded(monkeypatch):
+    """Questions sent to the embedding provider, one list per batch"""
+    batches = []
+
+    def embed_many(texts, batch_size=None):
+        batches.append(list(texts))
+        return [None if "unembeddable" in t else [float(len(t)), 1.0] for t in texts]
+
+    monkeypatch.setattr(embeddings, "embed_many", embed_many)
+    return batches
+
+EXAMPLES = [
+    {"question": "How many genres are there?", "sql": "SELECT COUNT(*) FROM Genre"},
+    {"question": "List all artists", "sql": "SELECT Name FROM Artist"},
+    {"question": "Top 5 customers by total spend", "sql": "SELECT CustomerId FROM Invoice GROUP BY 1 LIMIT 5"},
+]
+
+def test_load_examples_keeps_the_last_sql_per_question(tmp_path):
+    path = tmp_path / "pairs.json"
+    path.write_text(json.dumps(EXAMPLES + [
+        {"question": "how many  GENRES are there?", "sql": "SELECT COUNT(GenreId) FROM Genre"},
+        {"question": "No SQL"},
+    ]))
+    examples = build_memory.load_examples([str(path)])
+    assert len(examples) == 3
+    assert examples[0]["sql"] == "SELECT COUNT(GenreId) FROM Genre"
+
+def test_build_is_batched_and_incremental(collection, embedded):
+    stats = build_memory.build(EXAMPLES, batch_size=2)
+    assert (stats["total"], stats["embedded"], stats["unchanged"], stats["failed"]) == (3, 3, 0, 0)
+    assert [len(batch) for batch in embedded] == [2, 1]
+
+    # Unchanged entries are skipped without embedding; a changed SQL is re-embedded in place
+    changed = EXAMPLES[:2] + [dict(EXAMPLES[2], sql="SELECT CustomerId FROM Invoice LIMIT 5")]
+    stats = build_memory.build(changed, batch_size=2)
+    assert (stats["embedded"], stats["unchanged"]) == (1, 2)
+    assert embedded[-1] == ["Top 5 customers by total spend"]
+    assert len(collection.entries) == 3
+    entry = collection.entries[store.memory_id(EXAMPLES[2]["question"])]
+    assert entry["metadata"]["sql"] == "SELECT CustomerId FROM Invoice LIMIT 5"
+
+def test_failed_embeddings_are_retried_on_the_next_build(collection, embedded):
+    examples = EXAMPLES + [{"question": "An unembeddable question", "sql": "SELECT 1"}]
+    assert build_memory.build(examples)["failed"] == 1
+    assert len(collection.entries) == 3
+    stats = build_memory.build(examples)
+    assert (stats["embedded"], stats["failed"]) == (0, 1)
+    assert embedded[-1] == ["An unembeddable question"]
+
+def test_prune_drops_seeds_no_longer_listed(collection, embedded):
+    build_memory.build(EXAMPLES)
+    collection.upsert(["qmem_user"], ["asked at runtime"], [[1.0]], [{"sql": "SELECT 2", "source": "pipeline"}])
+    stats = build_memory.build(EXAMPLES[:1], prune=True)
+    assert stats["pruned"] == 2
+    assert set(collection.entries) == {store.memory_id(EXAMPLES[0]["question"]), "qmem_user"}
+
+def test_unavailable_memory_raises(monkeypatch):
+    monkeypatch.setattr(store, "get_collection", lambda: None)
+    with pytest.raises(RuntimeError, match="Query Memory is unavailable"):
+        build_memory.build(EXAMPLES)
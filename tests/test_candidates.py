@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from agents import candidates
+
+SCHEMA_CONTEXT = {"tables": ["Genre"], "columns": {"Genre": ["GenreId", "Name"]}, "relationships": []}
+PLAN = {"intent": "count genres"}
+
+def fake_fast_path(outcomes: dict):
+    """fast_path_agent stand-in: the outcome per temperature is SQL or an exception to raise"""
+    def agent(question, schema_context, temperature=0.0):
+        outcome = outcomes[temperature]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return {"query_plan": PLAN, "sql": outcome}
+    return agent
+
+OUTCOMES = {
+    0.0: "SELECT COUNT(*) FROM Genre",
+    0.4: ConnectionError("provider unreachable"),
+    0.7: KeyError("sql"),
+    1.0: "SELECT COUNT(GenreId) FROM Genre",
+}
+
+def test_failed_generations_do_not_abort_the_others(chinook, monkeypatch):
+    monkeypatch.setattr(candidates, "fast_path_agent", fake_fast_path(OUTCOMES))
+    generated = candidates.generate_candidates("How many genres?", SCHEMA_CONTEXT, 4)
+    assert [c["sql"] is not None for c in generated] == [True, False, False, True]
+    assert generated[1]["error"] == "ConnectionError: provider unreachable"
+    assert generated[2]["error"].startswith("KeyError")
+
+    winner = candidates.select_candidate(chinook, generated)
+    assert winner["index"] == 0
+    assert winner["agreement"] == 2
+
+def test_failed_generations_do_not_abort_the_others_async(chinook, monkeypatch):
+    async def agent(question, schema_context, temperature=0.0):
+        await asyncio.sleep(0)
+        return fake_fast_path(OUTCOMES)(question, schema_context, temperature)
+    monkeypatch.setattr(candidates, "fast_path_agent_async", agent)
+
+    async def run():
+        generated = await candidates.generate_candidates_async("How many genres?", SCHEMA_CONTEXT, 4)
+        return generated, await candidates.select_candidate_async(chinook, generated)
+    generated, winner = asyncio.run(run())
+    assert sum(1 for c in generated if c["error"]) == 2
+    assert winner["agreement"] == 2
+
+def test_consensus_prefers_the_majority_result(chinook):
+    generated = [
+        candidates._candidate(0, 0.0, PLAN, "SELECT COUNT(*) FROM Artist"),
+        candidates._candidate(1, 0.4, PLAN, "SELECT COUNT(*) FROM Genre"),
+        candidates._candidate(2, 0.7, PLAN, "SELECT COUNT(GenreId) FROM Genre"),
+    ]
+    winner = candidates.select_candidate(chinook, generated)
+    assert winner["index"] == 1
+    assert winner["agreement"] == 2
+
+def test_check_failures_become_candidate_errors(chinook, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("verifier crashed")
+    monkeypatch.setattr(candidates, "static_verify", broken)
+    checked = candidates._check(chinook, candidates._candidate(0, 0.0, PLAN, "SELECT 1"))
+    assert checked["error"] == "RuntimeError: verifier crashed"
+
+@pytest.mark.parametrize("n, expected", [(1, [0.0]), (6, [0.0, 0.4, 0.7, 1.0, 1.0, 1.0])])
+def test_candidate_temperatures(n, expected, monkeypatch):
+    monkeypatch.setattr(candidates, "CANDIDATE_TEMPERATURES", [0.0, 0.4, 0.7, 1.0])
+    assert candidates.candidate_temperatures(n) == expected
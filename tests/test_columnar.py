@@ -0,0 +1,56 @@
+import json
+from array import array
+
+import pytest
+
+from execution.columnar import ColumnarResult
+from execution.run_query import execute_sql
+
+def test_typed_columns(chinook):
+    table = execute_sql(chinook, "SELECT InvoiceId, Total, BillingCountry FROM Invoice ORDER BY InvoiceId",
+                        layout="columnar")["columnar"]
+    assert table.row_count == 412
+    assert isinstance(table["InvoiceId"], array) and table["InvoiceId"].typecode == "q"
+    assert isinstance(table["Total"], array) and table["Total"].typecode == "d"
+    assert isinstance(table["BillingCountry"], list)
+    assert table.row(0) == (1, 1.98, "Germany")
+    assert table.row(-1)["InvoiceId"] == 412
+
+def test_batches_with_nulls_round_trip(chinook):
+    rows = execute_sql(chinook, "SELECT TrackId, Composer, Milliseconds FROM Track ORDER BY TrackId",
+                       max_rows=5000)["rows"]
+    table = ColumnarResult.from_rows(["TrackId", "Composer", "Milliseconds"], rows[:1000])
+    table.extend_rows(rows[1000:])
+    assert table.tuples() == rows
+    assert table.columns_data[1].values.count(None) == 977
+
+def test_leading_nulls_and_type_changes():
+    table = ColumnarResult.from_rows(["a", "b", "c"], [(None, 1, None), (None, 2.5, None), (3, 2 ** 70, None)])
+    assert table["a"] == [None, None, 3]
+    assert table.columns_data[0].nulls is not None
+    assert table["b"] == [1, 2.5, 2 ** 70]
+    assert table["c"] == [None, None, None]
+
+def test_row_views():
+    table = ColumnarResult.from_rows(["Name", "Total"], [("a", 1.0), ("b", 2.0)])
+    row = table.row(1)
+    assert row["Name"] == row[0] == "b"
+    assert row.as_dict() == {"Name": "b", "Total": 2.0}
+    assert [r.as_tuple() for r in table.rows()] == [("a", 1.0), ("b", 2.0)]
+    with pytest.raises(IndexError):
+        table.row(2)
+
+def test_exports():
+    table = ColumnarResult.from_rows(["Name", "Total"], [("a, b", 1.5), (None, None)])
+    assert table.to_csv() == 'Name,Total\r\n"a, b",1.5\r\n,\r\n'
+    assert json.loads(table.to_json()) == {
+        "columns": ["Name", "Total"], "data": {"Name": ["a, b", None], "Total": [1.5, None]}
+    }
+    assert json.loads(table.to_json(orient="records")) == [
+        {"Name": "a, b", "Total": 1.5}, {"Name": None, "Total": None}
+    ]
+
+def test_numeric_columns_are_compact(chinook):
+    table = execute_sql(chinook, "SELECT TrackId, Milliseconds, UnitPrice FROM Track",
+                        max_rows=5000, layout="columnar")["columnar"]
+    assert table.nbytes() == 3503 * 8 * 3
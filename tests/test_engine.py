@@ -0,0 +1,75 @@
+import sqlite3
+import threading
+
+import pytest
+
+from execution import engine
+from execution.engine import ConnectionPool
+
+def test_connections_are_read_only(chinook):
+    with engine.connection(chinook) as conn:
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("DELETE FROM Genre")
+        assert conn.execute("PRAGMA query_only").fetchone() == (1,)
+
+def test_connections_are_reused(chinook):
+    pool = ConnectionPool(chinook, size=2)
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        assert second is first
+    assert pool.stats() == {"opened": 1, "reused": 1, "idle": 1}
+    pool.close()
+
+def test_pool_keeps_at_most_size_idle(chinook):
+    pool = ConnectionPool(chinook, size=1)
+    a, b = pool.acquire(), pool.acquire()
+    pool.release(a)
+    pool.release(b)
+    assert pool.stats() == {"opened": 2, "reused": 0, "idle": 1}
+    with pytest.raises(sqlite3.ProgrammingError):
+        b.execute("SELECT 1")
+    pool.close()
+
+def test_open_transactions_are_rolled_back(chinook):
+    pool = ConnectionPool(chinook)
+    with pool.connection() as conn:
+        conn.execute("BEGIN")
+        conn.execute("SELECT COUNT(*) FROM Genre").fetchone()
+    with pool.connection() as again:
+        assert again is conn and not again.in_transaction
+    pool.close()
+
+def test_broken_connections_are_not_pooled(chinook):
+    pool = ConnectionPool(chinook)
+    with pytest.raises(sqlite3.ProgrammingError):
+        with pool.connection() as conn:
+            conn.close()
+            conn.execute("SELECT 1")
+    assert pool.stats()["idle"] == 0
+
+def test_one_thread_per_connection(chinook):
+    pool = ConnectionPool(chinook, size=4)
+    seen, lock = [], threading.Lock()
+
+    def work():
+        for _ in range(20):
+            with pool.connection() as conn:
+                with lock:
+                    assert conn not in seen
+                    seen.append(conn)
+                assert conn.execute("SELECT COUNT(*) FROM Track").fetchone() == (3503,)
+                with lock:
+                    seen.remove(conn)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert pool.stats()["opened"] <= 4
+    pool.close()
+
+def test_pool_per_database(chinook, chinook_copy):
+    assert engine.get_pool(chinook) is engine.get_pool(chinook)
+    assert engine.get_pool(chinook) is not engine.get_pool(chinook_copy)
@@ -0,0 +1,80 @@
+import asyncio
+import json
+
+import pytest
+
+import main
+from agents import fast_path, verification
+from utils import tracing
+
+PLAN = {"intent": "List genre names", "tables": ["Genre"]}
+
+def fused(sql, plan=PLAN):
+    return "```json\n" + json.dumps({"plan": plan, "sql": sql}) + "\n```"
+
+def test_fused_response_is_split():
+    parsed = fast_path._parse_response(fused("Here it is:\nSELECT Name FROM Genre;\nThis lists genres."))
+    assert parsed == {"query_plan": PLAN, "sql": "SELECT Name FROM Genre;"}
+    # Only the first statement is kept
+    assert fast_path._parse_response(fused("SELECT Name FROM Genre; DROP TABLE Genre;"))["sql"] == "SELECT Name FROM Genre;"
+
+@pytest.mark.parametrize("response, message", [
+    ("not json", "invalid JSON"),
+    (fused("SELECT Name FROM Genre;", plan={}), "no plan"),
+    (fused("The genres table has names."), "no SELECT"),
+    (json.dumps({"plan": PLAN, "sql": None}), "no SELECT"),
+])
+def test_unusable_responses_raise(response, message):
+    with pytest.raises(ValueError, match=message):
+        fast_path._parse_response(response)
+
+@pytest.fixture
+def fast_path_sql(monkeypatch, chinook):
+    """Makes the fast path agents return the given SQL; verification stays static against Chinook"""
+    monkeypatch.setattr(main, "DB_PATH", chinook)
+    monkeypatch.setattr(verification, "VERIFICATION_MODE", "static")
+
+    def set_sql(sql):
+        def agent(question, schema_context, temperature=0.0):
+            return fast_path._parse_response(fused(sql))
+
+        async def agent_async(question, schema_context, temperature=0.0):
+            return agent(question, schema_context)
+
+        monkeypatch.setattr(main, "fast_path_agent", agent)
+        monkeypatch.setattr(main, "fast_path_agent_async", agent_async)
+
+    return set_sql
+
+def test_verified_sql_is_used(fast_path_sql):
+    fast_path_sql("SELECT Name FROM Genre;")
+    assert main.run_fast_path("List genres", {}) == (PLAN, "SELECT Name FROM Genre;")
+
+def test_static_failures_are_repaired_locally(fast_path_sql):
+    fast_path_sql("SELECT Nmae FROM Genre;")
+    with tracing.trace_question("List genres") as trace:
+        plan, sql = main.run_fast_path("List genres", {})
+    assert "Name" in sql and "Nmae" not in sql
+    assert trace.counters["local_repairs"] == 1
+
+def test_unrepairable_sql_falls_back(fast_path_sql):
+    fast_path_sql("SELECT Name FROM NoSuchTable;")
+    with tracing.trace_question("List genres") as trace:
+        assert main.run_fast_path("List genres", {}) is None
+    assert trace.counters["fast_path_fallbacks"] == 1
+
+def test_unparseable_output_falls_back(monkeypatch):
+    def agent(question, schema_context, temperature=0.0):
+        return fast_path._parse_response("not json")
+
+    monkeypatch.setattr(main, "fast_path_agent", agent)
+    with tracing.trace_question("List genres") as trace:
+        assert main.run_fast_path("List genres", {}) is None
+    assert trace.counters["fast_path_fallbacks"] == 1
+
+def test_async_fast_path_repairs_and_falls_back(fast_path_sql):
+    fast_path_sql("SELECT Nmae FROM Genre;")
+    plan, sql = asyncio.run(main.run_fast_path_async("List genres", {}))
+    assert "Nmae" not in sql
+    fast_path_sql("SELECT Name FROM NoSuchTable;")
+    assert asyncio.run(main.run_fast_path_async("List genres", {})) is None
@@ -0,0 +1,70 @@
+import sqlite3
+
+from agents.schema_linking import _with_join_paths
+from utils.join_graph import JoinGraph, get_join_graph
+
+def test_shortest_paths(chinook):
+    graph = get_join_graph(chinook)
+    assert graph.stats() == {"tables": 11, "linked_pairs": 10, "self_links": 1, "components": 1, "diameter": 6}
+    assert graph.path("artist", "Customer") == ["Artist", "Album", "Track", "InvoiceLine", "Invoice", "Customer"]
+    assert graph.join_path("Album", "Artist") == [{"from": "Album.ArtistId", "to": "Artist.ArtistId"}]
+    assert graph.path("Artist", "Nope") is None
+
+def test_connect_adds_bridge_tables(chinook):
+    tree = get_join_graph(chinook).connect(["Artist", "genre", "Nope"])
+    assert tree["tables"] == ["Artist", "Genre", "Album", "Track"]
+    assert tree["bridges"] == ["Album", "Track"]
+    assert tree["relationships"] == [
+        {"from": "Album.ArtistId", "to": "Artist.ArtistId"},
+        {"from": "Track.AlbumId", "to": "Album.AlbumId"},
+        {"from": "Track.GenreId", "to": "Genre.GenreId"},
+    ]
+    assert tree["connected"]
+    assert tree["unknown"] == ["Nope"]
+
+def test_self_references_join_a_table_to_itself(chinook):
+    graph = get_join_graph(chinook)
+    manager = {"from": "Employee.ReportsTo", "to": "Employee.EmployeeId"}
+    assert graph.connect(["Employee"])["relationships"] == [manager]
+    assert graph.connect(["Customer", "Employee"])["relationships"] == [
+        {"from": "Customer.SupportRepId", "to": "Employee.EmployeeId"}, manager,
+    ]
+
+def test_disconnected_tables():
+    graph = JoinGraph(["A", "B", "C"], [{"from": "A.b_id", "to": "B.id"}, {"from": "C.c_id", "to": "C.id"}])
+    assert graph.stats()["components"] == 2
+    tree = graph.connect(["A", "B", "C"])
+    assert not tree["connected"]
+    assert tree["relationships"] == [{"from": "A.b_id", "to": "B.id"}, {"from": "C.c_id", "to": "C.id"}]
+
+def test_graph_follows_schema_changes(chinook_copy):
+    graph = get_join_graph(chinook_copy)
+    assert get_join_graph(chinook_copy) is graph
+    with sqlite3.connect(chinook_copy) as conn:
+        conn.execute("CREATE TABLE Review (ReviewId INTEGER PRIMARY KEY, "
+                     "TrackId INTEGER REFERENCES Track (TrackId), Stars INTEGER)")
+    rebuilt = get_join_graph(chinook_copy)
+    assert rebuilt is not graph
+    assert rebuilt.path("Review", "Genre") == ["Review", "Track", "Genre"]
+
+def test_linker_relationships_come_from_the_join_tree(chinook):
+    context = {
+        "relevant_tables": ["Artist", "Genre"],
+        "relevant_columns": {"Artist": ["Name"], "Genre": ["Name"]},
+        "relationships": [{"from": "Artist.ArtistId", "to": "Genre.GenreId"}],
+    }
+    linked = _with_join_paths(context, chinook)
+    assert linked["relevant_tables"] == ["Artist", "Genre", "Album", "Track"]
+    assert linked["relevant_columns"]["Track"] == ["AlbumId", "GenreId"]
+    assert {"from": "Artist.ArtistId", "to": "Genre.GenreId"} not in linked["relationships"]
+    assert len(linked["relationships"]) == 3
+    # Unknown tables keep the linker's answer
+    unchanged = dict(context, relevant_tables=["Artist", "Artists"])
+    assert _with_join_paths(unchanged, chinook) is unchanged
+
+def test_employee_self_join_keeps_its_relationship(chinook):
+    context = {"tables": ["Employee"], "relationships": ["Employee.ReportsTo = Employee.EmployeeId"]}
+    assert _with_join_paths(context, chinook)["relationships"] == [{"from": "Employee.ReportsTo", "to": "Employee.EmployeeId"}]
+    # A tree without relationships keeps the linker's list
+    context = {"tables": ["Genre"], "relationships": ["Track.GenreId = Genre.GenreId"]}
+    assert _with_join_paths(context, chinook)["relationships"] == ["Track.GenreId = Genre.GenreId"]
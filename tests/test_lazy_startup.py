@@ -0,0 +1,57 @@
+import json
+import os
+import subprocess
+import sys
+
+from utils import import_budget
+from utils.logging import LOG_DIR, get_logger
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, sys
+import main
+from execution import engine
+from query_memory import store
+from utils import schema_catalog
+print(json.dumps({
+    "modules": [m for m in ("requests", "httpx", "chromadb") if m in sys.modules],
+    "catalogs": len(schema_catalog._catalogs),
+    "pools": len(engine._pools),
+    "collection": store._collection is not None,
+}))
+"""
+
+def test_importing_main_initializes_nothing(tmp_path):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    completed = subprocess.run([sys.executable, "-c", PROBE], cwd=tmp_path, env=env,
+                               capture_output=True, text=True, check=True)
+    state = json.loads(completed.stdout.strip().splitlines()[-1])
+    assert state == {"modules": [], "catalogs": 0, "pools": 0, "collection": False}
+    assert os.listdir(tmp_path) == []
+
+def test_log_file_goes_to_log_dir():
+    handler = get_logger().handlers[0]
+    assert os.path.dirname(handler.baseFilename) == os.path.abspath(LOG_DIR)
+    assert not os.path.abspath(LOG_DIR).startswith(ROOT)
+
+def test_parse_importtime_tree():
+    stderr = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       100 |        100 | site",
+        "import time:        20 |         20 |     json.decoder",
+        "import time:        30 |         50 |   json",
+        "import time:        10 |         60 | main",
+    ])
+    total, entries = import_budget._parse(stderr, "main")
+    assert total == 60
+    assert entries == [("json.decoder", 20, 20), ("json", 30, 50)]
+    assert import_budget._parse(stderr, "missing") == (0, [])
+
+def test_budget_check(monkeypatch):
+    monkeypatch.chdir(ROOT)
+    results, created, ok = import_budget.check(["utils.tokens"], budget_ms=1000)
+    assert ok and created == []
+    assert results[0]["error"] is None
+    results, _, ok = import_budget.check(["no_such_module"], budget_ms=1000)
+    assert not ok and "No module named" in results[0]["error"]
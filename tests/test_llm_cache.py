@@ -0,0 +1,78 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from utils import llm, llm_cache
+from utils.llm_cache import LLMCache, is_cacheable, make_key
+
+@pytest.fixture
+def cache(tmp_path):
+    return LLMCache(str(tmp_path / "llm_cache.sqlite"), ttl_seconds=60, max_entries=3, max_bytes=1024)
+
+def test_keys_address_content():
+    key = make_key("ollama", "mistral", "system", "user", 0)
+    assert key == make_key("ollama", "mistral", "system", "user", 0.0)
+    assert key != make_key("ollama", "mistral", "system", "user ", 0.0)
+    assert key != make_key("openai", "mistral", "system", "user", 0.0)
+
+def test_only_deterministic_agent_calls_are_cacheable():
+    assert is_cacheable("sql_generation", 0.0)
+    assert not is_cacheable("sql_generation", 0.7)
+    assert not is_cacheable(None, 0.0)
+    assert not is_cacheable("summary", 0.0)
+
+def test_hits_and_misses(cache):
+    assert cache.get("a", "planning") is None
+    cache.put("a", "SELECT 1", "planning")
+    assert cache.get("a", "planning") == "SELECT 1"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    assert stats["by_agent"] == {"planning": {"hits": 1, "misses": 1}}
+
+def test_shared_between_instances(cache):
+    cache.put("a", "SELECT 1")
+    assert LLMCache(cache.path).get("a") == "SELECT 1"
+
+def test_expired_entries_are_dropped(cache):
+    cache.put("a", "SELECT 1")
+    cache.ttl_seconds = 1
+    cache._conn().execute("UPDATE llm_cache SET created_at = ?", (time.time() - 5,))
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+def test_least_recently_used_are_evicted(cache):
+    for key in "abcd":
+        cache.put(key, key * 10)
+        time.sleep(0.01)
+    cache.get("a")
+    assert cache.evict() == 1
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaaaaaaaa"
+
+def test_byte_limit(cache):
+    cache.put("a", "x" * 600)
+    time.sleep(0.01)
+    cache.put("b", "y" * 600)
+    assert cache.evict() == 1
+    assert cache.get("a") is None and cache.get("b") is not None
+
+def test_call_llm_serves_repeats_from_cache(cache, monkeypatch):
+    calls = []
+    monkeypatch.setattr(llm_cache, "get_cache", lambda: cache)
+    monkeypatch.setattr(llm, "_dispatch", lambda *args: calls.append(args) or "SELECT COUNT(*) FROM Genre")
+
+    async def dispatch_async(*args):
+        calls.append(args)
+        return "SELECT COUNT(*) FROM Genre"
+
+    monkeypatch.setattr(llm, "_dispatch_async", dispatch_async)
+    for _ in range(2):
+        assert llm.call_llm("system", "How many genres?", agent="sql_generation") == "SELECT COUNT(*) FROM Genre"
+        assert asyncio.run(llm.call_llm_async("system", "How many genres?", agent="sql_generation")) \
+            == "SELECT COUNT(*) FROM Genre"
+    assert len(calls) == 1
+    llm.call_llm("system", "How many genres?", temperature=0.7, agent="sql_generation")
+    assert len(calls) == 2
+    assert os.path.exists(cache.path)
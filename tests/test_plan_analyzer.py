@@ -0,0 +1,72 @@
+import main
+from execution.plan_analyzer import advise, analyze_plan, build_shadow, performance_feedback, split_statements
+from utils import tracing
+
+CORRELATED = ("SELECT c.FirstName, i.Total FROM Customer c JOIN Invoice i ON c.CustomerId = i.CustomerId "
+              "WHERE c.Country IN (SELECT Country FROM Customer WHERE City = c.City)")
+
+def test_correlated_subquery_is_reported(chinook):
+    analysis = analyze_plan(chinook, CORRELATED)
+    assert analysis["correlated_subqueries"] == 1
+    assert any(f.startswith("Correlated subquery re-runs") for f in analysis["findings"])
+    assert analysis["estimated_cost"] > 412 * 59
+
+def test_self_join_columns_stay_per_alias(chinook):
+    # The inner scan filters on City; the outer alias' CustomerId join must not leak into its index
+    candidates = analyze_plan(chinook, CORRELATED)["index_candidates"]
+    assert [(c["table"], c["columns"]) for c in candidates] == [("customer", ["city", "country"])]
+    statement = advise(chinook, [CORRELATED])["recommendations"][0]["statement"]
+    assert "idx_Customer_City_Country" in statement
+    assert "CustomerId" not in statement
+
+def test_rowid_alias_never_leads_an_index(chinook):
+    # +c.CustomerId keeps SQLite off the primary key, but an index on it would not help either
+    sql = "SELECT c.FirstName, i.Total FROM Invoice i CROSS JOIN Customer c WHERE +c.CustomerId = i.CustomerId"
+    analysis = analyze_plan(chinook, sql)
+    assert analysis["full_scans"] == ["Invoice", "Customer"]
+    assert analysis["index_candidates"] == []
+    # Index entries already carry the rowid, so it is not added as a covered column either
+    automatic = analyze_plan(chinook, sql + " AND c.Country = 'USA'")["index_candidates"]
+    assert [c["columns"] for c in automatic] == [["country", "firstname"]]
+
+def test_filtered_full_scan_recommends_its_column(chinook):
+    analysis = analyze_plan(chinook, "SELECT Name FROM Track WHERE Composer = 'AC/DC'")
+    assert analysis["full_scans"] == ["Track"]
+    assert analysis["index_candidates"][0]["key_columns"] == ["composer"]
+
+def test_indexed_lookups_have_no_findings(chinook):
+    analysis = analyze_plan(chinook, "SELECT t.Name FROM Track t JOIN Album a ON a.AlbumId = t.AlbumId WHERE a.AlbumId = 1")
+    assert analysis["findings"] == []
+    assert analysis["index_candidates"] == []
+
+def test_unplannable_sql(chinook):
+    assert analyze_plan(chinook, "SELECT Nope FROM Nowhere") is None
+
+def test_shadow_indexes_lower_the_cost(chinook, tmp_path):
+    queries = ["SELECT Name FROM Track WHERE Composer = 'AC/DC'", CORRELATED]
+    report = advise(chinook, queries)
+    comparison = build_shadow(chinook, str(tmp_path / "shadow.db"), report["recommendations"], queries)
+    assert comparison["cost_after"] < comparison["cost_before"]
+
+def test_split_statements_ignores_quoted_semicolons():
+    assert split_statements("SELECT ';'; -- a;\nSELECT 2;") == ["SELECT ';'", "-- a;\nSELECT 2"]
+
+def test_analyses_are_cached_and_traced(chinook):
+    sql = "SELECT Name FROM Track WHERE Composer = 'Queen'"
+    with tracing.trace_question("q") as trace:
+        first = analyze_plan(chinook, sql)
+        assert analyze_plan(chinook, "select  Name from Track where Composer = 'Queen';") is first
+    spans = [s for s in trace.spans if s.name == "plan_analysis"]
+    assert [s.attrs["cache_hit"] for s in spans] == [False, True]
+    assert spans[1].attrs["findings"] == first["findings"] != []
+
+def test_costly_plans_reach_the_correction_agent(chinook, monkeypatch):
+    sql = "SELECT a.Name, b.Name FROM Track a, Track b WHERE a.Milliseconds = b.Milliseconds"
+    assert "temporary index on Track(Milliseconds)" in performance_feedback(chinook, sql)
+    # Cheap plans only when a resource guard tripped
+    cheap = "SELECT Name FROM Track WHERE Composer = 'AC/DC'"
+    assert performance_feedback(chinook, cheap) == ""
+    assert "Full scan of Track" in performance_feedback(chinook, cheap, "timeout")
+    monkeypatch.setattr(main, "DB_PATH", chinook)
+    feedback = main.execution_feedback_for(sql, {"error": "no such function: foo", "error_type": "sql_error"})
+    assert feedback.startswith("no such function: foo\nQuery plan")
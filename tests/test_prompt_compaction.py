@@ -0,0 +1,58 @@
+import json
+
+from utils import prompt_compaction
+from utils.prompt_compaction import minify, render_schema_context, schema_section
+from utils.tokens import estimate_tokens
+
+SCHEMA_CONTEXT = {
+    "tables": ["Customer", "Invoice"],
+    "columns": {
+        "Customer": ["CustomerId", "FirstName", "LastName", "Company", "Address", "City", "State", "Country",
+                     "PostalCode", "Phone", "Fax", "Email", "SupportRepId"],
+        "Invoice": ["InvoiceId", "CustomerId", "InvoiceDate", "BillingCountry", "Total", "Total"],
+    },
+    "relationships": [{"from": "Invoice.CustomerId", "to": "Customer.CustomerId"}],
+    "ambiguities": [],
+}
+PLAN = {"filters": [{"column": "Country", "value": "USA"}], "aggregations": ["SUM(Total)"], "order_by": []}
+
+def test_dense_schema_lines():
+    assert render_schema_context(SCHEMA_CONTEXT, budget_tokens=0) == (
+        "Customer(CustomerId,FirstName,LastName,Company,Address,City,State,Country,PostalCode,Phone,Fax,Email,"
+        "SupportRepId)\n"
+        "Invoice(InvoiceId,CustomerId,InvoiceDate,BillingCountry,Total)\n"
+        "FK Invoice.CustomerId->Customer.CustomerId"
+    )
+
+def test_budget_drops_least_relevant_columns_first():
+    text = render_schema_context(SCHEMA_CONTEXT, PLAN, budget_tokens=30)
+    assert estimate_tokens(text) <= 30
+    customer, invoice = text.splitlines()[:2]
+    # Join keys and plan columns survive; other columns go, later ones first
+    assert "CustomerId" in customer and "Country" in customer
+    assert "Total" in invoice and "CustomerId" in invoice
+    assert "Fax" not in customer and "Email" not in customer
+
+def test_qualified_column_lists_are_grouped_by_table():
+    context = {
+        "tables": ["Customer", "Invoice"],
+        "columns": ["Customer.Country", "customer.FirstName", {"table": "Invoice", "column": "Total"}, "Total"],
+    }
+    assert render_schema_context(context, budget_tokens=0) == (
+        "Customer(Country,FirstName)\nInvoice(Total)\ncolumns: [\"Total\"]"
+    )
+    # Unqualified names belong to the only table
+    assert render_schema_context({"tables": ["Customer"], "columns": ["Country"]}) == "Customer(Country)"
+
+def test_compaction_saves_tokens():
+    compact = schema_section(SCHEMA_CONTEXT, PLAN)
+    assert estimate_tokens(compact) < estimate_tokens(json.dumps(SCHEMA_CONTEXT, indent=2)) / 2
+
+def test_minify_drops_empty_fields_and_duplicates():
+    assert minify(PLAN) == '{"filters":[{"column":"Country","value":"USA"}],"aggregations":["SUM(Total)"]}'
+    assert minify({"a": [1, 1, {}, None], "b": {"c": ""}}) == '{"a":[1]}'
+
+def test_compaction_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(prompt_compaction, "PROMPT_COMPACT", False)
+    assert schema_section(SCHEMA_CONTEXT) == json.dumps(SCHEMA_CONTEXT, indent=2)
+    assert prompt_compaction.plan_section(PLAN) == json.dumps(PLAN, indent=2)
@@ -0,0 +1,70 @@
+import os
+import shutil
+
+import pytest
+
+from utils import prompts
+from utils.prompts import EXPECTED_SLOTS, PromptError, PromptRegistry, render, system_prompt
+
+@pytest.fixture
+def prompts_dir(tmp_path):
+    directory = tmp_path / "prompts"
+    shutil.copytree(prompts.PROMPTS_DIR, directory)
+    return directory
+
+def write(path, text, mtime_offset=10):
+    path.write_text(text, encoding="utf-8")
+    stat = path.stat()
+    os.utime(path, (stat.st_atime, stat.st_mtime + mtime_offset))
+
+def test_repository_templates_are_valid():
+    registry = PromptRegistry()
+    assert {template.name for template in registry} >= set(EXPECTED_SLOTS)
+    assert all(tokens > 0 for tokens in registry.token_report().values())
+    assert system_prompt("planning") == registry.get("planning").text
+    assert not system_prompt("planning").endswith("\n")
+
+def test_render_fills_slots():
+    text = render("user/sql_generation_error", previous_sql="SELECT Nmae FROM Genre",
+                  error_feedback="no such column: Nmae")
+    assert "SELECT Nmae FROM Genre" in text and "no such column: Nmae" in text
+    assert "$" not in text
+
+def test_render_rejects_missing_and_unknown_slots():
+    with pytest.raises(PromptError, match=r"missing slots \['error_feedback'\], unknown slots \['sql'\]"):
+        render("user/sql_generation_error", previous_sql="SELECT 1", sql="SELECT 1")
+
+def test_escapes_and_invalid_placeholders(prompts_dir):
+    write(prompts_dir / "extra.txt", "Costs $$5\n")
+    registry = PromptRegistry(prompts_dir)
+    assert registry.get("extra").render() == "Costs $5"
+    write(prompts_dir / "extra.txt", "Costs $5\n")
+    with pytest.raises(PromptError, match="invalid placeholder on line 1"):
+        PromptRegistry(prompts_dir)
+
+def test_templates_are_validated(prompts_dir):
+    write(prompts_dir / "user" / "planning.txt", "Question: $question\n")
+    with pytest.raises(PromptError, match=r"declares slots \['question'\], expected \['question', 'schema_context'\]"):
+        PromptRegistry(prompts_dir)
+    os.remove(prompts_dir / "user" / "planning.txt")
+    with pytest.raises(PromptError, match="Missing prompt templates"):
+        PromptRegistry(prompts_dir)
+
+def test_unknown_template(prompts_dir):
+    with pytest.raises(PromptError, match="Unknown prompt template 'nope'"):
+        PromptRegistry(prompts_dir).get("nope")
+
+def test_hot_reload(prompts_dir, monkeypatch):
+    monkeypatch.setattr(prompts, "HOT_RELOAD_INTERVAL", 0)
+    registry = PromptRegistry(prompts_dir, hot_reload=True)
+    write(prompts_dir / "planning.txt", "Plan carefully.\n")
+    assert registry.get("planning").text == "Plan carefully."
+    # A broken edit keeps the previous version
+    write(prompts_dir / "planning.txt", "Plan $question\n", mtime_offset=20)
+    assert registry.get("planning").text == "Plan carefully."
+
+def test_without_hot_reload_edits_are_ignored(prompts_dir):
+    registry = PromptRegistry(prompts_dir)
+    before = registry.get("planning").text
+    write(prompts_dir / "planning.txt", "Plan carefully.\n")
+    assert registry.get("planning").text == before
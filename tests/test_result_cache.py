@@ -0,0 +1,52 @@
+import sqlite3
+
+from execution.result_cache import ResultCache, normalize_sql
+from execution.run_query import execute_sql
+
+def test_normalize_folds_whitespace_comments_and_keywords():
+    a = "SELECT Name\n  FROM Artist -- all artists\n WHERE ArtistId = 1;"
+    b = "select Name from Artist /* note */ where ArtistId = 1"
+    assert normalize_sql(a) == normalize_sql(b)
+
+def test_normalize_keeps_quoted_tokens_verbatim():
+    assert normalize_sql('SELECT 1 WHERE x = "usa"') != normalize_sql('SELECT 1 WHERE x = "USA"')
+    assert normalize_sql("SELECT 1 WHERE x = 'usa'") != normalize_sql("SELECT 1 WHERE x = 'USA'")
+    assert normalize_sql('SELECT 1 WHERE x = "Germany"') != normalize_sql("SELECT 1 WHERE x = Germany")
+    assert normalize_sql('SELECT "Name" FROM t') != normalize_sql("SELECT [Name] FROM t")
+    assert normalize_sql('SELECT "Name" FROM t') != normalize_sql("SELECT `Name` FROM t")
+    assert normalize_sql("SELECT 'a' FROM t") != normalize_sql('SELECT "a" FROM t')
+
+def test_double_quoted_literal_case_is_not_served_from_cache(chinook):
+    upper = execute_sql(chinook, 'SELECT COUNT(*) FROM Customer WHERE Country = "USA"')
+    lower = execute_sql(chinook, 'SELECT COUNT(*) FROM Customer WHERE Country = "usa"')
+    assert upper["rows"] == [(13,)]
+    assert lower["rows"] == [(0,)]
+    assert not lower.get("cached")
+
+def test_bare_identifier_is_not_served_from_quoted_literal(chinook):
+    quoted = execute_sql(chinook, 'SELECT COUNT(*) FROM Customer WHERE Country = "Germany"')
+    bare = execute_sql(chinook, "SELECT COUNT(*) FROM Customer WHERE Country = Germany")
+    assert quoted["rows"] == [(4,)]
+    assert not bare["success"]
+    assert "no such column" in bare["error"]
+
+def test_repeated_query_hits_until_the_database_changes(chinook_copy):
+    sql = "SELECT COUNT(*) FROM Genre"
+    first = execute_sql(chinook_copy, sql)
+    assert not first.get("cached")
+    assert execute_sql(chinook_copy, sql).get("cached")
+
+    with sqlite3.connect(chinook_copy) as conn:
+        conn.execute("INSERT INTO Genre (Name) VALUES ('Test Genre')")
+    after = execute_sql(chinook_copy, sql)
+    assert not after.get("cached")
+    assert after["rows"] == [(first["rows"][0][0] + 1,)]
+
+def test_lru_evicts_by_entry_count():
+    cache = ResultCache(max_entries=2)
+    result = {"success": True, "columns": ["a"], "rows": [(1,)]}
+    for key in ("a", "b", "c"):
+        cache.put(key, dict(result))
+    assert cache.get("a") is None
+    assert cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
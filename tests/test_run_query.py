@@ -0,0 +1,59 @@
+import pytest
+
+from execution import run_query
+from execution.run_query import ResourceLimitExceeded, execute_sql, stream_sql
+
+ENDLESS = "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c) SELECT COUNT(*) FROM c"
+
+def test_rows_are_capped_and_paged(chinook):
+    first = execute_sql(chinook, "SELECT TrackId FROM Track ORDER BY TrackId", max_rows=100)
+    assert first["row_count"] == 100
+    assert first["truncated"]
+    assert first["total_rows"] == 3503
+    second = execute_sql(chinook, "SELECT TrackId FROM Track ORDER BY TrackId", max_rows=100,
+                         offset=first["next_offset"])
+    assert second["rows"][0] == (101,)
+
+def test_data_rows_and_columnar_agree(chinook):
+    sql = "SELECT GenreId, Name FROM Genre ORDER BY GenreId"
+    rows = execute_sql(chinook, sql)
+    columnar = execute_sql(chinook, sql, layout="columnar")
+    assert columnar["rows"] == rows["rows"]
+    assert rows["data"][0] == {"GenreId": 1, "Name": "Rock"}
+
+def test_sql_errors_are_reported(chinook):
+    result = execute_sql(chinook, "SELECT Nope FROM Genre")
+    assert not result["success"]
+    assert result["error_type"] == "sql_error"
+
+@pytest.mark.parametrize("limits, error_type", [
+    ({"timeout": 0.05, "max_vm_steps": 0}, "timeout"),
+    ({"timeout": 0, "max_vm_steps": 100000}, "vm_budget"),
+])
+def test_execution_budgets(chinook, limits, error_type):
+    result = execute_sql(chinook, ENDLESS, **limits)
+    assert not result["success"]
+    assert result["error_type"] == error_type
+
+def test_result_size_guard(chinook, monkeypatch):
+    monkeypatch.setattr(run_query, "SQL_MAX_RESULT_ROWS", 500)
+    result = execute_sql(chinook, "SELECT * FROM Track", max_rows=100)
+    assert result["error_type"] == "too_many_rows"
+
+def test_stream_yields_every_row_in_batches(chinook):
+    batches = list(stream_sql(chinook, "SELECT TrackId FROM Track", batch_size=1000))
+    assert [len(rows) for _, rows in batches] == [1000, 1000, 1000, 503]
+    assert batches[0][0] == ["TrackId"]
+
+@pytest.mark.parametrize("limits, error_type", [
+    ({"timeout": 0.05, "max_vm_steps": 0}, "timeout"),
+    ({"timeout": 0, "max_vm_steps": 100000}, "vm_budget"),
+])
+def test_stream_runs_under_the_execution_budgets(chinook, limits, error_type):
+    with pytest.raises(ResourceLimitExceeded) as raised:
+        list(stream_sql(chinook, ENDLESS, **limits))
+    assert raised.value.error_type == error_type
+
+def test_stream_releases_its_guard(chinook):
+    list(stream_sql(chinook, "SELECT 1", max_vm_steps=100000))
+    assert execute_sql(chinook, "SELECT COUNT(*) FROM Track t1, Genre", max_vm_steps=0)["success"]
@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import time
+
+import pytest
+import requests
+
+from utils import scheduler
+from utils.scheduler import BATCH, INTERACTIVE, PriorityGate, ProviderScheduler, TokenBucket, retry_delay
+
+class HTTPError(Exception):
+    def __init__(self, status, headers=None):
+        super().__init__(f"HTTP {status}")
+        self.response = type("Response", (), {"status_code": status, "headers": headers or {}})()
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(scheduler, "LLM_BACKOFF_BASE", 0.001)
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+def test_token_bucket_overdraw_waits():
+    bucket = TokenBucket(60)
+    assert bucket.reserve(60) == 0.0
+    assert bucket.reserve(30) == pytest.approx(30, abs=0.1)
+    assert TokenBucket(0).reserve(10 ** 6) == 0.0
+
+def test_retry_delay():
+    assert retry_delay(HTTPError(429, {"Retry-After": "2"}), 0) >= 2
+    assert 0 <= retry_delay(HTTPError(503), 3) <= 0.008
+    assert retry_delay(requests.exceptions.ConnectionError(), 0) is not None
+    assert retry_delay(HTTPError(400), 0) is None
+    assert retry_delay(ValueError("bad JSON"), 0) is None
+
+def test_interactive_waiters_are_admitted_first():
+    gate, order = PriorityGate(1), []
+    gate.acquire()
+
+    def worker(name, priority):
+        gate.acquire(priority)
+        order.append(name)
+        gate.release()
+
+    threads = [threading.Thread(target=worker, args=("batch", BATCH))]
+    threads[0].start()
+    wait_for(lambda: len(gate._waiters) == 1)
+    threads.append(threading.Thread(target=worker, args=("interactive", INTERACTIVE)))
+    threads[1].start()
+    wait_for(lambda: len(gate._waiters) == 2)
+    gate.release()
+    for thread in threads:
+        thread.join()
+    assert order == ["interactive", "batch"]
+    assert gate._inflight == 0
+
+def test_transient_failures_are_retried():
+    outcomes = [HTTPError(503), requests.exceptions.ConnectionError(), "SELECT 1"]
+
+    def call():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert ProviderScheduler("test", 0, 0, 1).run(call) == "SELECT 1"
+
+def test_permanent_failures_and_exhausted_retries_raise():
+    calls = []
+
+    def fail(error):
+        calls.append(error)
+        raise error
+
+    with pytest.raises(HTTPError):
+        ProviderScheduler("test", 0, 0, 1).run(lambda: fail(HTTPError(401)))
+    assert len(calls) == 1
+    with pytest.raises(HTTPError):
+        ProviderScheduler("test", 0, 0, 1, max_retries=2).run(lambda: fail(HTTPError(429)))
+    assert len(calls) == 4
+
+def test_max_inflight_across_async_calls():
+    limiter = ProviderScheduler("test", 0, 0, 2)
+    active, peak = [0], [0]
+
+    async def call():
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        await asyncio.sleep(0.01)
+        active[0] -= 1
+        return "ok"
+
+    async def main():
+        return await asyncio.gather(*(limiter.run_async(call) for _ in range(6)))
+
+    assert asyncio.run(main()) == ["ok"] * 6
+    assert peak[0] == 2
+    assert limiter.gate._inflight == 0
+
+def test_cancelled_waiter_gives_up_its_place():
+    gate = PriorityGate(1)
+
+    async def main():
+        await gate.acquire_async()
+        waiter = asyncio.ensure_future(gate.acquire_async())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        gate.release()
+
+    asyncio.run(main())
+    assert gate._inflight == 0
+
+def test_priority_context():
+    assert scheduler.current_priority() == INTERACTIVE
+    with scheduler.llm_priority("batch"):
+        assert scheduler.current_priority() == BATCH
+    assert scheduler.current_priority() == INTERACTIVE
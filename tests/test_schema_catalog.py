@@ -0,0 +1,55 @@
+import os
+import sqlite3
+
+import pytest
+
+from utils import schema_catalog
+from utils.schema_catalog import SchemaCatalog, catalog_path, get_catalog
+
+def test_introspection(chinook):
+    catalog = get_catalog(chinook)
+    assert len(catalog.table_names()) == 11
+    track = catalog.table("track")
+    assert track["primary_key"] == ["TrackId"]
+    assert {(fk["table"], tuple(fk["columns"])) for fk in track["foreign_keys"]} == {
+        ("Album", ("AlbumId",)), ("Genre", ("GenreId",)), ("MediaType", ("MediaTypeId",))
+    }
+    assert track["row_count"] == 3503
+    assert ("PlaylistTrack", "TrackId", "Track", "TrackId") in catalog.foreign_keys()
+    assert catalog.columns("GENRE") == ["GenreId", "Name"]
+    assert catalog.table("Nope") is None
+
+def test_schema_text(chinook):
+    text = get_catalog(chinook).schema_text()
+    assert text.startswith("CHINOOK DATABASE SCHEMA\n\nTables:\n\nAlbum:\n")
+    assert "  - ArtistId (INTEGER, FOREIGN KEY -> Artist.ArtistId)" in text
+    assert "  - GenreId (INTEGER, PRIMARY KEY)" in text
+
+def test_catalog_is_stored_and_reloaded(chinook_copy, monkeypatch):
+    catalog = get_catalog(chinook_copy)
+    assert os.path.exists(catalog_path(chinook_copy))
+    # A new process loads the stored catalog instead of introspecting
+    monkeypatch.setattr(schema_catalog, "_catalogs", {})
+    monkeypatch.setattr(SchemaCatalog, "introspect", classmethod(lambda cls, path: pytest.fail("introspected")))
+    reloaded = get_catalog(chinook_copy)
+    assert reloaded is not catalog
+    assert reloaded.fingerprint == catalog.fingerprint
+
+def test_schema_changes_rebuild_the_catalog(chinook_copy):
+    catalog = get_catalog(chinook_copy)
+    assert get_catalog(chinook_copy) is catalog
+    with sqlite3.connect(chinook_copy) as conn:
+        conn.execute("CREATE VIEW RockTrack AS SELECT * FROM Track WHERE GenreId = 1")
+        conn.execute("CREATE INDEX idx_track_composer ON Track (Composer)")
+        conn.execute("ANALYZE")
+    rebuilt = get_catalog(chinook_copy)
+    assert rebuilt.fingerprint != catalog.fingerprint
+    assert "RockTrack" not in rebuilt.table_names()
+    assert "RockTrack" in rebuilt.table_names(include_views=True)
+    composer = next(i for i in rebuilt.table("Track")["indexes"] if i["name"] == "idx_track_composer")
+    assert composer["columns"] == ["Composer"] and composer["stat"][0] == 3503
+
+def test_catalogs_per_database(chinook, chinook_copy):
+    assert catalog_path(chinook) != catalog_path(chinook_copy)
+    assert get_catalog(chinook).db_path == os.path.abspath(chinook)
+    assert get_catalog(chinook_copy).db_path == os.path.abspath(chinook_copy)
@@ -0,0 +1,48 @@
+import sqlite3
+
+import pytest
+
+from utils import schema_index
+from utils.schema_index import SchemaIndex, get_schema_index, index_path, load_or_build
+from utils.value_index import get_value_index
+
+def link(db_path: str, question: str) -> dict:
+    return get_schema_index(db_path).link(question, value_index=get_value_index(db_path))
+
+def test_names_and_values_link_with_full_confidence(chinook):
+    result = link(chinook, "How many tracks are in the Rock genre?")
+    context = result["schema_context"]
+    assert result["confidence"] == 1.0
+    assert set(context["tables"]) == {"Genre", "Track"}
+    assert context["relationships"] == [{"from": "Track.GenreId", "to": "Genre.GenreId"}]
+    assert context["matched_values"] == {"Genre.Name": ["Rock"]}
+
+def test_value_in_several_columns_links_all_their_tables(chinook):
+    # "AC/DC" is a sampled Track.Composer value but also an Artist.Name
+    result = link(chinook, "List all albums by AC/DC")
+    assert "Artist" in result["schema_context"]["tables"]
+    assert "Artist.Name" in result["schema_context"]["matched_values"]
+    assert result["confidence"] < 0.8
+
+def test_sampled_value_without_value_index_lowers_confidence(chinook):
+    result = get_schema_index(chinook).link("How many tracks are in the Rock genre?")
+    assert result["confidence"] == pytest.approx(schema_index.UNCERTAIN_VALUE_FACTOR)
+
+def test_unmatched_question_has_no_confidence(chinook):
+    assert link(chinook, "Explain quantum entanglement")["confidence"] == 0.0
+
+def test_each_database_has_its_own_index_file(chinook, chinook_copy, monkeypatch):
+    assert index_path(chinook) != index_path(chinook_copy)
+    load_or_build(chinook)
+    load_or_build(chinook_copy)
+
+    def no_rebuild(*args, **kwargs):
+        raise AssertionError("stored index was rebuilt")
+    monkeypatch.setattr(SchemaIndex, "build", no_rebuild)
+    assert "Artist" in load_or_build(chinook).tables
+
+def test_index_is_rebuilt_when_the_schema_changes(chinook_copy):
+    assert "Podcast" not in get_schema_index(chinook_copy).tables
+    with sqlite3.connect(chinook_copy) as conn:
+        conn.execute("CREATE TABLE Podcast (PodcastId INTEGER PRIMARY KEY, Title TEXT)")
+    assert "Podcast" in get_schema_index(chinook_copy).tables
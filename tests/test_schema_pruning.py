@@ -0,0 +1,71 @@
+import os
+import sqlite3
+
+from utils import embeddings, schema_pruning
+from utils.schema_pruning import SchemaRanker, get_ranker, prune_schema
+from utils.tokens import estimate_tokens
+
+QUESTION = "Top 5 artists by number of albums"
+
+def fake_vector(text):
+    return [float(text.count(letter)) for letter in "aeioust"] + [1.0]
+
+def test_schema_within_budget_is_whole(chinook):
+    rendered = get_ranker(chinook).render(QUESTION, budget_tokens=100000)
+    assert not rendered["pruned"]
+    assert len(rendered["tables"]) == rendered["total_tables"] == 11
+
+def test_ranked_tables_and_their_neighbors(chinook):
+    rendered = get_ranker(chinook).render(QUESTION, budget_tokens=300, top_k=2)
+    assert rendered["pruned"]
+    assert rendered["tables"] == ["Album", "Artist", "Track"]
+    assert rendered["tokens"] <= 300
+    assert rendered["text"].rstrip().endswith("(3 of 11 tables shown, ranked by relevance to the question)")
+
+def test_tight_budget_keeps_key_columns(chinook):
+    rendered = get_ranker(chinook).render("Which employees support customers in Canada?", budget_tokens=200, top_k=2)
+    assert rendered["tables"] == ["Employee", "Customer"]
+    assert rendered["tokens"] <= 200
+    customer = rendered["text"].split("Customer:\n", 1)[1]
+    assert "CustomerId (INTEGER, PRIMARY KEY)" in customer
+    assert "SupportRepId (INTEGER, FOREIGN KEY -> Employee.EmployeeId)" in customer
+    assert "more columns)" in customer
+
+def test_prune_schema_text(chinook):
+    text = prune_schema(chinook, QUESTION, budget_tokens=60, top_k=2)
+    assert "Album:" in text and "Track:" not in text
+    assert estimate_tokens(text) <= 60
+
+def test_ranker_follows_schema_changes(chinook_copy):
+    ranker = get_ranker(chinook_copy)
+    assert get_ranker(chinook_copy) is ranker
+    with sqlite3.connect(chinook_copy) as conn:
+        conn.execute("CREATE TABLE Podcast (PodcastId INTEGER PRIMARY KEY, Title TEXT)")
+    rebuilt = get_ranker(chinook_copy)
+    assert rebuilt is not ranker
+    assert "Podcast" in rebuilt.score("List every podcast title")[0]
+
+def test_description_embeddings_are_stored_once(chinook, monkeypatch, tmp_path):
+    calls = []
+    monkeypatch.setattr(schema_pruning, "SCHEMA_PRUNE_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(embeddings, "embed", fake_vector)
+    monkeypatch.setattr(embeddings, "embed_many",
+                        lambda texts, **kwargs: calls.append(len(texts)) or [fake_vector(t) for t in texts])
+    ranker = SchemaRanker(chinook)
+    assert ranker.ensure_vectors()
+    assert os.path.exists(ranker.cache_path())
+    blended, _ = ranker.score(QUESTION, use_embeddings=True)
+    lexical, _ = ranker.score(QUESTION, use_embeddings=False)
+    assert blended != lexical
+
+    reloaded = SchemaRanker(chinook)
+    assert reloaded.ensure_vectors()
+    assert len(calls) == 1
+    assert reloaded.vectors == {k: [round(x, 5) for x in v] for k, v in ranker.vectors.items()}
+
+def test_unreachable_embeddings_fall_back_to_lexical(chinook, monkeypatch, tmp_path):
+    monkeypatch.setattr(schema_pruning, "SCHEMA_PRUNE_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(embeddings, "embed", lambda text: None)
+    ranker = SchemaRanker(chinook)
+    assert not ranker.ensure_vectors()
+    assert ranker.score(QUESTION, use_embeddings=True) == ranker.score(QUESTION, use_embeddings=False)
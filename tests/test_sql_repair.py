@@ -0,0 +1,33 @@
+import pytest
+
+from execution.sql_repair import closest_name, repair_sql
+
+@pytest.mark.parametrize("sql, repaired, fix", [
+    ("SELECT FirstName FROM customers", "SELECT FirstName FROM Customer", "customers -> Customer"),
+    ("SELECT Nmae FROM Genre", "SELECT Name FROM Genre", "Nmae -> Name"),
+    ("SELECT Total FROM Invoice i JOIN Customer c ON c.CustomerId = i.CustomerId WHERE c.Total > 5",
+     "SELECT Total FROM Invoice i JOIN Customer c ON c.CustomerId = i.CustomerId WHERE i.Total > 5",
+     "c.Total -> i.Total"),
+    ("SELECT Name FROM Artist JOIN Album ON Artist.ArtistId = Album.ArtistId WHERE ArtistId = 1",
+     "SELECT Name FROM Artist JOIN Album ON Artist.ArtistId = Album.ArtistId WHERE Artist.ArtistId = 1",
+     "ArtistId -> Artist.ArtistId"),
+    ("SELECT LEN(Name) FROM Genre", "SELECT LENGTH(Name) FROM Genre", "LEN() -> SQLite equivalent"),
+    ("SELECT YEAR(InvoiceDate) FROM Invoice", "SELECT CAST(strftime('%Y', InvoiceDate) AS INTEGER) FROM Invoice",
+     "YEAR() -> SQLite equivalent"),
+    ("SELECT Name FROM Genre;\nThis lists every genre.", "SELECT Name FROM Genre;", "removed text after the statement"),
+])
+def test_rules(chinook, sql, repaired, fix):
+    assert repair_sql(chinook, sql) == {"sql": repaired, "fixes": [fix]}
+
+def test_errors_are_fixed_one_after_another(chinook):
+    result = repair_sql(chinook, "SELECT Nmae FROM Genres")
+    assert result["sql"] == "SELECT Name FROM Genre"
+    assert result["fixes"] == ["Genres -> Genre", "Nmae -> Name"]
+
+@pytest.mark.parametrize("sql", ["SELECT Name FROM Genre", "SELECT Nonsense FROM Genre", "SELECT customer_name FROM customers"])
+def test_nothing_to_repair(chinook, sql):
+    assert repair_sql(chinook, sql) is None
+
+def test_closest_name_refuses_ties():
+    assert closest_name("customers", ["Customer", "Invoice"]) == "Customer"
+    assert closest_name("name", ["Name", "NAME"]) is None
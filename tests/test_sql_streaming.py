@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+import requests
+
+from agents import sql_generation
+from agents.sql_generation import IncrementalSQLExtractor, clean_sql, first_statement
+from utils import llm, scheduler
+
+def feed_chars(text):
+    """Feed one character at a time; returns (extractor, characters consumed before it stopped)"""
+    extractor = IncrementalSQLExtractor()
+    for i, char in enumerate(text):
+        if extractor.feed(char):
+            return extractor, i + 1
+    return extractor, None
+
+@pytest.mark.parametrize("response, statement, consumed", [
+    ("SELECT Name FROM Genre; -- lists genres", "SELECT Name FROM Genre;", 23),
+    ("Here is the query:\nSELECT 'a;b' FROM Genre;\nIt selects a literal.", "SELECT 'a;b' FROM Genre;", 43),
+    ("SELECT Name -- no ; here\nFROM Genre /* ; */ WHERE Name = 'It''s';", None, 65),
+    # Stops at the closing fence (once its three backticks have arrived)
+    ("```sql\nSELECT Name FROM Genre\n```\nThis lists genres.", "SELECT Name FROM Genre\n", 33),
+    ("WITH t AS (SELECT 1) SELECT * FROM t; SELECT 2;", "WITH t AS (SELECT 1) SELECT * FROM t;", 37),
+])
+def test_statement_end_is_found_while_streaming(response, statement, consumed):
+    extractor, stopped_after = feed_chars(response)
+    assert extractor.complete
+    assert extractor.statement == (statement or response)
+    assert stopped_after == consumed
+
+def test_incomplete_statement_keeps_streaming():
+    extractor, consumed = feed_chars("SELECT Name FROM Genre WHERE Name = 'a;")
+    assert consumed is None and not extractor.complete
+
+def test_first_statement_matches_clean_sql():
+    response = "Sure!\nSELECT Name FROM Genre;\nSELECT 2;"
+    assert clean_sql(first_statement(response)) == "SELECT Name FROM Genre;"
+
+def test_stream_is_closed_at_the_end_of_the_statement():
+    pulled, closed = [], []
+
+    def chunks():
+        try:
+            for chunk in ["SELECT Name ", "FROM Genre;", " This query", " lists genres."]:
+                pulled.append(chunk)
+                yield chunk
+        finally:
+            closed.append(True)
+
+    response = llm._collect_stream(chunks(), IncrementalSQLExtractor().feed)
+    assert response == "SELECT Name FROM Genre;"
+    assert len(pulled) == 2 and closed == [True]
+
+def test_async_stream_is_closed_at_the_end_of_the_statement():
+    pulled = []
+
+    async def chunks():
+        for chunk in ["SELECT 1;", " and more", " text"]:
+            pulled.append(chunk)
+            yield chunk
+
+    assert asyncio.run(llm._collect_stream_async(chunks(), IncrementalSQLExtractor().feed)) == "SELECT 1;"
+    assert pulled == ["SELECT 1;"]
+
+ANSWER = ["SELECT Name ", "FROM Genre;", " This query lists genres."]
+
+@pytest.fixture
+def flaky_stream(monkeypatch):
+    """First stream attempt drops the connection inside a string literal; the retry streams ANSWER"""
+    attempts = []
+
+    def chunks():
+        attempts.append([])
+        if len(attempts) == 1:
+            attempts[-1].append("SELECT 'unfinished")
+            yield "SELECT 'unfinished"
+            raise requests.exceptions.ConnectionError("connection reset")
+        for chunk in ANSWER:
+            attempts[-1].append(chunk)
+            yield chunk
+
+    async def chunks_async():
+        for chunk in chunks():
+            yield chunk
+
+    monkeypatch.setattr(scheduler, "LLM_BACKOFF_BASE", 0.001)
+    monkeypatch.setattr(llm, "LLM_STREAMING", True)
+    monkeypatch.setattr(llm, "stream_llm", lambda *args: chunks())
+    monkeypatch.setattr(llm, "stream_llm_async", lambda *args: chunks_async())
+    monkeypatch.setattr(sql_generation, "SQL_GENERATION_STREAMING", True)
+    return attempts
+
+def test_retried_stream_gets_a_fresh_extractor(flaky_stream):
+    sql = sql_generation.sql_generation_agent({"tables": ["Genre"]}, {"intent": "retried stream"}, temperature=0.3)
+    assert sql == "SELECT Name FROM Genre;"
+    assert flaky_stream == [["SELECT 'unfinished"], ANSWER[:2]]
+
+def test_retried_async_stream_gets_a_fresh_extractor(flaky_stream):
+    sql = asyncio.run(sql_generation.sql_generation_agent_async(
+        {"tables": ["Genre"]}, {"intent": "retried async stream"}, temperature=0.3
+    ))
+    assert sql == "SELECT Name FROM Genre;"
+    assert flaky_stream == [["SELECT 'unfinished"], ANSWER[:2]]
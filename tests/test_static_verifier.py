@@ -0,0 +1,51 @@
+import pytest
+
+from execution.static_verifier import distinct_values_for, static_verify, table_refs, tokenize
+
+@pytest.mark.parametrize("sql, error", [
+    ("", "Empty SQL statement"),
+    ("DELETE FROM Genre", "Only SELECT queries are allowed, got 'DELETE'"),
+    ("SELECT 1; SELECT 2", "Multiple SQL statements; only one SELECT query is allowed"),
+    ("WITH x AS (SELECT 1) DELETE FROM Genre", "SQLite error: statement is not a read-only query."),
+    ("SELECT Nmae FROM Genre", "SQLite error: no such column: Nmae. Did you mean: Name?"),
+    ("SELECT * FROM Artsit", "SQLite error: no such table: Artsit. Did you mean: Artist?"),
+])
+def test_errors(chinook, sql, error):
+    assert static_verify(chinook, sql)["errors"] == [error]
+
+def test_valid_query(chinook):
+    sql = ("SELECT g.Name, COUNT(*) FROM Genre g JOIN Track t ON t.GenreId = g.GenreId "
+           "JOIN Album a ON a.AlbumId = t.AlbumId WHERE g.GenreId IN (SELECT 1) GROUP BY g.Name")
+    result = static_verify(chinook, sql)
+    assert result["errors"] == [] and result["warnings"] == []
+    assert result["complexity"] == 3
+
+def test_join_outside_foreign_keys_warns(chinook):
+    result = static_verify(chinook, "SELECT * FROM Customer c JOIN Employee e ON c.FirstName = e.FirstName")
+    assert result["warnings"] == ["Join Customer.FirstName = Employee.FirstName does not follow a foreign key"]
+
+def test_misspelled_literal_is_an_error(chinook):
+    result = static_verify(chinook, "SELECT COUNT(*) FROM Customer WHERE Country = 'Brazl'")
+    assert result["errors"] == ["Value 'Brazl' not found in Customer.Country. Did you mean: 'Brazil'?"]
+    assert distinct_values_for(chinook, "SELECT * FROM Customer WHERE Country IN ('Brazl')") == {
+        "Customer.Country": ["Brazil"]
+    }
+
+def test_unknown_literal_only_warns(chinook):
+    result = static_verify(chinook, "SELECT COUNT(*) FROM Customer WHERE Country = 'Atlantis'")
+    assert result["errors"] == []
+    assert result["warnings"] == ["Value 'Atlantis' not found in Customer.Country; the query will return no rows for it"]
+
+def test_existing_literal_passes(chinook):
+    assert static_verify(chinook, "SELECT COUNT(*) FROM Customer WHERE Country = 'USA'")["warnings"] == []
+
+def test_missing_plan_aggregation_warns(chinook):
+    result = static_verify(chinook, "SELECT Name FROM Track", {"aggregations": [{"operation": "SUM"}]})
+    assert result["warnings"] == ["Plan asks for SUM but the SQL does not use it"]
+
+def test_table_refs():
+    aliases, ctes = table_refs(tokenize(
+        'WITH top AS (SELECT 1) SELECT * FROM "Album" AS al, Artist JOIN main.Track t ON 1'
+    ))
+    assert ctes == {"top"}
+    assert aliases == {"al": "album", "album": "album", "artist": "artist", "t": "track", "track": "track"}
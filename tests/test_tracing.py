@@ -0,0 +1,77 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from execution.run_query import execute_sql
+from utils import tracing
+
+def test_spans_nest_within_a_question_trace(chinook):
+    with tracing.trace_question("How many genres?") as trace:
+        with tracing.span("agent", agent="sql_generation") as outer:
+            tracing.set_attr("retries", 1)
+            execute_sql(chinook, "SELECT COUNT(*) FROM Genre")
+            tracing.incr("llm_retries")
+    names = [s.name for s in trace.spans]
+    assert names[-1] == "agent"
+    execution = next(s for s in trace.spans if s.parent_id == outer.id)
+    assert execution.duration_ms is not None
+    assert outer.attrs == {"agent": "sql_generation", "retries": 1}
+    assert trace.counters["llm_retries"] == 1
+    assert trace.stage_totals()["agent"]["count"] == 1
+    assert trace.duration_ms >= outer.duration_ms
+
+def test_errors_are_recorded_on_the_span():
+    with tracing.trace_question("q") as trace:
+        with pytest.raises(ValueError):
+            with tracing.span("sql_repair"):
+                raise ValueError("no rule applies")
+    assert trace.spans[0].error == "ValueError: no rule applies"
+
+def test_spans_follow_async_tasks_and_threads():
+    @tracing.traced("llm")
+    async def call(i):
+        await asyncio.sleep(0)
+        return tracing.current_span().parent_id
+
+    @tracing.traced("embedding")
+    def embed():
+        return tracing.current_span().parent_id
+
+    async def pipeline():
+        with tracing.span("candidates") as parent:
+            parents = await asyncio.gather(*(call(i) for i in range(3)))
+            parents.append(await asyncio.to_thread(embed))
+            in_context = tracing.run_in_context(embed)
+            with ThreadPoolExecutor(2) as pool:
+                parents += list(pool.map(lambda _: in_context(), range(2)))
+        return parent.id, parents
+
+    with tracing.trace_question("q") as trace:
+        parent_id, parents = asyncio.run(pipeline())
+    assert parents == [parent_id] * 6
+    assert sorted(s.name for s in trace.spans) == ["candidates"] + ["embedding"] * 3 + ["llm"] * 3
+
+def test_outside_a_question_spans_only_feed_histograms():
+    tracing.histograms.reset()
+    with tracing.span("execution"):
+        tracing.incr("ignored")
+    assert tracing.current_trace() is None
+    assert tracing.histograms.summary()["execution"]["count"] == 1
+
+def test_percentiles():
+    summary = tracing.summarize(list(range(1, 101)))
+    assert (summary["p50_ms"], summary["p95_ms"], summary["p99_ms"], summary["max_ms"]) == (50, 95, 99, 100)
+    assert tracing.summarize([])["count"] == 0
+
+def test_exported_traces_are_summarized(tmp_path):
+    with tracing.trace_question("q") as trace:
+        with tracing.span("planning"):
+            pass
+    path = tracing.export_trace(trace, str(tmp_path))
+    with open(path) as f:
+        assert json.load(f)["question"] == "q"
+    summary = tracing.summarize_traces(str(tmp_path))
+    assert summary["pipeline"]["count"] == summary["planning"]["count"] == 1
+    assert "planning" in tracing.format_summary(summary)
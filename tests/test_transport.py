@@ -0,0 +1,67 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils import transport
+
+class EchoHandler(BaseHTTPRequestHandler):
+    """Answers every POST with the client port, so tests can count TCP connections"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps({"port": self.client_address[1]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), EchoHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+def test_endpoint_keys():
+    assert transport.endpoint_key("https://api.openai.com/v1/chat/completions") == "https://api.openai.com"
+    assert transport.endpoint_key("http://localhost:11434/api/chat") == "http://localhost:11434"
+
+def test_one_session_per_endpoint():
+    session = transport.get_session("http://localhost:11434/api/chat")
+    assert transport.get_session("http://localhost:11434/api/embed") is session
+    assert transport.get_session("https://api.openai.com/v1/embeddings") is not session
+
+def test_requests_reuse_the_connection(server):
+    ports = {transport.post(f"{server}/api/chat", json={"n": i}).json()["port"] for i in range(5)}
+    assert len(ports) == 1
+
+def test_async_requests_reuse_the_connection(server):
+    async def main():
+        ports = set()
+        for i in range(5):
+            response = await transport.post_async(f"{server}/api/chat", json={"n": i})
+            ports.add(response.json()["port"])
+        same_client = transport.get_async_client(server) is transport.get_async_client(f"{server}/other")
+        await transport.close_async_clients()
+        return ports, same_client
+
+    ports, same_client = asyncio.run(main())
+    assert len(ports) == 1 and same_client
+
+def test_default_timeouts(monkeypatch):
+    captured = {}
+    session = transport.get_session("http://127.0.0.1:9/api/chat")
+    monkeypatch.setattr(session, "post", lambda url, **kwargs: captured.update(kwargs))
+    transport.post("http://127.0.0.1:9/api/chat", json={})
+    assert captured["timeout"] == (transport.HTTP_CONNECT_TIMEOUT, transport.HTTP_READ_TIMEOUT)
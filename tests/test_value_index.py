@@ -0,0 +1,47 @@
+import sqlite3
+
+from utils import value_index
+from utils.value_index import ValueIndex, get_value_index
+
+def test_exact_and_fuzzy_lookup(chinook):
+    index = get_value_index(chinook)
+    assert index.contains("Genre", "Name", "Rock")
+    assert not index.contains("Genre", "Name", "rock")
+    assert index.lookup("Rock", table="Genre")[0]["value"] == "Rock"
+    best = index.lookup("Brasil", table="Customer", column="Country")[0]
+    assert best["value"] == "Brazil"
+    assert {"Customer", "Invoice"} <= {m["table"] for m in index.lookup("Brazil") if m["value"] == "Brazil"}
+
+def test_short_text_is_not_looked_up(chinook):
+    assert get_value_index(chinook).lookup("Ro") == []
+
+def test_databases_do_not_share_an_index(chinook, tmp_path):
+    other = str(tmp_path / "other.db")
+    with sqlite3.connect(other) as conn:
+        conn.execute("CREATE TABLE Foo (x TEXT)")
+        conn.execute("INSERT INTO Foo VALUES ('Brasil')")
+        conn.execute("CREATE TABLE Genre (Name TEXT)")
+        conn.execute("INSERT INTO Genre VALUES ('Polka')")
+
+    chinook_index = get_value_index(chinook)
+    chinook_index.refresh(force=True)
+    other_index = get_value_index(other)
+    other_index.refresh(force=True)
+    assert chinook_index.index_path != other_index.index_path
+
+    chinook_index.refresh(force=True)
+    assert [m["value"] for m in chinook_index.lookup("Rock", table="Genre")][:1] == ["Rock"]
+    assert all(m["table"] != "Foo" for m in chinook_index.lookup("Brasil"))
+    assert other_index.lookup("Brasil")[0]["table"] == "Foo"
+    assert not other_index.contains("Genre", "Name", "Rock")
+
+def test_changed_tables_are_reindexed(chinook_copy, monkeypatch):
+    monkeypatch.setattr(value_index, "REFRESH_CHECK_INTERVAL", 0)
+    index = ValueIndex(chinook_copy)
+    assert index.refresh() > 0
+    assert index.refresh() == 0
+
+    with sqlite3.connect(chinook_copy) as conn:
+        conn.execute("INSERT INTO Genre (Name) VALUES ('Sea Shanty')")
+    assert index.refresh() == 1
+    assert index.contains("Genre", "Name", "Sea Shanty")
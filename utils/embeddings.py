@@ -0,0 +1,166 @@
+"""
+Embedding Provider Abstraction
+Author: Mayank Goyal
+Reference: "Text-to-SQL Agents in Practice"
+
+Supports embeddings from both Ollama and OpenAI providers. Shared by the
+query memory and the local schema index.
+"""
+
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from utils import tracing, transport
+
+load_dotenv()
+
+# Embedding provider configuration
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "ollama").lower()  # "ollama" or "openai"
+
+# Ollama configuration
+OLLAMA_ENDPOINT = os.getenv("OLLAMA_ENDPOINT", "http://localhost:11434")
+OLLAMA_EMBEDDING_MODEL = os.getenv("OLLAMA_EMBEDDING_MODEL", "nomic-embed-text")
+
+# OpenAI configuration
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-large")
+
+# Parallel single-text requests when a batch request is not available (older Ollama servers)
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "8"))
+
+# Set once the Ollama server has answered 404 for /api/embed
+_ollama_batch_unsupported = False
+
+def embedding_model() -> str:
+    """Provider-qualified name of the active embedding model"""
+    if EMBEDDING_PROVIDER == "openai":
+        return f"openai/{OPENAI_EMBEDDING_MODEL}"
+    return f"ollama/{OLLAMA_EMBEDDING_MODEL}"
+
+def _ollama_embedding_request(text: str):
+    """Build the Ollama embeddings request as (url, post kwargs)"""
+    return f"{OLLAMA_ENDPOINT}/api/embeddings", {
+        "json": {"model": OLLAMA_EMBEDDING_MODEL, "prompt": text}
+    }
+
+def _openai_embedding_request(text):
+    """Build the OpenAI embeddings request as (url, post kwargs); text may be a list"""
+    return "https://api.openai.com/v1/embeddings", {
+        "headers": {
+            "Authorization": f"Bearer {OPENAI_API_KEY}",
+            "Content-Type": "application/json"
+        },
+        "json": {
+            "model": OPENAI_EMBEDDING_MODEL,
+            "input": text
+        },
+        "verify": False
+    }
+
+def embed_with_ollama(text: str):
+    """Generate embeddings using Ollama"""
+    try:
+        url, kwargs = _ollama_embedding_request(text)
+        resp = transport.post(url, **kwargs)
+        resp.raise_for_status()
+        return resp.json()["embedding"]
+    except Exception as e:
+        print(f"Warning: Ollama embedding failed ({str(e)}). Make sure Ollama is running on {OLLAMA_ENDPOINT}")
+        return None
+
+def embed_with_openai(text: str):
+    """Generate embeddings using OpenAI"""
+    try:
+        url, kwargs = _openai_embedding_request(text)
+        resp = transport.post(url, **kwargs)
+        resp.raise_for_status()
+        result = resp.json()
+        return result["data"][0]["embedding"]
+    except Exception as e:
+        print(f"Warning: OpenAI embedding failed ({str(e)}). Check your API key and internet connection.")
+        return None
+
+async def embed_with_ollama_async(text: str):
+    """Generate embeddings using Ollama without blocking the event loop"""
+    try:
+        url, kwargs = _ollama_embedding_request(text)
+        resp = await transport.post_async(url, **kwargs)
+        resp.raise_for_status()
+        return resp.json()["embedding"]
+    except Exception as e:
+        print(f"Warning: Ollama embedding failed ({str(e)}). Make sure Ollama is running on {OLLAMA_ENDPOINT}")
+        return None
+
+async def embed_with_openai_async(text: str):
+    """Generate embeddings using OpenAI without blocking the event loop"""
+    try:
+        url, kwargs = _openai_embedding_request(text)
+        resp = await transport.post_async(url, **kwargs)
+        resp.raise_for_status()
+        result = resp.json()
+        return result["data"][0]["embedding"]
+    except Exception as e:
+        print(f"Warning: OpenAI embedding failed ({str(e)}). Check your API key and internet connection.")
+        return None
+
+def embed(text: str):
+    with tracing.span("embedding", provider=EMBEDDING_PROVIDER):
+        if EMBEDDING_PROVIDER == "openai":
+            return embed_with_openai(text)
+        else:
+            return embed_with_ollama(text)
+
+async def embed_async(text: str):
+    with tracing.span("embedding", provider=EMBEDDING_PROVIDER):
+        if EMBEDDING_PROVIDER == "openai":
+            return await embed_with_openai_async(text)
+        else:
+            return await embed_with_ollama_async(text)
+
+def _embed_batch(texts: list) -> list:
+    """One request for several texts (Ollama /api/embed or OpenAI list input)"""
+    if EMBEDDING_PROVIDER == "openai":
+        url, kwargs = _openai_embedding_request(texts)
+        resp = transport.post(url, **kwargs)
+        resp.raise_for_status()
+        data = sorted(resp.json()["data"], key=lambda item: item["index"])
+        return [item["embedding"] for item in data]
+    resp = transport.post(
+        f"{OLLAMA_ENDPOINT}/api/embed", json={"model": OLLAMA_EMBEDDING_MODEL, "input": texts}
+    )
+    resp.raise_for_status()
+    return resp.json()["embeddings"]
+
+def embed_many(texts: list, batch_size: int = 256, concurrency: int = EMBEDDING_CONCURRENCY) -> list:
+    """
+    Embed several texts in batched requests; failed items are None. Batches
+    the provider cannot take in one request go out as up to concurrency
+    parallel single-text requests.
+    """
+    global _ollama_batch_unsupported
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        if EMBEDDING_PROVIDER == "openai" or not _ollama_batch_unsupported:
+            with tracing.span("embedding", provider=EMBEDDING_PROVIDER, batch=len(batch)):
+                try:
+                    vectors.extend(_embed_batch(batch))
+                    continue
+                except Exception as e:
+                    response = getattr(e, "response", None)
+                    if EMBEDDING_PROVIDER != "openai" and response is not None and response.status_code == 404:
+                        _ollama_batch_unsupported = True
+                    else:
+                        print(f"Warning: Batched embedding failed ({str(e)}). Embedding one text at a time.")
+        if concurrency > 1 and len(batch) > 1:
+            with ThreadPoolExecutor(max_workers=min(concurrency, len(batch))) as pool:
+                vectors.extend(pool.map(embed, batch))
+        else:
+            vectors.extend(embed(text) for text in batch)
+    return vectors
+
+def cosine_similarity(a: list, b: list) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
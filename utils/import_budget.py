@@ -0,0 +1,118 @@
+"""
+Import-Time Budget
+Author: Mayank Goyal
+Reference: "Text-to-SQL Agents in Practice"
+
+Measures the cold import cost of the pipeline's modules with
+`python -X importtime` in a fresh interpreter (best of a few runs) and checks
+it against a budget. Importing must also be free of filesystem side effects:
+files created by the import are reported and fail the check. The schema,
+the query memory (Chroma), HTTP libraries and log files are all initialized
+on first use, so CLI batch jobs and short-lived workers start fast.
+
+Usage:
+    python -m utils.import_budget                          # main, IMPORT_TIME_BUDGET_MS
+    python -m utils.import_budget execution.run_query agents.correction --top 15
+"""
+
+import os
+import subprocess
+import sys
+from dotenv import load_dotenv
+
+load_dotenv()
+
+IMPORT_TIME_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "250"))  # per module, cumulative
+IMPORT_TIME_RUNS = int(os.getenv("IMPORT_TIME_RUNS", "3"))
+
+DEFAULT_MODULES = ["main"]
+# Directories not watched for side effects
+SKIP_DIRS = {".git", "__pycache__", ".venv", "venv", "node_modules"}
+
+def _snapshot(root: str, depth: int = 3) -> set:
+    """Paths under root, a few levels deep"""
+    paths = set()
+    base_depth = root.rstrip(os.sep).count(os.sep)
+    for directory, dirs, files in os.walk(root):
+        dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+        if directory.count(os.sep) - base_depth >= depth:
+            dirs[:] = []
+        paths.update(os.path.relpath(os.path.join(directory, name), root) for name in dirs + files)
+    return paths
+
+def _parse(stderr: str, module: str) -> tuple:
+    """
+    (cumulative µs, [(name, self µs, cumulative µs)]) of module's import tree
+    from -X importtime output; interpreter startup (site) is left out
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((name.strip(), level, int(self_us), int(cumulative_us)))
+
+    # Children are listed before their parent; the tree ends at the module's top-level line
+    end = next((i for i in range(len(entries) - 1, -1, -1) if entries[i][0] == module and entries[i][1] == 0), None)
+    if end is None:
+        return 0, []
+    start = end
+    while start > 0 and entries[start - 1][1] > 0:
+        start -= 1
+    return entries[end][3], [(name, s, c) for name, _, s, c in entries[start:end]]
+
+def measure(module: str, runs: int = IMPORT_TIME_RUNS) -> dict:
+    """
+    Import module in fresh interpreters; returns {"module", "total_ms",
+    "imports": [(module, self ms, cumulative ms)], "error"} for the fastest run
+    """
+    best = None
+    for _ in range(max(runs, 1)):
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True, text=True
+        )
+        if completed.returncode != 0:
+            error = completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "import failed"
+            return {"module": module, "total_ms": None, "imports": [], "error": error}
+        total, entries = _parse(completed.stderr, module)
+        if best is None or total < best["total_us"]:
+            best = {"total_us": total, "entries": entries}
+    return {
+        "module": module,
+        "total_ms": best["total_us"] / 1000,
+        "imports": [(name, s / 1000, c / 1000) for name, s, c in best["entries"]],
+        "error": None
+    }
+
+def check(modules: list, budget_ms: float = IMPORT_TIME_BUDGET_MS) -> tuple:
+    """(results, created paths, within budget and side-effect free)"""
+    root = os.getcwd()
+    before = _snapshot(root)
+    results = [measure(module) for module in modules]
+    created = sorted(_snapshot(root) - before)
+    ok = not created and all(r["error"] is None and r["total_ms"] <= budget_ms for r in results)
+    return results, created, ok
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    top = 10
+    if "--top" in args:
+        position = args.index("--top")
+        top = int(args[position + 1])
+        del args[position:position + 2]
+    results, created, ok = check(args or DEFAULT_MODULES)
+
+    for result in results:
+        if result["error"]:
+            print(f"{result['module']}: import failed ({result['error']})")
+            continue
+        status = "OK" if result["total_ms"] <= IMPORT_TIME_BUDGET_MS else "OVER BUDGET"
+        print(f"{result['module']}: {result['total_ms']:.1f} ms (budget {IMPORT_TIME_BUDGET_MS:g} ms) {status}")
+        slowest = sorted(result["imports"], key=lambda entry: entry[2], reverse=True)[:top]
+        for name, self_ms, cumulative_ms in slowest:
+            print(f"  {cumulative_ms:8.1f} ms cumulative {self_ms:7.1f} ms self  {name}")
+    if created:
+        print("Created on import: " + ", ".join(created))
+    sys.exit(0 if ok else 1)
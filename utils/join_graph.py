@@ -0,0 +1,213 @@
+"""
+Join Graph
+Author: Mayank Goyal
+Reference: "Text-to-SQL Agents in Practice"
+
+Foreign-key join paths of one database, precomputed once per schema version.
+Tables are nodes and FK links are undirected edges. A BFS from every table
+gives all-pairs shortest join paths (hop counts and parents). For a set of
+tables, a minimal connecting tree is approximated by attaching each table
+to the growing tree along its shortest path from the nearest tree table
+(Takahashi-Matsuyama, at most twice the optimal Steiner tree). Connecting
+trees are cached per table set.
+
+The schema linker uses it to fill `relationships` deterministically, so
+join paths no longer depend on the LLM: bridge tables are added and every
+join comes from a declared foreign key.
+
+Usage:
+    from utils.join_graph import get_join_graph
+    get_join_graph("data/chinook.db").connect(["Artist", "Genre"])
+
+    python -m utils.join_graph data/chinook.db [Table ...]
+"""
+
+import os
+import threading
+from collections import deque
+from dotenv import load_dotenv
+from utils.schema_catalog import get_catalog
+
+load_dotenv()
+
+# Replace the LLM linker's relationships with the FK join tree of its tables
+JOIN_PATHS_ENABLED = os.getenv("JOIN_PATHS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Connecting trees kept per graph (table sets queried so far)
+JOIN_TREE_CACHE_SIZE = 1024
+
+class JoinGraph:
+    """All-pairs shortest FK join paths and connecting trees over a set of tables"""
+
+    def __init__(self, tables: list, foreign_keys: list, fingerprint: str | None = None):
+        self.tables = list(tables)
+        self.foreign_keys = foreign_keys  # [{"from": "A.x", "to": "B.y"}]
+        self.fingerprint = fingerprint
+        self._names = {table.lower(): table for table in self.tables}
+
+        # Tables -> FK links between them (either direction); self references
+        # (e.g. Employee.ReportsTo) are not edges but join a table to itself
+        self.links, self.self_links = {}, {}
+        neighbors = {table: set() for table in self.tables}
+        for fk in foreign_keys:
+            a, b = fk["from"].split(".", 1)[0], fk["to"].split(".", 1)[0]
+            if a == b and a in neighbors:
+                self.self_links.setdefault(a, []).append(fk)
+            elif a in neighbors and b in neighbors:
+                if (a, b) not in self.links:
+                    self.links[(a, b)] = self.links[(b, a)] = []
+                self.links[(a, b)].append(fk)
+                neighbors[a].add(b)
+                neighbors[b].add(a)
+        self.neighbors = {table: sorted(adjacent) for table, adjacent in neighbors.items()}
+
+        # BFS from every table: distance[s][t] hops, parent[s][t] = table before t on the path from s
+        self.distance, self.parent, self.component = {}, {}, {}
+        for source in self.tables:
+            distance, parent = {source: 0}, {source: None}
+            queue = deque([source])
+            while queue:
+                table = queue.popleft()
+                for neighbor in self.neighbors[table]:
+                    if neighbor not in distance:
+                        distance[neighbor] = distance[table] + 1
+                        parent[neighbor] = table
+                        queue.append(neighbor)
+            self.distance[source], self.parent[source] = distance, parent
+            if source not in self.component:
+                for table in distance:
+                    self.component[table] = source
+        self._trees = {}
+
+    @classmethod
+    def from_catalog(cls, catalog) -> "JoinGraph":
+        foreign_keys = [{"from": f"{t}.{c}", "to": f"{rt}.{rc}"} for t, c, rt, rc in catalog.foreign_keys()]
+        return cls(catalog.table_names(), foreign_keys, catalog.fingerprint)
+
+    # ---------- lookups ----------
+
+    def resolve(self, table: str) -> str | None:
+        """Table name as in the schema (case-insensitive), or None if unknown"""
+        return self._names.get(str(table).lower())
+
+    def path(self, source: str, target: str) -> list | None:
+        """Tables on a shortest join path from source to target (both included), None if not connected"""
+        source, target = self.resolve(source), self.resolve(target)
+        if source is None or target is None or target not in self.parent[source]:
+            return None
+        parent, path = self.parent[source], [target]
+        while path[-1] != source:
+            path.append(parent[path[-1]])
+        return list(reversed(path))
+
+    def join_path(self, source: str, target: str) -> list | None:
+        """FK relationships along a shortest join path, None if not connected"""
+        path = self.path(source, target)
+        if path is None:
+            return None
+        return [fk for a, b in zip(path, path[1:]) for fk in self.links[(a, b)]]
+
+    def connect(self, tables: list) -> dict:
+        """
+        Minimal connecting tree of tables: {"tables" (the given ones, then
+        bridges), "bridges", "relationships", "connected", "unknown"}.
+        Relationships include the self references of the given tables.
+        """
+        known, unknown = [], []
+        for table in tables:
+            name = self.resolve(table)
+            if name is None:
+                unknown.append(table)
+            elif name not in known:
+                known.append(name)
+
+        key = frozenset(known)
+        tree = self._trees.get(key)
+        if tree is None:
+            tree = self._steiner_tree(sorted(known))
+            if len(self._trees) >= JOIN_TREE_CACHE_SIZE:
+                self._trees.clear()
+            self._trees[key] = tree
+        nodes, edges = tree
+        bridges = sorted(nodes - key)
+        relationships = [fk for a, b in edges for fk in self.links[(a, b)]]
+        relationships += [fk for table in known for fk in self.self_links.get(table, [])]
+        return {
+            "tables": known + bridges,
+            "bridges": bridges,
+            "relationships": relationships,
+            "connected": len({self.component[t] for t in known}) <= 1,
+            "unknown": unknown
+        }
+
+    def _steiner_tree(self, terminals: list) -> tuple:
+        """(tables, [(a, b) edges]) joining the terminals of each connected component"""
+        nodes, edges = set(), []
+        groups = {}
+        for table in terminals:
+            groups.setdefault(self.component[table], []).append(table)
+        for group in groups.values():
+            tree, remaining = {group[0]}, group[1:]
+            nodes.add(group[0])
+            while remaining:
+                # Remaining terminal closest to any table already in the tree
+                _, start, target = min(
+                    (self.distance[target][node], node, target)
+                    for target in remaining for node in tree
+                )
+                path = self.path(start, target)
+                edges += list(zip(path, path[1:]))
+                tree.update(path)
+                remaining.remove(target)
+            nodes |= tree
+        return nodes, edges
+
+    def stats(self) -> dict:
+        distances = [d for source in self.tables for d in self.distance[source].values()]
+        return {
+            "tables": len(self.tables),
+            "linked_pairs": len(self.links) // 2,
+            "self_links": sum(len(fks) for fks in self.self_links.values()),
+            "components": len(set(self.component.values())),
+            "diameter": max(distances, default=0)
+        }
+
+_graphs = {}
+_graphs_lock = threading.Lock()
+
+def get_join_graph(db_path: str) -> JoinGraph:
+    """Process-wide join graph per database, rebuilt when the schema changes"""
+    key = os.path.abspath(db_path)
+    catalog = get_catalog(db_path)
+    graph = _graphs.get(key)
+    if graph is None or graph.fingerprint != catalog.fingerprint:
+        with _graphs_lock:
+            graph = _graphs.get(key)
+            if graph is None or graph.fingerprint != catalog.fingerprint:
+                graph = _graphs[key] = JoinGraph.from_catalog(catalog)
+    return graph
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    if len(sys.argv) < 2:
+        print("Usage: python -m utils.join_graph <db_path> [Table ...]")
+        sys.exit(1)
+    start = time.perf_counter()
+    graph = get_join_graph(sys.argv[1])
+    elapsed = (time.perf_counter() - start) * 1000
+    stats = graph.stats()
+    print(f"{stats['tables']} tables, {stats['linked_pairs']} linked table pairs, {stats['self_links']} self references, "
+          f"{stats['components']} components, diameter {stats['diameter']} ({elapsed:.1f} ms)")
+    if len(sys.argv) > 2:
+        tree = graph.connect(sys.argv[2:])
+        print(f"Tables: {', '.join(tree['tables'])}")
+        if tree["bridges"]:
+            print(f"Bridges: {', '.join(tree['bridges'])}")
+        for fk in tree["relationships"]:
+            print(f"  {fk['from']} -> {fk['to']}")
+        if not tree["connected"]:
+            print("Not all tables are connected by foreign keys")
+        if tree["unknown"]:
+            print(f"Unknown tables: {', '.join(tree['unknown'])}")
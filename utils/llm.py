@@ -4,16 +4,18 @@ Author: Mayank Goyal
 Reference: "Text-to-SQL Agents in Practice"
 
 Supports multiple LLM providers: Ollama (local), OpenAI (cloud), and Together.ai
+Every provider has a blocking call_*_llm and an asyncio call_*_llm_async variant.
+Ollama and OpenAI can also stream, letting callers stop generation early.
 """
 
+import asyncio
+import json
 import os
 from dotenv import load_dotenv
-import requests
 from utils.logging import get_logger
-
-import urllib3
-#Disable insecure request warnings for OpenAI calls
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+from utils import llm_cache, tracing, transport
+from utils.scheduler import get_scheduler
+from utils.tokens import estimate_tokens
 
 # Load environment variables from .env file
 load_dotenv()
@@ -35,32 +37,238 @@ OPENAI_LLM_MODEL = os.getenv("OPENAI_LLM_MODEL", "gpt-4-turbo")
 TOGETHER_API_KEY = os.getenv("TOGETHER_API_KEY", "")
 TOGETHER_MODEL = os.getenv("TOGETHER_MODEL", "gpt-oss/gpt-oss-120b")
 
-def call_llm(system_prompt, user_prompt, temperature=0.0):
-    """Call LLM via provider (Ollama, OpenAI, or Together.ai)"""
-    if LLM_PROVIDER == "openai":
+# Streaming (used when a caller passes stop_factory; Ollama and OpenAI only)
+LLM_STREAMING = os.getenv("LLM_STREAMING", "true").lower() in ("1", "true", "yes")
+STREAMING_PROVIDERS = ("ollama", "openai")
+
+def call_llm(system_prompt, user_prompt, temperature=0.0, agent=None, stop_factory=None, priority=None):
+    """
+    Call LLM via provider (Ollama, OpenAI, or Together.ai)
+
+    Deterministic calls tagged with an agent listed in LLM_CACHE_AGENTS are
+    served from, and stored in, the persistent response cache.
+
+    If stop_factory is given, the response is streamed. Each attempt (the scheduler
+    retries failed ones) calls stop_factory() for a fresh stop_when predicate, and
+    stop_when(chunk) is called with each text delta; generation is cancelled as
+    soon as it returns True.
+
+    Provider calls go through the provider's scheduler (rate limits, max in-flight,
+    backoff on 429/5xx); priority is scheduler.INTERACTIVE or scheduler.BATCH and
+    defaults to the enclosing llm_priority() block.
+    """
+    with tracing.span("llm", agent=agent, provider=LLM_PROVIDER, model=_active_model()) as span:
+        cache_key = _cache_key(system_prompt, user_prompt, temperature, agent)
+        if cache_key:
+            cached = llm_cache.get_cache().get(cache_key, agent)
+            span.set("cache_hit", cached is not None)
+            if cached is not None:
+                tracing.incr("llm_cache_hits")
+                _record_tokens(span, system_prompt, user_prompt, cached)
+                return cached
+
+        streamed = bool(stop_factory) and _can_stream()
+        span.set("streamed", streamed)
+        response = get_scheduler(LLM_PROVIDER).run(
+            lambda: _dispatch(system_prompt, user_prompt, temperature, stop_factory if streamed else None),
+            tokens=estimate_tokens(system_prompt) + estimate_tokens(user_prompt),
+            priority=priority
+        )
+
+        if cache_key:
+            llm_cache.get_cache().put(cache_key, response, agent)
+        _record_tokens(span, system_prompt, user_prompt, response)
+    return response
+
+async def call_llm_async(system_prompt, user_prompt, temperature=0.0, agent=None, stop_factory=None, priority=None):
+    """Async variant of call_llm; many calls can be in flight on one event loop"""
+    with tracing.span("llm", agent=agent, provider=LLM_PROVIDER, model=_active_model()) as span:
+        cache_key = _cache_key(system_prompt, user_prompt, temperature, agent)
+        if cache_key:
+            cached = await asyncio.to_thread(llm_cache.get_cache().get, cache_key, agent)
+            span.set("cache_hit", cached is not None)
+            if cached is not None:
+                tracing.incr("llm_cache_hits")
+                _record_tokens(span, system_prompt, user_prompt, cached)
+                return cached
+
+        streamed = bool(stop_factory) and _can_stream()
+        span.set("streamed", streamed)
+        response = await get_scheduler(LLM_PROVIDER).run_async(
+            lambda: _dispatch_async(system_prompt, user_prompt, temperature, stop_factory if streamed else None),
+            tokens=estimate_tokens(system_prompt) + estimate_tokens(user_prompt),
+            priority=priority
+        )
+
+        if cache_key:
+            await asyncio.to_thread(llm_cache.get_cache().put, cache_key, response, agent)
+        _record_tokens(span, system_prompt, user_prompt, response)
+    return response
+
+def _dispatch(system_prompt, user_prompt, temperature, stop_factory):
+    """One provider round trip (streamed, with a fresh stop predicate, when stop_factory is given)"""
+    if stop_factory:
+        return _collect_stream(stream_llm(system_prompt, user_prompt, temperature), stop_factory())
+    elif LLM_PROVIDER == "openai":
         return call_openai_llm(system_prompt, user_prompt, temperature)
     elif LLM_PROVIDER == "together":
         return call_together_llm(system_prompt, user_prompt, temperature)
     else:
         return call_ollama_llm(system_prompt, user_prompt, temperature)
 
+async def _dispatch_async(system_prompt, user_prompt, temperature, stop_factory):
+    """Async variant of _dispatch"""
+    if stop_factory:
+        return await _collect_stream_async(stream_llm_async(system_prompt, user_prompt, temperature), stop_factory())
+    elif LLM_PROVIDER == "openai":
+        return await call_openai_llm_async(system_prompt, user_prompt, temperature)
+    elif LLM_PROVIDER == "together":
+        return await call_together_llm_async(system_prompt, user_prompt, temperature)
+    else:
+        return await call_ollama_llm_async(system_prompt, user_prompt, temperature)
+
+def _record_tokens(span, system_prompt, user_prompt, response):
+    """Fill in token counts the provider did not report with estimates"""
+    if "prompt_tokens" not in span.attrs:
+        span.set("prompt_tokens", estimate_tokens(system_prompt) + estimate_tokens(user_prompt))
+        span.set("tokens_estimated", True)
+    if "response_tokens" not in span.attrs:
+        span.set("response_tokens", estimate_tokens(response))
+        span.set("tokens_estimated", True)
+
+def _record_usage(prompt_tokens, response_tokens):
+    """Attach provider-reported token counts to the current llm span"""
+    if prompt_tokens is not None:
+        tracing.set_attr("prompt_tokens", prompt_tokens)
+    if response_tokens is not None:
+        tracing.set_attr("response_tokens", response_tokens)
+
+def _active_model():
+    """Model name used by the configured LLM provider"""
+    if LLM_PROVIDER == "openai":
+        return OPENAI_LLM_MODEL
+    elif LLM_PROVIDER == "together":
+        return TOGETHER_MODEL
+    return OLLAMA_LLM_MODEL
+
+def _cache_key(system_prompt, user_prompt, temperature, agent):
+    """Response cache key for this call, or None if it must not be cached"""
+    if not llm_cache.is_cacheable(agent, temperature):
+        return None
+    return llm_cache.make_key(LLM_PROVIDER, _active_model(), system_prompt, user_prompt, temperature)
+
+def _can_stream():
+    return LLM_STREAMING and LLM_PROVIDER in STREAMING_PROVIDERS
+
+def _collect_stream(chunks, stop_when):
+    """Join streamed text deltas, closing the stream once stop_when is satisfied"""
+    parts = []
+    try:
+        for chunk in chunks:
+            parts.append(chunk)
+            if stop_when(chunk):
+                break
+    finally:
+        chunks.close()
+    return "".join(parts).strip()
+
+async def _collect_stream_async(chunks, stop_when):
+    """Async variant of _collect_stream"""
+    parts = []
+    try:
+        async for chunk in chunks:
+            parts.append(chunk)
+            if stop_when(chunk):
+                break
+    finally:
+        await chunks.aclose()
+    return "".join(parts).strip()
+
+def stream_llm(system_prompt, user_prompt, temperature=0.0):
+    """Yield response text deltas from the configured streaming provider"""
+    if LLM_PROVIDER == "openai":
+        return stream_openai_llm(system_prompt, user_prompt, temperature)
+    return stream_ollama_llm(system_prompt, user_prompt, temperature)
+
+def stream_llm_async(system_prompt, user_prompt, temperature=0.0):
+    """Async variant of stream_llm"""
+    if LLM_PROVIDER == "openai":
+        return stream_openai_llm_async(system_prompt, user_prompt, temperature)
+    return stream_ollama_llm_async(system_prompt, user_prompt, temperature)
+
+def _ollama_chunk(line):
+    """Text delta from one NDJSON line of an Ollama chat stream"""
+    if not line:
+        return ""
+    return json.loads(line).get("message", {}).get("content", "")
+
+def _openai_chunk(line):
+    """Text delta from one SSE line of an OpenAI chat stream ("" for keep-alives and [DONE])"""
+    if not line or not line.startswith("data:"):
+        return ""
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+        return ""
+    choices = json.loads(data).get("choices") or [{}]
+    return choices[0].get("delta", {}).get("content") or ""
+
+def _ollama_request(system_prompt, user_prompt, temperature, stream=False):
+    """Build the Ollama chat request as (url, post kwargs)"""
+    return f"{OLLAMA_ENDPOINT}/api/chat", {
+        "json": {
+            "model": OLLAMA_LLM_MODEL,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            "temperature": temperature,
+            "stream": stream
+        }
+    }
+
+def _together_request(system_prompt, user_prompt, temperature):
+    """Build the Together.ai inference request as (url, post kwargs)"""
+    return "https://api.together.xyz/inference", {
+        "headers": {"Authorization": f"Bearer {TOGETHER_API_KEY}"},
+        "json": {
+            "model": TOGETHER_MODEL,
+            "prompt": f"{system_prompt}\n\n{user_prompt}",
+            "max_tokens": 4096,
+            "temperature": temperature,
+            "top_p": 0.7,
+            "top_k": 50,
+            "repetition_penalty": 1.0
+        }
+    }
+
+def _openai_request(system_prompt, user_prompt, temperature, stream=False):
+    """Build the OpenAI chat completions request as (url, post kwargs)"""
+    return "https://api.openai.com/v1/chat/completions", {
+        "headers": {
+            "Authorization": f"Bearer {OPENAI_API_KEY}",
+            "Content-Type": "application/json"
+        },
+        "json": {
+            "model": OPENAI_LLM_MODEL,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            "temperature": temperature,
+            "max_tokens": 4096,
+            "stream": stream
+        },
+        "verify": False
+    }
+
 def call_ollama_llm(system_prompt, user_prompt, temperature=0.0):
     """Call local Ollama LLM"""
     try:
-        resp = requests.post(
-            f"{OLLAMA_ENDPOINT}/api/chat",
-            json={
-                "model": OLLAMA_LLM_MODEL,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                "temperature": temperature,
-                "stream": False
-            }
-        )
+        url, kwargs = _ollama_request(system_prompt, user_prompt, temperature)
+        resp = transport.post(url, **kwargs)
         resp.raise_for_status()
         result = resp.json()
+        _record_usage(result.get("prompt_eval_count"), result.get("eval_count"))
         return result["message"]["content"].strip()
     except Exception as e:
         logger.error(f"Ollama LLM call failed: {str(e)}")
@@ -69,21 +277,12 @@ def call_ollama_llm(system_prompt, user_prompt, temperature=0.0):
 def call_together_llm(system_prompt, user_prompt, temperature=0.0):
     """Call Together.ai cloud LLM (GPT-OSS 120B)"""
     try:
-        resp = requests.post(
-            "https://api.together.xyz/inference",
-            headers={"Authorization": f"Bearer {TOGETHER_API_KEY}"},
-            json={
-                "model": TOGETHER_MODEL,
-                "prompt": f"{system_prompt}\n\n{user_prompt}",
-                "max_tokens": 4096,
-                "temperature": temperature,
-                "top_p": 0.7,
-                "top_k": 50,
-                "repetition_penalty": 1.0
-            }
-        )
+        url, kwargs = _together_request(system_prompt, user_prompt, temperature)
+        resp = transport.post(url, **kwargs)
         resp.raise_for_status()
         result = resp.json()
+        usage = result.get("output", {}).get("usage") or {}
+        _record_usage(usage.get("prompt_tokens"), usage.get("completion_tokens"))
         return result["output"]["choices"][0]["text"].strip()
     except Exception as e:
         logger.error(f"Together.ai LLM call failed: {str(e)}")
@@ -92,26 +291,110 @@ def call_together_llm(system_prompt, user_prompt, temperature=0.0):
 def call_openai_llm(system_prompt, user_prompt, temperature=0.0):
     """Call OpenAI LLM (GPT-4)"""
     try:
-        resp = requests.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {OPENAI_API_KEY}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": OPENAI_LLM_MODEL,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                "temperature": temperature,
-                "max_tokens": 4096
-            },
-            verify=False
-        )
+        url, kwargs = _openai_request(system_prompt, user_prompt, temperature)
+        resp = transport.post(url, **kwargs)
         resp.raise_for_status()
         result = resp.json()
+        usage = result.get("usage") or {}
+        _record_usage(usage.get("prompt_tokens"), usage.get("completion_tokens"))
         return result["choices"][0]["message"]["content"].strip()
     except Exception as e:
         logger.error(f"OpenAI LLM call failed: {str(e)}")
         raise
+
+async def call_ollama_llm_async(system_prompt, user_prompt, temperature=0.0):
+    """Call local Ollama LLM without blocking the event loop"""
+    try:
+        url, kwargs = _ollama_request(system_prompt, user_prompt, temperature)
+        resp = await transport.post_async(url, **kwargs)
+        resp.raise_for_status()
+        result = resp.json()
+        _record_usage(result.get("prompt_eval_count"), result.get("eval_count"))
+        return result["message"]["content"].strip()
+    except Exception as e:
+        logger.error(f"Ollama LLM call failed: {str(e)}")
+        raise
+
+async def call_together_llm_async(system_prompt, user_prompt, temperature=0.0):
+    """Call Together.ai cloud LLM without blocking the event loop"""
+    try:
+        url, kwargs = _together_request(system_prompt, user_prompt, temperature)
+        resp = await transport.post_async(url, **kwargs)
+        resp.raise_for_status()
+        result = resp.json()
+        usage = result.get("output", {}).get("usage") or {}
+        _record_usage(usage.get("prompt_tokens"), usage.get("completion_tokens"))
+        return result["output"]["choices"][0]["text"].strip()
+    except Exception as e:
+        logger.error(f"Together.ai LLM call failed: {str(e)}")
+        raise
+
+async def call_openai_llm_async(system_prompt, user_prompt, temperature=0.0):
+    """Call OpenAI LLM without blocking the event loop"""
+    try:
+        url, kwargs = _openai_request(system_prompt, user_prompt, temperature)
+        resp = await transport.post_async(url, **kwargs)
+        resp.raise_for_status()
+        result = resp.json()
+        usage = result.get("usage") or {}
+        _record_usage(usage.get("prompt_tokens"), usage.get("completion_tokens"))
+        return result["choices"][0]["message"]["content"].strip()
+    except Exception as e:
+        logger.error(f"OpenAI LLM call failed: {str(e)}")
+        raise
+
+def stream_ollama_llm(system_prompt, user_prompt, temperature=0.0):
+    """Stream local Ollama LLM output; closing the generator cancels generation"""
+    try:
+        url, kwargs = _ollama_request(system_prompt, user_prompt, temperature, stream=True)
+        with transport.post(url, stream=True, **kwargs) as resp:
+            resp.raise_for_status()
+            for line in resp.iter_lines(decode_unicode=True):
+                chunk = _ollama_chunk(line)
+                if chunk:
+                    yield chunk
+    except Exception as e:
+        logger.error(f"Ollama LLM stream failed: {str(e)}")
+        raise
+
+def stream_openai_llm(system_prompt, user_prompt, temperature=0.0):
+    """Stream OpenAI LLM output; closing the generator cancels generation"""
+    try:
+        url, kwargs = _openai_request(system_prompt, user_prompt, temperature, stream=True)
+        with transport.post(url, stream=True, **kwargs) as resp:
+            resp.raise_for_status()
+            for line in resp.iter_lines(decode_unicode=True):
+                chunk = _openai_chunk(line)
+                if chunk:
+                    yield chunk
+    except Exception as e:
+        logger.error(f"OpenAI LLM stream failed: {str(e)}")
+        raise
+
+async def stream_ollama_llm_async(system_prompt, user_prompt, temperature=0.0):
+    """Async variant of stream_ollama_llm"""
+    try:
+        url, kwargs = _ollama_request(system_prompt, user_prompt, temperature, stream=True)
+        async with transport.stream_async(url, **kwargs) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                chunk = _ollama_chunk(line)
+                if chunk:
+                    yield chunk
+    except Exception as e:
+        logger.error(f"Ollama LLM stream failed: {str(e)}")
+        raise
+
+async def stream_openai_llm_async(system_prompt, user_prompt, temperature=0.0):
+    """Async variant of stream_openai_llm"""
+    try:
+        url, kwargs = _openai_request(system_prompt, user_prompt, temperature, stream=True)
+        async with transport.stream_async(url, **kwargs) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                chunk = _openai_chunk(line)
+                if chunk:
+                    yield chunk
+    except Exception as e:
+        logger.error(f"OpenAI LLM stream failed: {str(e)}")
+        raise
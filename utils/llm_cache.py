@@ -0,0 +1,220 @@
+"""
+LLM Response Cache
+Author: Mayank Goyal
+Reference: "Text-to-SQL Agents in Practice"
+
+Persistent, content-addressed cache for deterministic (temperature 0) LLM calls.
+Entries are keyed by a hash of (provider, model, system prompt, user prompt,
+temperature) and stored in SQLite, so several processes can share one cache.
+Expired entries are dropped on read and the least recently used entries are
+evicted once the cache grows past its entry or byte limit.
+
+Usage:
+    python -m utils.llm_cache --stats
+    python -m utils.llm_cache --clear
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dotenv import load_dotenv
+from utils.logging import get_logger
+
+load_dotenv()
+
+# Cache configuration
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".cache/llm_cache.sqlite")
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))  # 0 = never expire
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Agents whose calls may be cached ("*" for all)
+LLM_CACHE_AGENTS = {
+    a.strip() for a in os.getenv(
+        "LLM_CACHE_AGENTS", "schema_linking,planning,sql_generation,fast_path,verification,correction"
+    ).split(",") if a.strip()
+}
+
+# Run an eviction pass after this many writes
+EVICTION_INTERVAL = 100
+
+logger = get_logger()
+
+def make_key(provider: str, model: str, system_prompt: str, user_prompt: str, temperature: float) -> str:
+    """Content hash identifying one LLM request"""
+    payload = json.dumps([provider, model, system_prompt, user_prompt, float(temperature)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def is_cacheable(agent: str | None, temperature: float) -> bool:
+    """Only deterministic calls from opted-in agents are cached"""
+    if not LLM_CACHE_ENABLED or agent is None or temperature != 0.0:
+        return False
+    return "*" in LLM_CACHE_AGENTS or agent in LLM_CACHE_AGENTS
+
+class LLMCache:
+    """SQLite-backed response cache with TTL and LRU eviction"""
+
+    def __init__(
+        self,
+        path: str = LLM_CACHE_PATH,
+        ttl_seconds: int = LLM_CACHE_TTL_SECONDS,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+        max_bytes: int = LLM_CACHE_MAX_BYTES
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.by_agent = {}
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache(last_access)")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread; WAL lets readers and a writer from other processes coexist"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, agent: str | None, hit: bool):
+        with self._lock:
+            counters = self.by_agent.setdefault(agent or "unknown", {"hits": 0, "misses": 0})
+            if hit:
+                self.hits += 1
+                counters["hits"] += 1
+            else:
+                self.misses += 1
+                counters["misses"] += 1
+
+    def get(self, key: str, agent: str | None = None) -> str | None:
+        """Return the cached response for key, or None on miss/expiry"""
+        try:
+            conn = self._conn()
+            row = conn.execute(
+                "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            now = time.time()
+            if row and self.ttl_seconds and now - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                conn.commit()
+                row = None
+            if row is None:
+                self._count(agent, hit=False)
+                return None
+            conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+            conn.commit()
+            self._count(agent, hit=True)
+            return row[0]
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache read failed: {str(e)}")
+            self._count(agent, hit=False)
+            return None
+
+    def put(self, key: str, response: str, agent: str | None = None):
+        """Store a response; periodically evicts expired and least recently used entries"""
+        try:
+            now = time.time()
+            conn = self._conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, response, created_at, last_access, size) VALUES (?, ?, ?, ?, ?)",
+                (key, response, now, now, len(response.encode("utf-8")))
+            )
+            conn.commit()
+            with self._lock:
+                self._writes += 1
+                evict = self._writes % EVICTION_INTERVAL == 0
+            if evict:
+                self.evict()
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache write failed: {str(e)}")
+
+    def evict(self) -> int:
+        """Drop expired entries, then least recently used ones beyond the entry/byte limits"""
+        conn = self._conn()
+        removed = 0
+        if self.ttl_seconds:
+            removed += conn.execute(
+                "DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            ).rowcount
+
+        stale = []
+        kept_entries = 0
+        kept_bytes = 0
+        for key, size in conn.execute("SELECT key, size FROM llm_cache ORDER BY last_access DESC"):
+            if kept_entries < self.max_entries and kept_bytes + size <= self.max_bytes:
+                kept_entries += 1
+                kept_bytes += size
+            else:
+                stale.append((key,))
+        if stale:
+            conn.executemany("DELETE FROM llm_cache WHERE key = ?", stale)
+            removed += len(stale)
+        conn.commit()
+        return removed
+
+    def clear(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM llm_cache")
+        conn.commit()
+
+    def stats(self) -> dict:
+        entries, size = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache"
+        ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+            "by_agent": {agent: dict(c) for agent, c in self.by_agent.items()}
+        }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> LLMCache:
+    """Process-wide cache instance, created on first use"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMCache()
+    return _cache
+
+if __name__ == "__main__":
+    import sys
+
+    cache = get_cache()
+    if "--clear" in sys.argv:
+        cache.clear()
+        print(f"Cleared LLM cache at {cache.path}")
+    else:
+        removed = cache.evict()
+        print(json.dumps({"path": cache.path, "evicted": removed, **cache.stats()}, indent=2))
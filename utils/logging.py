@@ -2,18 +2,37 @@
 Logging Configuration
 Author: Mayank Goyal
 Reference: "Text-to-SQL Agents in Practice"
+
+The log file (LOG_DIR/run_<timestamp>.log, logs/ by default) is created when
+the first record is written, so importing a module that holds a logger has
+no filesystem side effects.
 """
 
 import logging, os
 from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LOG_DIR = os.getenv("LOG_DIR", "logs")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()  # DEBUG adds raw SQL generation responses
+
+class _LazyFileHandler(logging.FileHandler):
+    """FileHandler that creates its directory and file on the first record"""
+
+    def __init__(self, filename: str):
+        super().__init__(filename, delay=True)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
 
 def get_logger():
-    os.makedirs("logs", exist_ok=True)
     logger = logging.getLogger("text2sql")
     if logger.handlers:
         return logger
-    logger.setLevel(logging.INFO)
-    fh = logging.FileHandler(f"logs/run_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
+    logger.setLevel(LOG_LEVEL)
+    fh = _LazyFileHandler(os.path.join(LOG_DIR, f"run_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"))
     fh.setFormatter(logging.Formatter("%(asctime)s | %(levelname)s | %(message)s"))
     logger.addHandler(fh)
     return logger
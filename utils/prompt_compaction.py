@@ -0,0 +1,192 @@
+"""
+Prompt Compaction
+Author: Mayank Goyal
+Reference: "Text-to-SQL Agents in Practice"
+
+Dense serialization of the schema context, query plan and other structured
+prompt sections. The schema context renders as one line per table plus join
+lines, e.g.
+
+    Customer(CustomerId,FirstName,LastName)
+    Invoice(InvoiceId,CustomerId,Total)
+    FK Invoice.CustomerId->Customer.CustomerId
+
+and is kept within a token budget by dropping the least relevant columns
+first (join keys and columns the plan mentions are kept longest).
+Plans and other sections are minified JSON with empty fields and duplicate
+list entries removed.
+
+Set PROMPT_COMPACT=false to fall back to indented JSON everywhere.
+"""
+
+import json
+import os
+import re
+from dotenv import load_dotenv
+from utils.tokens import estimate_tokens
+
+load_dotenv()
+
+PROMPT_COMPACT = os.getenv("PROMPT_COMPACT", "true").lower() in ("1", "true", "yes")
+PROMPT_SCHEMA_TOKEN_BUDGET = int(os.getenv("PROMPT_SCHEMA_TOKEN_BUDGET", "2000"))  # 0 = unlimited
+
+# Column relevance tiers (higher survives truncation longer)
+RELEVANCE_JOIN_KEY = 3
+RELEVANCE_PLAN = 2
+RELEVANCE_KEY_LIKE = 1
+RELEVANCE_OTHER = 0
+
+SCHEMA_KEYS = ("tables", "columns", "relationships")
+
+def _is_empty(value) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+def prune(obj):
+    """Drop empty fields and duplicate list entries, recursively"""
+    if isinstance(obj, dict):
+        pruned = {k: prune(v) for k, v in obj.items()}
+        return {k: v for k, v in pruned.items() if not _is_empty(v)}
+    if isinstance(obj, list):
+        seen = set()
+        result = []
+        for item in obj:
+            item = prune(item)
+            marker = json.dumps(item, sort_keys=True, default=str)
+            if marker not in seen and not _is_empty(item):
+                seen.add(marker)
+                result.append(item)
+        return result
+    return obj
+
+def minify(obj) -> str:
+    """Compact JSON without whitespace, empty fields or duplicate list entries"""
+    return json.dumps(prune(obj), separators=(",", ":"), ensure_ascii=False, default=str)
+
+def json_section(obj) -> str:
+    """Render any structured prompt section"""
+    if not PROMPT_COMPACT:
+        return json.dumps(obj, indent=2)
+    return minify(obj)
+
+def plan_section(query_plan: dict) -> str:
+    """Render the query plan"""
+    return json_section(query_plan)
+
+def _name(item) -> str:
+    """Table/column name from a string or a {"name": ...}-style dict"""
+    if isinstance(item, dict):
+        for key in ("name", "column", "table"):
+            if key in item:
+                return str(item[key])
+        return minify(item)
+    return str(item)
+
+def _relationship(rel) -> str:
+    if isinstance(rel, dict) and "from" in rel and "to" in rel:
+        return f"FK {rel['from']}->{rel['to']}"
+    if isinstance(rel, str):
+        return f"FK {rel}"
+    return f"FK {minify(rel)}"
+
+def _columns_by_table(columns, tables: list) -> tuple:
+    """
+    ({table: [columns]}, unplaced entries) from the dict form or a list of
+    "Table.Column" names (or {"table", "column"} dicts). Unqualified names
+    belong to the only table when there is one; otherwise they are returned
+    as unplaced so the caller can still show them.
+    """
+    if isinstance(columns, dict):
+        return columns, []
+    if not isinstance(columns, list):
+        columns = [columns]
+    spelled = {table.lower(): table for table in tables}
+    by_table, unplaced = {}, []
+    for col in columns:
+        if isinstance(col, dict) and "table" in col and ("column" in col or "name" in col):
+            table, name = str(col["table"]), str(col.get("column", col.get("name")))
+        elif isinstance(col, str) and "." in col:
+            table, name = col.split(".", 1)
+        else:
+            unplaced.append(col)
+            continue
+        by_table.setdefault(spelled.get(table.lower(), table), []).append(name)
+    if unplaced and len(tables) == 1:
+        by_table.setdefault(tables[0], []).extend(_name(col) for col in unplaced)
+        unplaced = []
+    return by_table, unplaced
+
+def _column_relevance(table: str, column: str, join_refs: set, plan_text: str) -> int:
+    if f"{table}.{column}".lower() in join_refs:
+        return RELEVANCE_JOIN_KEY
+    if plan_text and re.search(rf"\b{re.escape(column.lower())}\b", plan_text):
+        return RELEVANCE_PLAN
+    if column.lower().endswith("id"):
+        return RELEVANCE_KEY_LIKE
+    return RELEVANCE_OTHER
+
+def render_schema_context(schema_context: dict, query_plan: dict | None = None, budget_tokens: int | None = None) -> str:
+    """Dense schema context, truncated to budget_tokens by dropping low-relevance columns"""
+    budget_tokens = PROMPT_SCHEMA_TOKEN_BUDGET if budget_tokens is None else budget_tokens
+    tables = [_name(t) for t in schema_context.get("tables") or []]
+    columns, unplaced = _columns_by_table(schema_context.get("columns") or {}, tables)
+    relationships = schema_context.get("relationships") or []
+    if not isinstance(relationships, list):
+        relationships = [relationships]
+
+    join_refs = set()
+    for rel in relationships:
+        if isinstance(rel, dict):
+            join_refs.update(str(rel.get(k, "")).lower() for k in ("from", "to"))
+    plan_text = minify(query_plan).lower() if query_plan else ""
+
+    # Column names per table, in prompt order, without duplicates
+    table_columns = {}
+    for table in tables + [t for t in columns if t not in tables]:
+        cols = columns.get(table) or []
+        if not isinstance(cols, list):
+            cols = [cols]
+        names = []
+        for col in cols:
+            name = _name(col)
+            if name not in names:
+                names.append(name)
+        table_columns[table] = names
+
+    relevance = {
+        (table, col): _column_relevance(table, col, join_refs, plan_text)
+        for table, cols in table_columns.items() for col in cols
+    }
+
+    join_lines = list(dict.fromkeys(_relationship(rel) for rel in relationships))
+    extras = {k: v for k, v in schema_context.items() if k not in SCHEMA_KEYS and not _is_empty(v)}
+    extra_lines = [f"{key}: {minify(value)}" for key, value in extras.items()]
+    if unplaced:
+        extra_lines.insert(0, f"columns: {minify(unplaced)}")
+
+    def render(kept: dict) -> str:
+        lines = [f"{table}({','.join(cols)})" if cols else table for table, cols in kept.items()]
+        return "\n".join(lines + join_lines + extra_lines)
+
+    text = render(table_columns)
+    if not budget_tokens or estimate_tokens(text) <= budget_tokens:
+        return text
+
+    # Drop the least relevant columns first, later columns before earlier ones
+    kept = {table: list(cols) for table, cols in table_columns.items()}
+    droppable = sorted(
+        ((relevance[(table, col)], -idx, table, col)
+         for table, cols in table_columns.items() for idx, col in enumerate(cols)
+         if relevance[(table, col)] < RELEVANCE_JOIN_KEY),
+    )
+    for _, _, table, col in droppable:
+        kept[table].remove(col)
+        text = render(kept)
+        if estimate_tokens(text) <= budget_tokens:
+            break
+    return text
+
+def schema_section(schema_context: dict, query_plan: dict | None = None) -> str:
+    """Render the schema context for an agent prompt"""
+    if not PROMPT_COMPACT:
+        return json.dumps(schema_context, indent=2)
+    return render_schema_context(schema_context, query_plan)
@@ -0,0 +1,193 @@
+"""
+Prompt Registry
+Author: Mayank Goyal
+Reference: "Text-to-SQL Agents in Practice"
+
+Loads every template under prompts/ once (relative to the repository, not
+the working directory), validates it and precompiles it into literal and
+slot segments. System prompts are prompts/<agent>.txt; user prompt
+templates live in prompts/user/<agent>.txt and use $name slots.
+
+Set PROMPTS_HOT_RELOAD=true to pick up edits to the files without a restart.
+
+Usage:
+    python -m utils.prompts    # list templates with slots and token counts
+"""
+
+import os
+import string
+import threading
+import time
+from pathlib import Path
+from dotenv import load_dotenv
+from utils.tokens import estimate_tokens
+
+load_dotenv()
+
+PROMPTS_DIR = Path(os.getenv("PROMPTS_DIR", Path(__file__).resolve().parent.parent / "prompts"))
+PROMPTS_HOT_RELOAD = os.getenv("PROMPTS_HOT_RELOAD", "false").lower() in ("1", "true", "yes")
+
+# Minimum seconds between modification checks of one template when hot reload is on
+HOT_RELOAD_INTERVAL = 1.0
+
+# Slots each template must declare; templates not listed must have none
+EXPECTED_SLOTS = {
+    "schema_linking": set(),
+    "planning": set(),
+    "sql_generation": set(),
+    "verification": set(),
+    "correction": set(),
+    "fast_path": set(),
+    "user/schema_linking": {"schema", "question"},
+    "user/planning": {"schema_context", "question"},
+    "user/fast_path": {"schema_context", "question"},
+    "user/sql_generation": {"schema_context", "query_plan", "error_context"},
+    "user/sql_generation_error": {"previous_sql", "error_feedback"},
+    "user/verification": {"schema_context", "query_plan", "sql"},
+    "user/correction": {
+        "schema_context", "query_plan", "sql", "verification_issues",
+        "execution_feedback", "distinct_values"
+    },
+}
+
+class PromptError(ValueError):
+    """Raised for missing, malformed or mis-rendered prompt templates"""
+
+class PromptTemplate:
+    """A template parsed once into literal text and $slot segments"""
+
+    __slots__ = ("name", "path", "text", "slots", "tokens", "mtime", "checked_at", "_segments")
+
+    def __init__(self, name: str, path: Path):
+        self.name = name
+        self.path = path
+        self.mtime = path.stat().st_mtime
+        self.checked_at = time.monotonic()
+        text = path.read_text(encoding="utf-8")
+        # Files end with a newline by convention; it is not part of the prompt
+        self.text = text[:-1] if text.endswith("\n") else text
+        self._segments = self._compile(self.text)
+        self.slots = tuple(dict.fromkeys(value for is_slot, value in self._segments if is_slot))
+        self.tokens = estimate_tokens(self.text)
+
+    def _compile(self, text: str) -> list:
+        """Split text into (is_slot, value) segments, resolving $$ escapes"""
+        segments = []
+        last = 0
+        for match in string.Template.pattern.finditer(text):
+            if match.group("invalid") is not None:
+                line = text.count("\n", 0, match.start()) + 1
+                raise PromptError(f"{self.path}: invalid placeholder on line {line}")
+            segments.append((False, text[last:match.start()]))
+            if match.group("escaped") is not None:
+                segments.append((False, "$"))
+            else:
+                segments.append((True, match.group("named") or match.group("braced")))
+            last = match.end()
+        segments.append((False, text[last:]))
+        return [segment for segment in segments if segment[0] or segment[1]]
+
+    def render(self, **values) -> str:
+        """Fill every slot; missing or unknown slot names raise PromptError"""
+        missing = [slot for slot in self.slots if slot not in values]
+        unknown = [name for name in values if name not in self.slots]
+        if missing or unknown:
+            raise PromptError(f"Prompt '{self.name}': missing slots {missing}, unknown slots {unknown}")
+        return "".join(values[value] if is_slot else value for is_slot, value in self._segments)
+
+class PromptRegistry:
+    """All templates under a prompts directory, keyed by relative path without .txt"""
+
+    def __init__(self, directory: Path = PROMPTS_DIR, hot_reload: bool = PROMPTS_HOT_RELOAD):
+        self.directory = Path(directory)
+        self.hot_reload = hot_reload
+        self._templates = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """(Re)load and validate every template"""
+        templates = {}
+        for path in sorted(self.directory.rglob("*.txt")):
+            name = path.relative_to(self.directory).with_suffix("").as_posix()
+            templates[name] = PromptTemplate(name, path)
+
+        missing = [name for name in EXPECTED_SLOTS if name not in templates]
+        if missing:
+            raise PromptError(f"Missing prompt templates in {self.directory}: {', '.join(missing)}")
+        for template in templates.values():
+            self._validate(template)
+        with self._lock:
+            self._templates = templates
+
+    def _validate(self, template: PromptTemplate):
+        if not template.text.strip():
+            raise PromptError(f"{template.path} is empty")
+        expected = EXPECTED_SLOTS.get(template.name, set())
+        if set(template.slots) != expected:
+            raise PromptError(
+                f"{template.path} declares slots {sorted(template.slots)}, expected {sorted(expected)}"
+            )
+
+    def get(self, name: str) -> PromptTemplate:
+        template = self._templates.get(name)
+        if template is None:
+            raise PromptError(f"Unknown prompt template '{name}' in {self.directory}")
+        if self.hot_reload:
+            template = self._refresh(template)
+        return template
+
+    def _refresh(self, template: PromptTemplate) -> PromptTemplate:
+        """Reload a template whose file changed since it was loaded"""
+        now = time.monotonic()
+        if now - template.checked_at < HOT_RELOAD_INTERVAL:
+            return template
+        template.checked_at = now
+        try:
+            if template.path.stat().st_mtime == template.mtime:
+                return template
+            fresh = PromptTemplate(template.name, template.path)
+            self._validate(fresh)
+        except (OSError, PromptError) as e:
+            print(f"Warning: keeping previous version of prompt '{template.name}' ({str(e)})")
+            return template
+        with self._lock:
+            self._templates[template.name] = fresh
+        return fresh
+
+    def token_report(self) -> dict:
+        """Estimated token count of every template"""
+        return {name: template.tokens for name, template in sorted(self._templates.items())}
+
+    def __iter__(self):
+        return iter(sorted(self._templates.values(), key=lambda t: t.name))
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_registry() -> PromptRegistry:
+    """Process-wide registry, loaded on first use"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = PromptRegistry()
+    return _registry
+
+def get_prompt(name: str) -> PromptTemplate:
+    return get_registry().get(name)
+
+def system_prompt(agent: str) -> str:
+    """The system prompt text for an agent"""
+    return get_prompt(agent).text
+
+def render(name: str, **values) -> str:
+    """Render a template by name"""
+    return get_prompt(name).render(**values)
+
+if __name__ == "__main__":
+    registry = get_registry()
+    print(f"{'template':<30}{'tokens':>8}  slots")
+    for template in registry:
+        print(f"{template.name:<30}{template.tokens:>8}  {', '.join(template.slots) or '-'}")
+    print(f"{'total':<30}{sum(registry.token_report().values()):>8}")
@@ -0,0 +1,260 @@
+"""
+LLM Request Scheduler
+Author: Mayank Goyal
+Reference: "Text-to-SQL Agents in Practice"
+
+Provider-aware admission control for call_llm:
+- token buckets for requests/minute and tokens/minute per provider
+- a max in-flight limit shared by threads and event loops, with
+  interactive requests admitted ahead of batch requests
+- jittered exponential backoff on 429/5xx and connection errors,
+  honouring Retry-After when the provider sends it
+
+Limits come from .env, e.g. OPENAI_RPM, OPENAI_TPM, OPENAI_MAX_INFLIGHT
+(0 disables a limit).
+"""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from utils import tracing
+
+load_dotenv()
+
+# Priority classes (lower is admitted first)
+INTERACTIVE = 0
+BATCH = 1
+PRIORITIES = {"interactive": INTERACTIVE, "batch": BATCH}
+
+# Retry configuration
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30.0"))
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# Response tokens assumed when reserving tokens/minute capacity
+LLM_EXPECTED_RESPONSE_TOKENS = int(os.getenv("LLM_EXPECTED_RESPONSE_TOKENS", "512"))
+
+# Default max in-flight requests: a single local Ollama serves few requests in parallel
+DEFAULT_MAX_INFLIGHT = {"ollama": 2, "openai": 16, "together": 8}
+
+_priority = contextvars.ContextVar(
+    "llm_priority", default=PRIORITIES.get(os.getenv("LLM_DEFAULT_PRIORITY", "interactive").lower(), INTERACTIVE)
+)
+
+@contextmanager
+def llm_priority(priority: str):
+    """Run the enclosed LLM calls with the given priority class ("interactive" or "batch")"""
+    token = _priority.set(PRIORITIES[priority])
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def current_priority() -> int:
+    return _priority.get()
+
+class TokenBucket:
+    """Refills at rate_per_minute; reservations may overdraw and the caller waits off the debt"""
+
+    def __init__(self, rate_per_minute: float):
+        self.rate_per_minute = rate_per_minute
+        self.capacity = rate_per_minute
+        self._tokens = rate_per_minute
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """Take amount from the bucket; returns seconds to wait before using it"""
+        if self.rate_per_minute <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            refill = (now - self._updated) * self.rate_per_minute / 60.0
+            self._tokens = min(self.capacity, self._tokens + refill)
+            self._updated = now
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens * 60.0 / self.rate_per_minute
+
+class PriorityGate:
+    """Max in-flight limit; freed slots go to the highest-priority, oldest waiter"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._inflight = 0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def _enter_or_enqueue(self, priority: int, wake):
+        """Take a free slot (returns None) or queue a waiter entry"""
+        with self._lock:
+            if self._inflight < self.limit and not self._waiters:
+                self._inflight += 1
+                return None
+            entry = [priority, next(self._seq), wake, "waiting"]
+            heapq.heappush(self._waiters, entry)
+            return entry
+
+    def acquire(self, priority: int = INTERACTIVE):
+        if self.limit <= 0:
+            return
+        event = threading.Event()
+        if self._enter_or_enqueue(priority, event.set) is not None:
+            event.wait()
+
+    async def acquire_async(self, priority: int = INTERACTIVE):
+        if self.limit <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        entry = self._enter_or_enqueue(
+            priority, lambda: loop.call_soon_threadsafe(self._grant_future, future)
+        )
+        if entry is None:
+            return
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                waiting = entry[3] == "waiting"
+                if waiting:
+                    entry[3] = "cancelled"
+            if not waiting and future.done() and not future.cancelled():
+                # Granted a slot in the same instant we were cancelled
+                self.release()
+            raise
+
+    def _grant_future(self, future):
+        if future.cancelled():
+            # The waiter gave up after being granted a slot: pass it on
+            self.release()
+        elif not future.done():
+            future.set_result(None)
+
+    def release(self):
+        if self.limit <= 0:
+            return
+        with self._lock:
+            while self._waiters:
+                entry = heapq.heappop(self._waiters)
+                if entry[3] == "waiting":
+                    entry[3] = "granted"
+                    entry[2]()  # the slot passes directly to this waiter
+                    return
+            self._inflight -= 1
+
+def _is_transport_error(exc: Exception) -> bool:
+    # Only check libraries that are loaded; an exception cannot come from one that is not
+    requests = sys.modules.get("requests")
+    if requests is not None and isinstance(exc, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    httpx = sys.modules.get("httpx")
+    return httpx is not None and isinstance(exc, httpx.TransportError)
+
+def retry_delay(exc: Exception, attempt: int) -> float | None:
+    """Seconds to wait before retrying after exc, or None if it is not retryable"""
+    response = getattr(exc, "response", None)
+    status = getattr(response, "status_code", None)
+    retry_after = 0.0
+    if status is not None:
+        if status not in RETRYABLE_STATUS:
+            return None
+        try:
+            retry_after = float(response.headers.get("Retry-After", 0))
+        except (TypeError, ValueError):
+            retry_after = 0.0
+    elif not _is_transport_error(exc):
+        return None
+    # Full jitter keeps parallel pipelines from retrying in lockstep
+    backoff = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+    return max(retry_after, backoff)
+
+class ProviderScheduler:
+    """Rate limits, concurrency and retries for one LLM provider"""
+
+    def __init__(self, provider: str, rpm: float, tpm: float, max_inflight: int, max_retries: int = LLM_MAX_RETRIES):
+        self.provider = provider
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.gate = PriorityGate(max_inflight)
+        self.max_retries = max_retries
+
+    @classmethod
+    def from_env(cls, provider: str) -> "ProviderScheduler":
+        prefix = provider.upper()
+        return cls(
+            provider,
+            rpm=float(os.getenv(f"{prefix}_RPM", "0")),
+            tpm=float(os.getenv(f"{prefix}_TPM", "0")),
+            max_inflight=int(os.getenv(f"{prefix}_MAX_INFLIGHT", str(DEFAULT_MAX_INFLIGHT.get(provider, 8))))
+        )
+
+    def _capacity_wait(self, tokens: int) -> float:
+        return max(self.requests.reserve(1), self.tokens.reserve(tokens + LLM_EXPECTED_RESPONSE_TOKENS))
+
+    def _on_retry(self, exc: Exception, attempt: int, delay: float):
+        tracing.set_attr("retries", attempt + 1)
+        tracing.incr("llm_retries")
+        tracing.set_attr("last_retry_reason", f"{type(exc).__name__}: {str(exc)}"[:200])
+
+    def run(self, call, tokens: int = 0, priority: int | None = None):
+        """Run call() once capacity allows, retrying transient failures with backoff"""
+        priority = current_priority() if priority is None else priority
+        for attempt in range(self.max_retries + 1):
+            wait = self._capacity_wait(tokens)
+            if wait:
+                time.sleep(wait)
+            self.gate.acquire(priority)
+            try:
+                return call()
+            except Exception as e:
+                delay = retry_delay(e, attempt)
+                if delay is None or attempt == self.max_retries:
+                    raise
+                self._on_retry(e, attempt, delay)
+            finally:
+                self.gate.release()
+            time.sleep(delay)
+
+    async def run_async(self, call, tokens: int = 0, priority: int | None = None):
+        """Async variant of run; call() must return an awaitable"""
+        priority = current_priority() if priority is None else priority
+        for attempt in range(self.max_retries + 1):
+            wait = self._capacity_wait(tokens)
+            if wait:
+                await asyncio.sleep(wait)
+            await self.gate.acquire_async(priority)
+            try:
+                return await call()
+            except Exception as e:
+                delay = retry_delay(e, attempt)
+                if delay is None or attempt == self.max_retries:
+                    raise
+                self._on_retry(e, attempt, delay)
+            finally:
+                self.gate.release()
+            await asyncio.sleep(delay)
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+def get_scheduler(provider: str) -> ProviderScheduler:
+    """Process-wide scheduler for a provider, created on first use"""
+    scheduler = _schedulers.get(provider)
+    if scheduler is None:
+        with _schedulers_lock:
+            scheduler = _schedulers.get(provider)
+            if scheduler is None:
+                scheduler = _schedulers[provider] = ProviderScheduler.from_env(provider)
+    return scheduler
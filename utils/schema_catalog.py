@@ -0,0 +1,274 @@
+"""
+Schema Catalog
+Author: Mayank Goyal
+Reference: "Text-to-SQL Agents in Practice"
+
+Structured, cached introspection of any SQLite database: tables and views,
+columns with types, primary keys, foreign keys (PRAGMA foreign_key_list),
+indexes (with sqlite_stat1 statistics when the database has been analyzed)
+and estimated row counts.
+
+A catalog is introspected once per schema version: it is kept in memory per
+database file and stored on disk (SCHEMA_CATALOG_DIR, one JSON file per
+database), so new processes do not re-introspect. Each lookup costs one
+PRAGMA schema_version on a pooled connection; any DDL change bumps it and
+the catalog is rebuilt. One process can serve any number of databases.
+
+Row counts are estimates (sqlite_stat1, else max(rowid)) taken when the
+catalog is built; they do not follow later inserts.
+
+Usage:
+    from utils.schema_catalog import get_catalog
+    catalog = get_catalog("data/chinook.db")
+    catalog.table("track")["foreign_keys"]
+    print(catalog.schema_text())
+
+    python -m utils.schema_catalog data/chinook.db [--json]
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from dotenv import load_dotenv
+from execution import engine
+
+load_dotenv()
+
+SCHEMA_CATALOG_DIR = os.getenv("SCHEMA_CATALOG_DIR", ".cache/schema_catalog")
+
+CATALOG_VERSION = 1
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+class SchemaCatalog:
+    """Introspected schema of one SQLite database"""
+
+    def __init__(self, data: dict):
+        self.db_path = data["db_path"]
+        self.schema_version = data["schema_version"]
+        self.fingerprint = data["fingerprint"]  # hash of the DDL
+        # name -> {"name", "type", "columns": [{"name", "type", "notnull", "default", "pk"}],
+        #          "primary_key", "foreign_keys": [{"columns", "table", "ref_columns"}],
+        #          "indexes": [{"name", "unique", "columns", "stat"}], "row_count"}
+        self.tables = data["tables"]
+        self._names = {name.lower(): name for name in self.tables}
+        self._text = {}
+        self._reference_map = None
+
+    @classmethod
+    def introspect(cls, db_path: str) -> "SchemaCatalog":
+        with engine.connection(db_path) as conn:
+            version = conn.execute("PRAGMA schema_version").fetchone()[0]
+            ddl = conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY type, name").fetchall()
+            stat1 = {}
+            if any(name == "sqlite_stat1" for _, name, _ in ddl):
+                for table, index, stat in conn.execute("SELECT tbl, idx, stat FROM sqlite_stat1"):
+                    stat1[(table, index)] = [int(n) for n in stat.split() if n.isdigit()]
+
+            tables = {}
+            for kind, name, _ in ddl:
+                if kind not in ("table", "view") or name.startswith("sqlite_"):
+                    continue
+                info = conn.execute(f"PRAGMA table_info({_quote(name)})").fetchall()
+                foreign_keys = {}
+                for row in conn.execute(f"PRAGMA foreign_key_list({_quote(name)})"):
+                    fk = foreign_keys.setdefault(row[0], {"columns": [], "table": row[2], "ref_columns": []})
+                    fk["columns"].append(row[3])
+                    fk["ref_columns"].append(row[4])
+                indexes = []
+                for _, index, unique, *_ in conn.execute(f"PRAGMA index_list({_quote(name)})"):
+                    indexes.append({
+                        "name": index,
+                        "unique": bool(unique),
+                        "columns": [row[2] for row in conn.execute(f"PRAGMA index_info({_quote(index)})") if row[2]],
+                        "stat": stat1.get((name, index))
+                    })
+
+                row_count = None
+                if kind == "table":
+                    table_stat = stat1.get((name, None)) or next(
+                        (stat for (t, _), stat in stat1.items() if t == name and stat), None
+                    )
+                    if table_stat:
+                        row_count = table_stat[0]
+                    else:
+                        try:
+                            row_count = conn.execute(f"SELECT max(rowid) FROM {_quote(name)}").fetchone()[0] or 0
+                        except sqlite3.OperationalError:  # WITHOUT ROWID
+                            row_count = conn.execute(f"SELECT count(*) FROM {_quote(name)}").fetchone()[0]
+
+                tables[name] = {
+                    "name": name,
+                    "type": kind,
+                    "columns": [
+                        {"name": row[1], "type": row[2] or "", "notnull": bool(row[3]), "default": row[4], "pk": row[5]}
+                        for row in info
+                    ],
+                    "primary_key": [row[1] for row in sorted(info, key=lambda r: r[5]) if row[5]],
+                    "foreign_keys": [foreign_keys[i] for i in sorted(foreign_keys)],
+                    "indexes": indexes,
+                    "row_count": row_count
+                }
+
+        # Foreign keys without target columns reference the target's primary key
+        for entry in tables.values():
+            for fk in entry["foreign_keys"]:
+                target = next((t for t in tables.values() if t["name"].lower() == fk["table"].lower()), None)
+                fk["ref_columns"] = [
+                    ref or (target["primary_key"][i] if target and i < len(target["primary_key"]) else column)
+                    for i, (column, ref) in enumerate(zip(fk["columns"], fk["ref_columns"]))
+                ]
+
+        payload = json.dumps([CATALOG_VERSION, ddl], sort_keys=True, default=str)
+        return cls({
+            "db_path": os.path.abspath(db_path),
+            "schema_version": version,
+            "fingerprint": hashlib.sha256(payload.encode()).hexdigest(),
+            "tables": tables
+        })
+
+    # ---------- lookups ----------
+
+    def table(self, name: str) -> dict | None:
+        """Table or view by case-insensitive name"""
+        original = self._names.get(name.lower())
+        return self.tables[original] if original else None
+
+    def table_names(self, include_views: bool = False) -> list:
+        return [name for name, entry in self.tables.items() if include_views or entry["type"] == "table"]
+
+    def columns(self, table: str) -> list:
+        entry = self.table(table)
+        return [column["name"] for column in entry["columns"]] if entry else []
+
+    def foreign_keys(self) -> list:
+        """Every single-column link as (table, column, referenced table, referenced column)"""
+        links = []
+        for name, entry in self.tables.items():
+            for fk in entry["foreign_keys"]:
+                target = self.table(fk["table"])
+                ref_table = target["name"] if target else fk["table"]
+                for column, ref in zip(fk["columns"], fk["ref_columns"]):
+                    links.append((name, column, ref_table, ref))
+        return links
+
+    def table_lines(self, name: str, columns: list | None = None) -> list:
+        """Prompt lines of one table (all columns, or the given ones), keys marked"""
+        references = self._references()
+        entry = self.tables[name]
+        lines = [f"{name}:"]
+        for column in entry["columns"]:
+            if columns is not None and column["name"] not in columns:
+                continue
+            notes = [column["type"]] if column["type"] else []
+            if column["pk"]:
+                notes.append("PRIMARY KEY")
+            if (name, column["name"]) in references:
+                notes.append(f"FOREIGN KEY -> {references[(name, column['name'])]}")
+            lines.append(f"  - {column['name']} ({', '.join(notes)})" if notes else f"  - {column['name']}")
+        return lines
+
+    def _references(self) -> dict:
+        """(table, column) -> "Table.Column" it references"""
+        if self._reference_map is None:
+            self._reference_map = {(t, c): f"{rt}.{rc}" for t, c, rt, rc in self.foreign_keys()}
+        return self._reference_map
+
+    def title(self) -> str:
+        stem = os.path.splitext(os.path.basename(self.db_path))[0]
+        return f"{stem.upper()} DATABASE SCHEMA"
+
+    def schema_text(self, title: str | None = None) -> str:
+        """Readable schema for prompts: one block per table, keys marked"""
+        title = title or self.title()
+        text = self._text.get(title)
+        if text is not None:
+            return text
+        lines = [title, "", "Tables:", ""]
+        for name in self.table_names():
+            lines += self.table_lines(name) + [""]
+        text = self._text[title] = "\n".join(lines) + "\n"
+        return text
+
+    # ---------- persistence ----------
+
+    def to_dict(self) -> dict:
+        return {
+            "version": CATALOG_VERSION,
+            "db_path": self.db_path,
+            "schema_version": self.schema_version,
+            "fingerprint": self.fingerprint,
+            "tables": self.tables
+        }
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp, path)
+
+def catalog_path(db_path: str) -> str:
+    """On-disk location of a database's catalog"""
+    digest = hashlib.sha1(os.path.abspath(db_path).encode()).hexdigest()[:16]
+    name = os.path.splitext(os.path.basename(db_path))[0]
+    return os.path.join(SCHEMA_CATALOG_DIR, f"{name}_{digest}.json")
+
+def _load(db_path: str, schema_version: int) -> SchemaCatalog | None:
+    """The stored catalog if it matches the database and schema version"""
+    path = catalog_path(db_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("version") == CATALOG_VERSION and data.get("schema_version") == schema_version \
+                and data.get("db_path") == os.path.abspath(db_path):
+            return SchemaCatalog(data)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Warning: Ignoring unreadable schema catalog {path} ({str(e)})")
+    return None
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+def get_catalog(db_path: str) -> SchemaCatalog:
+    """Current catalog of a database: from memory, from disk, or introspected (and stored)"""
+    key = os.path.abspath(db_path)
+    with engine.connection(db_path) as conn:
+        version = conn.execute("PRAGMA schema_version").fetchone()[0]
+    catalog = _catalogs.get(key)
+    if catalog is not None and catalog.schema_version == version:
+        return catalog
+
+    with _catalogs_lock:
+        catalog = _catalogs.get(key)
+        if catalog is None or catalog.schema_version != version:
+            catalog = _load(db_path, version)
+            if catalog is None:
+                catalog = SchemaCatalog.introspect(db_path)
+                try:
+                    catalog.save(catalog_path(db_path))
+                except OSError as e:
+                    print(f"Warning: Could not store schema catalog ({str(e)})")
+            _catalogs[key] = catalog
+    return catalog
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage: python -m utils.schema_catalog <db_path> [--json]")
+        sys.exit(1)
+    catalog = get_catalog(sys.argv[1])
+    if "--json" in sys.argv:
+        print(json.dumps(catalog.to_dict(), indent=2))
+    else:
+        print(catalog.schema_text())
+        for name in catalog.table_names():
+            entry = catalog.tables[name]
+            indexes = ", ".join(index["name"] for index in entry["indexes"]) or "none"
+            print(f"{name}: ~{entry['row_count']:,} rows, indexes: {indexes}")
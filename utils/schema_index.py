@@ -0,0 +1,487 @@
+"""
+Local Schema Index
+Author: Mayank Goyal
+Reference: "Text-to-SQL Agents in Practice"
+
+Deterministic schema linker. Table and column names, synonyms (from
+data/schema_synonyms.json) and sampled column values are indexed once per
+schema; a question is matched against them phrase by phrase, the matched
+tables are connected through their foreign-key join tree (utils.join_graph),
+and the share of the question's content words explained by the schema is
+reported as the confidence.
+
+Names and synonyms are also embedded once (stored with the index) so that
+words without a lexical match can still be linked by embedding similarity.
+Sampled values are matched lexically only: they are proper nouns where
+embeddings add little. Words still unmatched can be looked up among all
+values of the database through a value index (utils.value_index), which
+also tolerates misspellings.
+
+Usage:
+    python -m utils.schema_index data/chinook.db "Which customers are from Brazil?"
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from dotenv import load_dotenv
+from execution import engine
+from utils import embeddings, tracing
+from utils.join_graph import JoinGraph
+from utils.schema_catalog import get_catalog
+
+load_dotenv()
+
+SCHEMA_INDEX_DIR = os.getenv("SCHEMA_INDEX_DIR", ".cache/schema_index")  # one file per database
+SCHEMA_SYNONYMS_PATH = os.getenv(
+    "SCHEMA_SYNONYMS_PATH", str(Path(__file__).resolve().parent.parent / "data" / "schema_synonyms.json")
+)
+SCHEMA_INDEX_SAMPLE_VALUES = int(os.getenv("SCHEMA_INDEX_SAMPLE_VALUES", "100"))  # per text column
+SCHEMA_INDEX_EMBEDDINGS = os.getenv("SCHEMA_INDEX_EMBEDDINGS", "true").lower() in ("1", "true", "yes")
+SCHEMA_INDEX_TERM_SIMILARITY = float(os.getenv("SCHEMA_INDEX_TERM_SIMILARITY", "0.75"))
+
+INDEX_VERSION = 1
+
+# Evidence weights; a phrase shared by several tables splits its weight between them
+TABLE_MATCH = 1.0
+SYNONYM_MATCH = 0.9
+VALUE_MATCH = 0.8
+COLUMN_MATCH = 0.7
+COLUMN_HEAD_MATCH = 0.4
+
+# Minimum similarity for a value-index hit to link a word
+VALUE_LOOKUP_SIMILARITY = 0.85
+# Longest run of unmatched words looked up as one value
+MAX_VALUE_PHRASE_LEN = 4
+# Confidence factor per matched value that is ambiguous (found in several columns)
+# or only known from sampled values (no value index to confirm where it occurs)
+UNCERTAIN_VALUE_FACTOR = 0.75
+
+# Minimum evidence for a table to be linked directly (others only join them)
+SEED_THRESHOLD = 0.5
+
+# Longest values that are indexed (longer text is descriptive, not a filter value)
+MAX_VALUE_LENGTH = 40
+
+# Words that carry no schema meaning: question words, fillers and analytic verbs
+STOPWORDS = set("""
+a an the and or of to in on at by for from with without into per as is are was were be been being
+do does did has have had having this that these those it its there their them they we our you your
+i me my what which who whom whose where when why how many much more most less least than then
+each every all any some no not only also just very both either neither between among across
+show list find get give tell return display print name named called
+count number total sum average avg mean max maximum min minimum top bottom highest lowest
+best worst first last rank ranked ranking order sorted sort group grouped distinct unique
+over under above below after before during since until within ever
+greater fewer same different other another
+""".split())
+
+_WORD = re.compile(r"[a-z0-9]+")
+_CAMEL = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+def singular(word: str) -> str:
+    """Cheap plural folding applied to questions and schema terms alike"""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("sses", "xes", "ches", "shes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+def words(text: str) -> list:
+    """Lowercased, singularized word tokens of free text"""
+    return [singular(w) for w in _WORD.findall(text.lower()) if len(w) > 1]
+
+def identifier_words(name: str) -> list:
+    """Word tokens of a CamelCase / snake_case identifier"""
+    parts = []
+    for chunk in re.split(r"[_\W]+", name):
+        parts.extend(_CAMEL.findall(chunk))
+    return [singular(p.lower()) for p in parts if p]
+
+def _is_content(word: str) -> bool:
+    return word not in STOPWORDS and not word.isdigit()
+
+class SchemaIndex:
+    """Lexical (and optionally embedding) index over one database schema"""
+
+    def __init__(self, data: dict):
+        self.fingerprint = data["fingerprint"]
+        self.tables = data["tables"]              # table -> [columns]
+        self.primary_keys = data["primary_keys"]  # table -> [columns]
+        self.foreign_keys = data["foreign_keys"]  # [{"from": "A.x", "to": "B.y"}]
+        self.values = data["values"]              # "Table.Column" -> [values]
+        self.synonyms = data["synonyms"]          # "Table" / "Table.Column" -> [phrases]
+        self.embedding_model = data.get("embedding_model")
+        self.term_embeddings = data.get("term_embeddings") or {}
+        self._word_embeddings = {}
+        self._lock = threading.Lock()
+        self.schema_fingerprint = None  # schema catalog fingerprint, set by load_or_build
+        self._build_phrases()
+        self._build_graph()
+
+    # ---------- building ----------
+
+    @staticmethod
+    def fingerprint_of(db_path: str, synonyms: dict) -> str:
+        schema = get_catalog(db_path).fingerprint
+        payload = json.dumps([INDEX_VERSION, SCHEMA_INDEX_SAMPLE_VALUES, schema, synonyms], sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @classmethod
+    def build(cls, db_path: str, synonyms: dict) -> "SchemaIndex":
+        """Tables and keys from the schema catalog, sampled values from the database"""
+        catalog = get_catalog(db_path)
+        tables = {table: catalog.columns(table) for table in sorted(catalog.table_names())}
+        primary_keys = {table: list(catalog.tables[table]["primary_key"]) for table in tables}
+        foreign_keys = [{"from": f"{t}.{c}", "to": f"{rt}.{rc}"} for t, c, rt, rc in catalog.foreign_keys()]
+        values = {}
+        with engine.connection(db_path) as conn:
+            for table in tables:
+                for info in catalog.tables[table]["columns"]:
+                    column, col_type = info["name"], info["type"].upper()
+                    if info["pk"] or not any(t in col_type for t in ("CHAR", "TEXT", "CLOB")):
+                        continue
+                    sampled = conn.execute(
+                        f'SELECT "{column}" FROM "{table}" WHERE "{column}" IS NOT NULL '
+                        f'AND length("{column}") <= ? GROUP BY "{column}" ORDER BY COUNT(*) DESC LIMIT ?',
+                        (MAX_VALUE_LENGTH, SCHEMA_INDEX_SAMPLE_VALUES)
+                    ).fetchall()
+                    if sampled:
+                        values[f"{table}.{column}"] = [str(v[0]) for v in sampled]
+
+        return cls({
+            "fingerprint": cls.fingerprint_of(db_path, synonyms),
+            "tables": tables,
+            "primary_keys": primary_keys,
+            "foreign_keys": foreign_keys,
+            "values": values,
+            "synonyms": synonyms
+        })
+
+    def _build_phrases(self):
+        """Map word tuples to the (table, column, weight, kind, value) evidence they carry"""
+        phrases = {}
+
+        def add(tokens, table, column, weight, kind, value=None):
+            tokens = tuple(tokens)
+            if not tokens or not any(_is_content(t) for t in tokens):
+                return
+            owners = phrases.setdefault(tokens, [])
+            if not any(o[0] == table and o[1] == column and o[3] == kind for o in owners):
+                owners.append((table, column, weight, kind, value))
+
+        for table, columns in self.tables.items():
+            tokens = identifier_words(table)
+            add(tokens, table, None, TABLE_MATCH, "table")
+            if len(tokens) > 1:
+                add(("".join(tokens),), table, None, TABLE_MATCH, "table")
+            for column in columns:
+                tokens = identifier_words(column)
+                add(tokens, table, column, COLUMN_MATCH, "column")
+                if len(tokens) > 1:
+                    add(("".join(tokens),), table, column, COLUMN_MATCH, "column")
+                    if tokens[-1] != "id":
+                        add(tokens[-1:], table, column, COLUMN_HEAD_MATCH, "column")
+
+        for target, synonyms in self.synonyms.items():
+            table, _, column = target.partition(".")
+            if table not in self.tables or (column and column not in self.tables[table]):
+                continue
+            for synonym in synonyms:
+                add(words(synonym), table, column or None, SYNONYM_MATCH, "synonym")
+
+        # Schema terms (embedded for similarity matching) exclude values
+        self.terms = {" ".join(tokens): owners for tokens, owners in phrases.items()}
+
+        for target, sampled in self.values.items():
+            table, column = target.split(".", 1)
+            for value in sampled:
+                tokens = words(value)
+                if len(tokens) == 1 and len(tokens[0]) < 3:
+                    continue
+                add(tokens, table, column, VALUE_MATCH, "value", value)
+
+        self.phrases = phrases
+        self.max_phrase_len = max((len(p) for p in phrases), default=1)
+
+    def _build_graph(self):
+        """Precomputed FK join paths between the indexed tables"""
+        self.join_graph = JoinGraph(list(self.tables), self.foreign_keys)
+
+    # ---------- embeddings ----------
+
+    def ensure_term_embeddings(self) -> bool:
+        """Embed every schema term once; returns False if the provider is unavailable"""
+        model = embeddings.embedding_model()
+        if self.embedding_model == model and self.term_embeddings:
+            return True
+        terms = sorted(self.terms)
+        # Probe with one term so an unreachable provider costs a single warning
+        probe = embeddings.embed(terms[0]) if terms else None
+        if probe is None:
+            return False
+        vectors = [probe] + embeddings.embed_many(terms[1:])
+        self.term_embeddings = {term: vec for term, vec in zip(terms, vectors) if vec is not None}
+        self.embedding_model = model
+        return bool(self.term_embeddings)
+
+    def _word_embedding(self, word: str):
+        with self._lock:
+            if word in self._word_embeddings:
+                return self._word_embeddings[word]
+        vector = embeddings.embed(word)
+        with self._lock:
+            if len(self._word_embeddings) >= 4096:
+                self._word_embeddings.clear()
+            self._word_embeddings[word] = vector
+        return vector
+
+    def _nearest_term(self, word: str):
+        """(term, similarity) of the closest embedded schema term"""
+        vector = self._word_embedding(word)
+        if vector is None:
+            return None, 0.0
+        best, best_sim = None, 0.0
+        for term, term_vector in self.term_embeddings.items():
+            sim = embeddings.cosine_similarity(vector, term_vector)
+            if sim > best_sim:
+                best, best_sim = term, sim
+        return best, best_sim
+
+    # ---------- linking ----------
+
+    def link(self, question: str, use_embeddings: bool = SCHEMA_INDEX_EMBEDDINGS, value_index=None) -> dict:
+        """
+        Link a question to the schema; value_index (utils.value_index.ValueIndex)
+        resolves words that match no name, synonym or sampled value, and finds
+        every column holding a matched sampled value. Tables holding a matched
+        value are always linked; ambiguous or unconfirmed values lower the
+        confidence.
+
+        Returns {"schema_context": {...}, "confidence": float, "seeds": [...]} where
+        schema_context uses the tables/columns/relationships shape of the LLM linker.
+        """
+        tokens = words(question)
+        content = [i for i, t in enumerate(tokens) if _is_content(t)]
+        covered = set()
+        scores = {}
+        matched_columns = {}
+        matched_values = {}
+        value_tables = set()
+        uncertain_values = 0
+
+        def credit(owners, scale=1.0):
+            owner_tables = {o[0] for o in owners}
+            for table, column, weight, kind, value in owners:
+                scores[table] = scores.get(table, 0.0) + weight * scale / len(owner_tables)
+                if column:
+                    matched_columns.setdefault(table, set()).add(column)
+                if kind == "value":
+                    found = matched_values.setdefault(f"{table}.{column}", [])
+                    if value not in found:
+                        found.append(value)
+
+        def widen(owners):
+            """Sampled-value evidence plus every indexed column holding the same value"""
+            widened = list(owners)
+            for value in dict.fromkeys(o[4] for o in owners):
+                for m in value_index.lookup(value, limit=10, min_similarity=1.0):
+                    if m["table"] in self.tables and not any(o[:2] == (m["table"], m["column"]) for o in widened):
+                        widened.append((m["table"], m["column"], VALUE_MATCH, "value", m["value"]))
+            return widened
+
+        def note_values(owners, confirmed):
+            nonlocal uncertain_values
+            value_tables.update(o[0] for o in owners)
+            if not confirmed or len({o[:2] for o in owners}) > 1:
+                uncertain_values += 1
+
+        # Greedy longest-phrase matching over the question
+        i = 0
+        while i < len(tokens):
+            for length in range(min(self.max_phrase_len, len(tokens) - i), 0, -1):
+                owners = self.phrases.get(tuple(tokens[i:i + length]))
+                if owners:
+                    if all(o[3] == "value" for o in owners):
+                        if value_index is not None:
+                            owners = widen(owners)
+                        note_values(owners, confirmed=value_index is not None)
+                    credit(owners)
+                    covered.update(range(i, i + length))
+                    i += length
+                    break
+            else:
+                i += 1
+
+        # Words without a lexical match: any database value, fuzzily
+        if value_index is not None:
+            i = 0
+            while i < len(tokens):
+                run = 0
+                while i + run < len(tokens) and i + run not in covered and run < MAX_VALUE_PHRASE_LEN:
+                    run += 1
+                for length in range(run, 0, -1):
+                    if not _is_content(tokens[i]) or not _is_content(tokens[i + length - 1]):
+                        continue
+                    matches = value_index.lookup(
+                        " ".join(tokens[i:i + length]), limit=3, min_similarity=VALUE_LOOKUP_SIMILARITY
+                    )
+                    if matches:
+                        best = matches[0]["similarity"]
+                        owners = [
+                            (m["table"], m["column"], VALUE_MATCH, "value", m["value"])
+                            for m in matches if m["similarity"] == best and m["table"] in self.tables
+                        ]
+                        if owners:
+                            note_values(owners, confirmed=True)
+                            credit(owners, scale=best)
+                        covered.update(range(i, i + length))
+                        i += length - 1
+                        break
+                i += 1
+
+        # Words still without a match: nearest embedded schema term
+        uncovered = [i for i in content if i not in covered]
+        if uncovered and use_embeddings and self.term_embeddings:
+            for i in uncovered:
+                term, sim = self._nearest_term(tokens[i])
+                if term is not None and sim >= SCHEMA_INDEX_TERM_SIMILARITY:
+                    credit(self.terms[term], scale=sim)
+                    covered.add(i)
+
+        confidence = len([i for i in content if i in covered]) / len(content) if content else 0.0
+        confidence *= UNCERTAIN_VALUE_FACTOR ** uncertain_values
+        seeds = [
+            t for t, s in sorted(scores.items(), key=lambda kv: -kv[1])
+            if s >= SEED_THRESHOLD or t in value_tables
+        ]
+        if not seeds:
+            confidence = 0.0
+
+        tables, relationships = self._connect(seeds)
+        columns = {}
+        for table in tables:
+            if table in seeds:
+                columns[table] = list(self.tables[table])
+            else:
+                # Bridge tables only need their keys
+                keys = list(self.primary_keys.get(table, []))
+                for fk in relationships:
+                    for ref in (fk["from"], fk["to"]):
+                        t, c = ref.split(".", 1)
+                        if t == table and c not in keys:
+                            keys.append(c)
+                keys += [c for c in sorted(matched_columns.get(table, ())) if c not in keys]
+                columns[table] = keys
+
+        schema_context = {"tables": tables, "columns": columns, "relationships": relationships}
+        matched_values = {k: v for k, v in matched_values.items() if k.split(".", 1)[0] in columns}
+        if matched_values:
+            schema_context["matched_values"] = matched_values
+        return {
+            "schema_context": schema_context,
+            "confidence": round(confidence, 3),
+            "seeds": seeds,
+            "scores": {t: round(s, 3) for t, s in scores.items()}
+        }
+
+    def _connect(self, seeds: list) -> tuple:
+        """Seeds plus the bridge tables of their connecting FK tree, and the tree's relationships"""
+        if not seeds:
+            return [], []
+        tree = self.join_graph.connect(seeds)
+        return tree["tables"], tree["relationships"]
+
+    # ---------- persistence ----------
+
+    def to_dict(self) -> dict:
+        return {
+            "version": INDEX_VERSION,
+            "fingerprint": self.fingerprint,
+            "tables": self.tables,
+            "primary_keys": self.primary_keys,
+            "foreign_keys": self.foreign_keys,
+            "values": self.values,
+            "synonyms": self.synonyms,
+            "embedding_model": self.embedding_model,
+            "term_embeddings": self.term_embeddings
+        }
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp, path)
+
+def index_path(db_path: str) -> str:
+    """On-disk location of a database's schema index"""
+    digest = hashlib.sha1(os.path.abspath(db_path).encode()).hexdigest()[:16]
+    name = os.path.splitext(os.path.basename(db_path))[0]
+    return os.path.join(SCHEMA_INDEX_DIR, f"{name}_{digest}.json")
+
+def load_synonyms(path: str = SCHEMA_SYNONYMS_PATH) -> dict:
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def load_or_build(db_path: str, path: str | None = None) -> SchemaIndex:
+    """The stored index if it matches the current schema, else a freshly built (and stored) one"""
+    path = path or index_path(db_path)
+    synonyms = load_synonyms()
+    fingerprint = SchemaIndex.fingerprint_of(db_path, synonyms)
+    index = None
+    if os.path.exists(path):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION and data.get("fingerprint") == fingerprint:
+                index = SchemaIndex(data)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Warning: Ignoring unreadable schema index {path} ({str(e)})")
+
+    dirty = index is None
+    if index is None:
+        with tracing.span("schema_index_build"):
+            index = SchemaIndex.build(db_path, synonyms)
+    if SCHEMA_INDEX_EMBEDDINGS and index.embedding_model != embeddings.embedding_model():
+        dirty = index.ensure_term_embeddings() or dirty
+    if dirty:
+        try:
+            index.save(path)
+        except OSError as e:
+            print(f"Warning: Could not store schema index ({str(e)})")
+    index.schema_fingerprint = get_catalog(db_path).fingerprint
+    return index
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_schema_index(db_path: str) -> SchemaIndex:
+    """Process-wide index per database, loaded on first use and rebuilt when the schema changes"""
+    key = os.path.abspath(db_path)
+    fingerprint = get_catalog(db_path).fingerprint
+    index = _indexes.get(key)
+    if index is None or index.schema_fingerprint != fingerprint:
+        with _indexes_lock:
+            index = _indexes.get(key)
+            if index is None or index.schema_fingerprint != fingerprint:
+                index = _indexes[key] = load_or_build(db_path)
+    return index
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 3:
+        print('Usage: python -m utils.schema_index <db_path> "<question>"')
+        sys.exit(1)
+    from utils.value_index import get_value_index
+
+    result = get_schema_index(sys.argv[1]).link(sys.argv[2], value_index=get_value_index(sys.argv[1]))
+    print(json.dumps(result, indent=2))
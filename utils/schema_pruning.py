@@ -0,0 +1,281 @@
+"""
+Schema Pruning
+Author: Mayank Goyal
+Reference: "Text-to-SQL Agents in Practice"
+
+Relevance-ranked, token-budgeted schema text for the LLM schema linker.
+Tables and columns are scored against the question. The lexical score
+covers names, synonyms (data/schema_synonyms.json) and column names. When
+embeddings are enabled, it is blended with the cosine similarity between
+the question and each table's and column's description ("name: synonyms,
+columns"). Description embeddings are computed once per schema version and
+embedding model, and stored under SCHEMA_PRUNE_CACHE_DIR.
+
+The top-k tables are rendered first, then their foreign-key neighbors, so
+join paths stay visible. Rendering stops at the token budget. Within a
+table, key columns come first and low-scoring columns are cut first. A
+schema that already fits the budget is returned whole.
+
+Usage:
+    python -m utils.schema_pruning data/chinook.db "Top 5 artists by revenue" [--budget 300]
+"""
+
+import hashlib
+import json
+import os
+import threading
+from dotenv import load_dotenv
+from utils import embeddings, tracing
+from utils.schema_catalog import get_catalog
+from utils.schema_index import STOPWORDS, identifier_words, load_synonyms, words
+from utils.tokens import estimate_tokens
+
+load_dotenv()
+
+SCHEMA_PRUNING_ENABLED = os.getenv("SCHEMA_PRUNING_ENABLED", "true").lower() in ("1", "true", "yes")
+SCHEMA_PRUNE_TOKEN_BUDGET = int(os.getenv("SCHEMA_PRUNE_TOKEN_BUDGET", "1500"))  # schema tokens in the linker prompt
+SCHEMA_PRUNE_TOP_K = int(os.getenv("SCHEMA_PRUNE_TOP_K", "8"))                   # tables ranked before FK neighbors
+SCHEMA_PRUNE_EMBEDDINGS = os.getenv("SCHEMA_PRUNE_EMBEDDINGS", "true").lower() in ("1", "true", "yes")
+SCHEMA_PRUNE_CACHE_DIR = os.getenv("SCHEMA_PRUNE_CACHE_DIR", ".cache/schema_pruning")
+
+CACHE_VERSION = 1
+
+# Score = LEXICAL_WEIGHT * lexical + EMBEDDING_WEIGHT * embedding (lexical only without embeddings)
+LEXICAL_WEIGHT = 0.6
+EMBEDDING_WEIGHT = 0.4
+# A question word matching a column counts this much towards its table
+COLUMN_EVIDENCE = 0.5
+
+def _terms(text: str) -> set:
+    return set(words(text))
+
+class SchemaRanker:
+    """Scores the tables and columns of one schema version against questions"""
+
+    def __init__(self, db_path: str):
+        self.catalog = get_catalog(db_path)
+        self.fingerprint = self.catalog.fingerprint
+        synonyms = load_synonyms()
+        self.synonyms = {key.lower(): phrases for key, phrases in synonyms.items()}
+
+        catalog = self.catalog
+        self.table_terms, self.column_terms, self.descriptions = {}, {}, {}
+        self.neighbors = {name: set() for name in catalog.tables}
+        for table, _, ref_table, _ in catalog.foreign_keys():
+            if ref_table in self.neighbors and ref_table != table:
+                self.neighbors[table].add(ref_table)
+                self.neighbors[ref_table].add(table)
+        for table in catalog.table_names(include_views=True):
+            table_synonyms = self.synonyms.get(table.lower(), [])
+            name_words = identifier_words(table)
+            self.table_terms[table] = set(name_words) | set().union(*map(_terms, table_synonyms))
+            columns = catalog.columns(table)
+            self.descriptions[table] = (
+                f"{' '.join(name_words)}: {', '.join(table_synonyms)}; columns: "
+                + ", ".join(" ".join(identifier_words(c)) for c in columns)
+            )
+            for column in columns:
+                column_synonyms = self.synonyms.get(f"{table}.{column}".lower(), [])
+                self.column_terms[(table, column)] = set(identifier_words(column)) \
+                    | set().union(*map(_terms, column_synonyms))
+                self.descriptions[(table, column)] = (
+                    f"{' '.join(identifier_words(table))} {' '.join(identifier_words(column))}"
+                    + (f": {', '.join(column_synonyms)}" if column_synonyms else "")
+                )
+        self.vectors = None
+        self._lock = threading.Lock()
+
+    # ---------- description embeddings ----------
+
+    def cache_path(self) -> str:
+        stem = os.path.splitext(os.path.basename(self.catalog.db_path))[0]
+        digest = hashlib.sha1(self.catalog.db_path.encode()).hexdigest()[:16]
+        return os.path.join(SCHEMA_PRUNE_CACHE_DIR, f"{stem}_{digest}.json")
+
+    def _cache_key(self) -> str:
+        payload = json.dumps([CACHE_VERSION, self.fingerprint, embeddings.embedding_model(), self.synonyms],
+                             sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def ensure_vectors(self) -> bool:
+        """Load or compute (and store) the description embeddings; False if unavailable"""
+        if self.vectors is not None:
+            return bool(self.vectors)
+        with self._lock:
+            if self.vectors is not None:
+                return bool(self.vectors)
+            key, path = self._cache_key(), self.cache_path()
+            if os.path.exists(path):
+                try:
+                    with open(path) as f:
+                        data = json.load(f)
+                    if data.get("key") == key:
+                        self.vectors = {self._decode(k): v for k, v in data["vectors"].items()}
+                        return True
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Warning: Ignoring unreadable schema embeddings {path} ({str(e)})")
+
+            items = list(self.descriptions.items())
+            # Probe with one description so an unreachable provider costs a single warning
+            probe = embeddings.embed(items[0][1]) if items else None
+            if probe is None:
+                self.vectors = {}
+                return False
+            with tracing.span("schema_embeddings_build") as span:
+                vectors = [probe] + embeddings.embed_many([text for _, text in items[1:]])
+                self.vectors = {k: v for (k, _), v in zip(items, vectors) if v is not None}
+                span.set("descriptions", len(self.vectors))
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                tmp = f"{path}.{os.getpid()}.tmp"
+                with open(tmp, "w") as f:
+                    json.dump({
+                        "key": key,
+                        "vectors": {self._encode(k): [round(x, 5) for x in v] for k, v in self.vectors.items()}
+                    }, f)
+                os.replace(tmp, path)
+            except OSError as e:
+                print(f"Warning: Could not store schema embeddings ({str(e)})")
+            return True
+
+    @staticmethod
+    def _encode(key) -> str:
+        return "\t".join(key) if isinstance(key, tuple) else key
+
+    @staticmethod
+    def _decode(key: str):
+        return tuple(key.split("\t")) if "\t" in key else key
+
+    # ---------- scoring ----------
+
+    def score(self, question: str, use_embeddings: bool = SCHEMA_PRUNE_EMBEDDINGS) -> tuple:
+        """({table: score}, {(table, column): score}), scores in [0, 1]"""
+        question_terms = {w for w in words(question) if w not in STOPWORDS and not w.isdigit()}
+        question_vector = None
+        if use_embeddings and self.ensure_vectors():
+            question_vector = embeddings.embed(question)
+
+        def blend(lexical, key):
+            if question_vector is None or key not in self.vectors:
+                return lexical
+            similarity = max(0.0, embeddings.cosine_similarity(question_vector, self.vectors[key]))
+            return LEXICAL_WEIGHT * lexical + EMBEDDING_WEIGHT * similarity
+
+        table_scores, column_scores = {}, {}
+        denominator = max(len(question_terms), 1)
+        for table, terms in self.table_terms.items():
+            column_hits = set()
+            for column in self.catalog.columns(table):
+                hits = question_terms & self.column_terms[(table, column)]
+                column_hits |= hits
+                column_scores[(table, column)] = blend(1.0 if hits else 0.0, (table, column))
+            lexical = min(1.0, (len(question_terms & terms) + COLUMN_EVIDENCE * len(column_hits - terms)) / denominator)
+            table_scores[table] = blend(lexical, table)
+        return table_scores, column_scores
+
+    # ---------- rendering ----------
+
+    def render(self, question: str, budget_tokens: int = SCHEMA_PRUNE_TOKEN_BUDGET,
+               top_k: int = SCHEMA_PRUNE_TOP_K) -> dict:
+        """
+        {"text", "tables", "total_tables", "tokens", "pruned"}: the schema text
+        for the question within budget_tokens
+        """
+        catalog = self.catalog
+        full = catalog.schema_text()
+        all_tables = catalog.table_names()
+        if not budget_tokens or estimate_tokens(full) <= budget_tokens:
+            return {"text": full, "tables": all_tables, "total_tables": len(all_tables),
+                    "tokens": estimate_tokens(full), "pruned": False}
+
+        table_scores, column_scores = self.score(question)
+        ranked = sorted(all_tables, key=lambda t: (-table_scores.get(t, 0.0), t))
+        top = [t for t in ranked[:top_k] if table_scores.get(t, 0.0) > 0] or ranked[:top_k]
+        neighbors = sorted(
+            {n for t in top for n in self.neighbors.get(t, ()) if n not in top and n in table_scores},
+            key=lambda t: (-table_scores.get(t, 0.0), t)
+        )
+
+        footer = f"({len(all_tables)} of {len(all_tables)} tables shown, ranked by relevance to the question)"
+        lines, kept = [catalog.title(), "", "Tables:", ""], []
+        used = estimate_tokens("\n".join(lines)) + estimate_tokens(footer) + 1
+        for table in top + neighbors:
+            block = self._table_block(table, column_scores, budget_tokens - used)
+            if block is None:
+                break
+            lines += block + [""]
+            used += estimate_tokens("\n".join(block)) + 1
+            kept.append(table)
+        if len(kept) < len(all_tables):
+            lines.append(f"({len(kept)} of {len(all_tables)} tables shown, ranked by relevance to the question)")
+        text = "\n".join(lines) + "\n"
+        return {"text": text, "tables": kept, "total_tables": len(all_tables),
+                "tokens": estimate_tokens(text), "pruned": True}
+
+    def _table_block(self, table: str, column_scores: dict, remaining: int) -> list | None:
+        """
+        The table's lines within remaining tokens: whole, or its key columns
+        plus as many of the best scoring others as fit; None if the keys do not fit
+        """
+        block = self.catalog.table_lines(table)
+        if estimate_tokens("\n".join(block)) <= remaining:
+            return block
+
+        entry = self.catalog.tables[table]
+        fk_columns = {c for fk in entry["foreign_keys"] for c in fk["columns"]}
+        keys = [c["name"] for c in entry["columns"] if c["pk"] or c["name"] in fk_columns]
+        others = sorted((c for c in self.catalog.columns(table) if c not in keys),
+                        key=lambda c: -column_scores.get((table, c), 0.0))
+        best = None
+        for shown in range(len(others) + 1):
+            lines = self.catalog.table_lines(table, keys + others[:shown])
+            lines.append(f"  - ... ({len(others) - shown} more columns)")
+            if estimate_tokens("\n".join(lines)) > remaining:
+                break
+            best = lines
+        return best
+
+_rankers = {}
+_rankers_lock = threading.Lock()
+
+def get_ranker(db_path: str) -> SchemaRanker:
+    """Process-wide ranker per database, rebuilt when the schema changes"""
+    key = os.path.abspath(db_path)
+    fingerprint = get_catalog(db_path).fingerprint
+    ranker = _rankers.get(key)
+    if ranker is None or ranker.fingerprint != fingerprint:
+        with _rankers_lock:
+            ranker = _rankers.get(key)
+            if ranker is None or ranker.fingerprint != fingerprint:
+                ranker = _rankers[key] = SchemaRanker(db_path)
+    return ranker
+
+def prune_schema(db_path: str, question: str, budget_tokens: int = SCHEMA_PRUNE_TOKEN_BUDGET,
+                 top_k: int = SCHEMA_PRUNE_TOP_K) -> str:
+    """Schema text for the question, most relevant tables first, within budget_tokens"""
+    with tracing.span("schema_pruning") as span:
+        rendered = get_ranker(db_path).render(question, budget_tokens, top_k)
+        span.set("tables", len(rendered["tables"]))
+        span.set("total_tables", rendered["total_tables"])
+        span.set("tokens", rendered["tokens"])
+    return rendered["text"]
+
+if __name__ == "__main__":
+    import sys
+
+    args = sys.argv[1:]
+    budget = SCHEMA_PRUNE_TOKEN_BUDGET
+    if "--budget" in args:
+        position = args.index("--budget")
+        budget = int(args[position + 1])
+        del args[position:position + 2]
+    if len(args) < 2:
+        print('Usage: python -m utils.schema_pruning <db_path> "<question>" [--budget <tokens>]')
+        sys.exit(1)
+    ranker = get_ranker(args[0])
+    table_scores, _ = ranker.score(args[1])
+    for table, value in sorted(table_scores.items(), key=lambda item: -item[1])[:SCHEMA_PRUNE_TOP_K]:
+        print(f"  {value:.3f}  {table}")
+    rendered = ranker.render(args[1], budget)
+    print(f"\n{len(rendered['tables'])} of {rendered['total_tables']} tables, ~{rendered['tokens']} tokens\n")
+    print(rendered["text"])
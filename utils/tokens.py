@@ -0,0 +1,19 @@
+"""
+Token Estimation
+Author: Mayank Goyal
+Reference: "Text-to-SQL Agents in Practice"
+
+Provider-agnostic token estimate used for tracing and prompt budgeting when
+the provider does not report exact counts.
+"""
+
+import math
+
+# Average characters per token for English text and SQL/JSON with BPE tokenizers
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str | None) -> int:
+    """Approximate number of tokens in text"""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
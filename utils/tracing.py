@@ -0,0 +1,292 @@
+"""
+Pipeline Tracing
+Author: Mayank Goyal
+Reference: "Text-to-SQL Agents in Practice"
+
+Timed spans for agent, LLM, embedding and SQL execution calls. Spans opened
+while a question is being answered are collected into a trace that is exported
+as JSON (one file per question); every finished span also feeds the per-stage
+latency histograms (p50/p95/p99).
+
+Spans follow contextvars, so they nest correctly across asyncio tasks and
+asyncio.to_thread calls.
+
+Usage:
+    python -m utils.tracing              # per-stage summary of exported traces
+    python -m utils.tracing logs/traces  # same, for another trace directory
+"""
+
+import asyncio
+import contextvars
+import functools
+import itertools
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Tracing configuration
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() in ("1", "true", "yes")
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "true").lower() in ("1", "true", "yes")
+TRACE_DIR = os.getenv("TRACE_DIR", "logs/traces")
+
+# Samples kept per stage for the in-process histograms
+HISTOGRAM_SAMPLES = int(os.getenv("TRACE_HISTOGRAM_SAMPLES", "10000"))
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+_span_ids = itertools.count(1)
+
+class Span:
+    """One timed operation; attrs hold token counts, cache hits, retries, etc."""
+
+    __slots__ = ("id", "parent_id", "name", "attrs", "start", "duration_ms", "error")
+
+    def __init__(self, name: str, parent_id: int | None, attrs: dict):
+        self.id = next(_span_ids)
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs
+        self.start = time.time()
+        self.duration_ms = None
+        self.error = None
+
+    def set(self, key: str, value):
+        self.attrs[key] = value
+
+    def incr(self, key: str, amount: int = 1):
+        self.attrs[key] = self.attrs.get(key, 0) + amount
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": self.duration_ms,
+            "error": self.error,
+            "attrs": self.attrs
+        }
+
+class Trace:
+    """All spans and counters recorded while answering one question"""
+
+    def __init__(self, question: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.question = question
+        self.start = time.time()
+        self.duration_ms = None
+        self.spans = []
+        self.counters = {}
+        self.attrs = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def incr(self, counter: str, amount: int = 1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def set(self, key: str, value):
+        self.attrs[key] = value
+
+    def stage_totals(self) -> dict:
+        """Total milliseconds and call count per span name"""
+        totals = {}
+        for span in self.spans:
+            entry = totals.setdefault(span.name, {"count": 0, "total_ms": 0.0})
+            entry["count"] += 1
+            entry["total_ms"] += span.duration_ms or 0.0
+        return totals
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.id,
+            "question": self.question,
+            "start": self.start,
+            "duration_ms": self.duration_ms,
+            "attrs": self.attrs,
+            "counters": self.counters,
+            "stages": self.stage_totals(),
+            "spans": [span.to_dict() for span in self.spans]
+        }
+
+class StageHistograms:
+    """Bounded latency samples per stage with percentile summaries"""
+
+    def __init__(self, max_samples: int = HISTOGRAM_SAMPLES):
+        self.max_samples = max_samples
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, duration_ms: float):
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self.max_samples)
+            samples.append(duration_ms)
+
+    def summary(self) -> dict:
+        with self._lock:
+            snapshot = {stage: list(samples) for stage, samples in self._samples.items()}
+        return {stage: summarize(samples) for stage, samples in sorted(snapshot.items())}
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, min(len(sorted_values), math.ceil(pct / 100 * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+def summarize(durations: list) -> dict:
+    values = sorted(durations)
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values), 2) if values else 0.0,
+        "p50_ms": round(percentile(values, 50), 2),
+        "p95_ms": round(percentile(values, 95), 2),
+        "p99_ms": round(percentile(values, 99), 2),
+        "max_ms": round(values[-1], 2) if values else 0.0
+    }
+
+histograms = StageHistograms()
+
+def current_trace() -> Trace | None:
+    return _current_trace.get()
+
+def current_span() -> Span | None:
+    return _current_span.get()
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time a block as a span of the current trace (a no-op span if tracing is disabled)"""
+    parent = _current_span.get()
+    s = Span(name, parent.id if parent else None, attrs)
+    if not TRACING_ENABLED:
+        yield s
+        return
+    token = _current_span.set(s)
+    started = time.perf_counter()
+    try:
+        yield s
+    except BaseException as e:
+        s.error = f"{type(e).__name__}: {str(e)}"[:500]
+        raise
+    finally:
+        s.duration_ms = round((time.perf_counter() - started) * 1000, 3)
+        _current_span.reset(token)
+        histograms.record(name, s.duration_ms)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_span(s)
+
+def traced(name: str):
+    """Decorator wrapping every call of a sync or async function in a span"""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def run_in_context(func):
+    """Wrap func so calls made from worker threads see the caller's trace and span"""
+    context = contextvars.copy_context()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        # A context can only be entered by one thread at a time: run each call in a copy
+        return context.copy().run(func, *args, **kwargs)
+    return wrapper
+
+def set_attr(key: str, value):
+    """Set an attribute on the innermost open span, if any"""
+    s = _current_span.get()
+    if s is not None:
+        s.set(key, value)
+
+def incr(counter: str, amount: int = 1):
+    """Increment a counter on the current trace (e.g. retries), if any"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.incr(counter, amount)
+
+@contextmanager
+def trace_question(question: str):
+    """Collect every span opened inside the block into one trace and export it"""
+    trace = Trace(question)
+    token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    started = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        trace.duration_ms = round((time.perf_counter() - started) * 1000, 3)
+        _current_span.reset(span_token)
+        _current_trace.reset(token)
+        if TRACING_ENABLED:
+            histograms.record("pipeline", trace.duration_ms)
+            if TRACE_EXPORT:
+                export_trace(trace)
+
+def export_trace(trace: Trace, trace_dir: str = TRACE_DIR) -> str:
+    """Write a trace as JSON; returns the file path"""
+    os.makedirs(trace_dir, exist_ok=True)
+    stamp = datetime.fromtimestamp(trace.start).strftime("%Y%m%d_%H%M%S")
+    path = os.path.join(trace_dir, f"trace_{stamp}_{trace.id}.json")
+    with open(path, "w") as f:
+        json.dump(trace.to_dict(), f, indent=2, default=str)
+    return path
+
+def summarize_traces(trace_dir: str = TRACE_DIR) -> dict:
+    """Per-stage histograms aggregated from every exported trace in trace_dir"""
+    durations = {}
+    for filename in sorted(os.listdir(trace_dir)):
+        if not (filename.startswith("trace_") and filename.endswith(".json")):
+            continue
+        with open(os.path.join(trace_dir, filename)) as f:
+            trace = json.load(f)
+        durations.setdefault("pipeline", []).append(trace.get("duration_ms") or 0.0)
+        for s in trace.get("spans", []):
+            durations.setdefault(s["name"], []).append(s.get("duration_ms") or 0.0)
+    return {stage: summarize(values) for stage, values in sorted(durations.items())}
+
+def format_summary(summary: dict) -> str:
+    lines = [f"{'stage':<28}{'count':>7}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'max ms':>11}"]
+    for stage, stats in summary.items():
+        lines.append(
+            f"{stage:<28}{stats['count']:>7}{stats['p50_ms']:>11.1f}"
+            f"{stats['p95_ms']:>11.1f}{stats['p99_ms']:>11.1f}{stats['max_ms']:>11.1f}"
+        )
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    import sys
+
+    directory = sys.argv[1] if len(sys.argv) > 1 else TRACE_DIR
+    if not os.path.isdir(directory):
+        print(f"No traces found in {directory}")
+    else:
+        print(format_summary(summarize_traces(directory)))
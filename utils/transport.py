@@ -0,0 +1,119 @@
+"""
+Provider Transport Layer
+Author: Mayank Goyal
+Reference: "Text-to-SQL Agents in Practice"
+
+Shared HTTP sessions for LLM and embedding providers. Each endpoint
+(scheme + host) gets one keep-alive session with its own connection pool,
+so repeated agent calls reuse TCP/TLS connections instead of reconnecting.
+The async clients (httpx) follow the same pooling rules, one set per event loop.
+requests and httpx are imported on the first call, not at import time.
+"""
+
+import asyncio
+import atexit
+import os
+import threading
+import weakref
+from urllib.parse import urlsplit
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Connection pool configuration
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "4"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "16"))
+
+# Timeouts in seconds: connect is the TCP/TLS setup, read is the max gap between bytes
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "300"))
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+# event loop -> {(endpoint, verify): httpx.AsyncClient}
+_async_clients = weakref.WeakKeyDictionary()
+
+def endpoint_key(url: str) -> str:
+    """Return the pool key (scheme://host:port) for a URL"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+def get_session(url: str) -> "requests.Session":
+    """Return the pooled keep-alive session for the endpoint serving url"""
+    key = endpoint_key(url)
+    session = _sessions.get(key)
+    if session is not None:
+        return session
+
+    import requests
+    import urllib3
+    from requests.adapters import HTTPAdapter
+    #Disable insecure request warnings for OpenAI calls
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=HTTP_POOL_CONNECTIONS,
+                pool_maxsize=HTTP_POOL_MAXSIZE
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[key] = session
+    return session
+
+def default_timeout() -> tuple:
+    return (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+def post(url: str, **kwargs) -> "requests.Response":
+    """POST through the endpoint's pooled session, applying default timeouts"""
+    kwargs.setdefault("timeout", default_timeout())
+    return get_session(url).post(url, **kwargs)
+
+def close_sessions():
+    """Close every pooled session (called automatically at exit)"""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+atexit.register(close_sessions)
+
+def get_async_client(url: str, verify: bool = True):
+    """Return the pooled httpx.AsyncClient for url on the running event loop"""
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.setdefault(loop, {})
+    key = (endpoint_key(url), verify)
+    client = clients.get(key)
+    if client is None:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=HTTP_POOL_MAXSIZE,
+                max_keepalive_connections=HTTP_POOL_MAXSIZE
+            ),
+            # pool=None: requests beyond the pool size queue instead of failing
+            timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT, pool=None),
+            verify=verify
+        )
+        clients[key] = client
+    return client
+
+async def post_async(url: str, verify: bool = True, **kwargs):
+    """Async POST through the endpoint's pooled client (same kwargs as post)"""
+    return await get_async_client(url, verify).post(url, **kwargs)
+
+def stream_async(url: str, verify: bool = True, **kwargs):
+    """Async streaming POST; use as `async with stream_async(...) as resp`"""
+    return get_async_client(url, verify).stream("POST", url, **kwargs)
+
+async def close_async_clients():
+    """Close the async clients owned by the running event loop"""
+    clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.aclose()
@@ -0,0 +1,294 @@
+"""
+Database Value Index
+Author: Mayank Goyal
+Reference: "Text-to-SQL Agents in Practice"
+
+Persistent index of the distinct values of low/moderate-cardinality text
+columns (genre names, countries, artist names, ...) in an FTS5 trigram table,
+so literals can be matched exactly or fuzzily (misspellings, wrong case)
+without scanning the database.
+
+Each database gets its own index file under VALUE_INDEX_DIR (named after the
+database file and a hash of its path). It is refreshed incrementally: when
+the database file changes, only tables whose row count or max rowid changed
+are re-indexed.
+
+Usage:
+    python -m utils.value_index data/chinook.db Brasil
+"""
+
+import difflib
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from dotenv import load_dotenv
+from utils import tracing
+
+load_dotenv()
+
+VALUE_INDEX_ENABLED = os.getenv("VALUE_INDEX_ENABLED", "true").lower() in ("1", "true", "yes")
+VALUE_INDEX_DIR = os.getenv("VALUE_INDEX_DIR", ".cache/value_index")
+VALUE_INDEX_MAX_DISTINCT = int(os.getenv("VALUE_INDEX_MAX_DISTINCT", "2000"))  # per column
+VALUE_INDEX_MAX_LENGTH = int(os.getenv("VALUE_INDEX_MAX_LENGTH", "80"))       # longer values are skipped
+
+# Seconds between checks of the database file for changes
+REFRESH_CHECK_INTERVAL = 1.0
+
+# FTS5 trigram matching needs at least three characters
+MIN_LOOKUP_LENGTH = 3
+
+# Candidates fetched by trigram overlap before re-ranking by string similarity
+FTS_CANDIDATES = 50
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS indexed_tables (table_name TEXT PRIMARY KEY, signature TEXT);
+CREATE TABLE IF NOT EXISTS indexed_columns (
+    table_name TEXT, column_name TEXT, distinct_count INTEGER, PRIMARY KEY (table_name, column_name)
+);
+CREATE TABLE IF NOT EXISTS value_rows (
+    table_name TEXT, column_name TEXT, value TEXT, PRIMARY KEY (table_name, column_name, value)
+) WITHOUT ROWID;
+CREATE VIRTUAL TABLE IF NOT EXISTS value_fts USING fts5(
+    value, table_name UNINDEXED, column_name UNINDEXED, tokenize='trigram'
+);
+"""
+
+def similarity(a: str, b: str) -> float:
+    """Case-insensitive similarity; a whole-word occurrence of a in b scores at least 0.9"""
+    a, b = a.lower(), b.lower()
+    if a == b:
+        return 1.0
+    score = difflib.SequenceMatcher(None, a, b).ratio()
+    if a in b.replace("&", " ").split():
+        score = max(score, 0.9)
+    return score
+
+def index_path(db_path: str) -> str:
+    """On-disk location of a database's value index"""
+    digest = hashlib.sha1(os.path.abspath(db_path).encode()).hexdigest()[:16]
+    name = os.path.splitext(os.path.basename(db_path))[0]
+    return os.path.join(VALUE_INDEX_DIR, f"{name}_{digest}.sqlite")
+
+def _fts_query(text: str) -> str:
+    """OR of the text's trigrams, so misspelled terms still find candidates"""
+    text = text.lower()
+    grams = dict.fromkeys(text[i:i + 3] for i in range(len(text) - 2))
+    return " OR ".join('"' + g.replace('"', '""') + '"' for g in grams)
+
+class ValueIndex:
+    """FTS5 trigram index over one database's text values"""
+
+    def __init__(self, db_path: str, path: str | None = None):
+        self.db_path = os.path.abspath(db_path)
+        self.index_path = path or index_path(db_path)
+        self._local = threading.local()
+        self._refresh_lock = threading.Lock()
+        self._checked_at = 0.0
+        self._columns = None
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread to the index file"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.index_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _source(self) -> sqlite3.Connection:
+        return sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+
+    # ---------- refresh ----------
+
+    def _file_signature(self) -> str:
+        stat = os.stat(self.db_path)
+        wal = self.db_path + "-wal"
+        wal_stat = os.stat(wal) if os.path.exists(wal) else None
+        return f"{self.db_path}:{stat.st_mtime_ns}:{stat.st_size}:" + (
+            f"{wal_stat.st_mtime_ns}:{wal_stat.st_size}" if wal_stat else "-"
+        )
+
+    def refresh(self, force: bool = False) -> int:
+        """Re-index tables that changed since the last refresh; returns how many were re-indexed"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < REFRESH_CHECK_INTERVAL:
+            return 0
+        with self._refresh_lock:
+            self._checked_at = time.monotonic()
+            conn = self._conn()
+            signature = self._file_signature()
+            row = conn.execute("SELECT value FROM meta WHERE key = 'file_signature'").fetchone()
+            if not force and row and row[0] == signature:
+                return 0
+            with tracing.span("value_index_refresh") as span:
+                reindexed = self._refresh_tables(conn, force)
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('file_signature', ?)", (signature,)
+                )
+                conn.commit()
+                span.set("tables", reindexed)
+            self._columns = None
+            return reindexed
+
+    def _refresh_tables(self, conn: sqlite3.Connection, force: bool) -> int:
+        source = self._source()
+        try:
+            tables = [row[0] for row in source.execute(
+                "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
+            )]
+            known = dict(conn.execute("SELECT table_name, signature FROM indexed_tables"))
+            reindexed = 0
+            for table in tables:
+                info = source.execute(f'PRAGMA table_info("{table}")').fetchall()
+                try:
+                    count, max_rowid = source.execute(f'SELECT COUNT(*), MAX(rowid) FROM "{table}"').fetchone()
+                except sqlite3.OperationalError:  # WITHOUT ROWID table
+                    count, max_rowid = source.execute(f'SELECT COUNT(*), NULL FROM "{table}"').fetchone()
+                signature = f"{[(r[1], r[2]) for r in info]}:{count}:{max_rowid}"
+                if not force and known.get(table) == signature:
+                    continue
+                self._index_table(conn, source, table, info)
+                conn.execute(
+                    "INSERT OR REPLACE INTO indexed_tables (table_name, signature) VALUES (?, ?)", (table, signature)
+                )
+                reindexed += 1
+            for table in set(known) - set(tables):
+                self._drop_table(conn, table)
+            return reindexed
+        finally:
+            source.close()
+
+    def _drop_table(self, conn: sqlite3.Connection, table: str):
+        conn.execute("DELETE FROM value_rows WHERE table_name = ?", (table,))
+        conn.execute("DELETE FROM value_fts WHERE table_name = ?", (table,))
+        conn.execute("DELETE FROM indexed_columns WHERE table_name = ?", (table,))
+        conn.execute("DELETE FROM indexed_tables WHERE table_name = ?", (table,))
+
+    def _index_table(self, conn: sqlite3.Connection, source: sqlite3.Connection, table: str, info: list):
+        self._drop_table(conn, table)
+        for row in info:
+            column, col_type, is_pk = row[1], (row[2] or "").upper(), row[5]
+            if is_pk or not (not col_type or any(t in col_type for t in ("CHAR", "TEXT", "CLOB"))):
+                continue
+            distinct = source.execute(
+                f'SELECT COUNT(DISTINCT "{column}") FROM "{table}"'
+            ).fetchone()[0]
+            if not distinct or distinct > VALUE_INDEX_MAX_DISTINCT:
+                continue
+            values = [
+                (table, column, v[0]) for v in source.execute(
+                    f'SELECT DISTINCT "{column}" FROM "{table}" '
+                    f'WHERE typeof("{column}") = \'text\' AND length("{column}") <= ?',
+                    (VALUE_INDEX_MAX_LENGTH,)
+                )
+            ]
+            conn.executemany("INSERT OR IGNORE INTO value_rows (table_name, column_name, value) VALUES (?, ?, ?)", values)
+            conn.executemany("INSERT INTO value_fts (table_name, column_name, value) VALUES (?, ?, ?)", values)
+            conn.execute(
+                "INSERT OR REPLACE INTO indexed_columns (table_name, column_name, distinct_count) VALUES (?, ?, ?)",
+                (table, column, distinct)
+            )
+
+    # ---------- lookups ----------
+
+    def indexed_columns(self) -> dict:
+        """{(table, column): distinct_count} of every indexed column"""
+        self.refresh()
+        columns = self._columns
+        if columns is None:
+            columns = self._columns = {
+                (t, c): n for t, c, n in self._conn().execute(
+                    "SELECT table_name, column_name, distinct_count FROM indexed_columns"
+                )
+            }
+        return columns
+
+    def resolve_column(self, table: str, column: str):
+        """Case-insensitive (table, column) as stored in the index, or None if not indexed"""
+        for t, c in self.indexed_columns():
+            if t.lower() == table.lower() and c.lower() == column.lower():
+                return t, c
+        return None
+
+    def contains(self, table: str, column: str, value: str) -> bool:
+        """Exact (case-sensitive) membership of value in an indexed column"""
+        self.refresh()
+        return self._conn().execute(
+            "SELECT 1 FROM value_rows WHERE table_name = ? AND column_name = ? AND value = ?",
+            (table, column, value)
+        ).fetchone() is not None
+
+    def lookup(self, text: str, table: str | None = None, column: str | None = None,
+               limit: int = 5, min_similarity: float = 0.6) -> list:
+        """Closest indexed values to text, best first: [{"table", "column", "value", "similarity"}]"""
+        text = text.strip()
+        if len(text) < MIN_LOOKUP_LENGTH:
+            return []
+        self.refresh()
+        sql = "SELECT value, table_name, column_name FROM value_fts WHERE value_fts MATCH ?"
+        params = [_fts_query(text)]
+        if table:
+            sql += " AND table_name = ?"
+            params.append(table)
+        if column:
+            sql += " AND column_name = ?"
+            params.append(column)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(FTS_CANDIDATES)
+        try:
+            rows = self._conn().execute(sql, params).fetchall()
+        except sqlite3.OperationalError:
+            return []
+
+        matches = []
+        for value, t, c in rows:
+            score = similarity(text, value)
+            if score >= min_similarity:
+                matches.append({"table": t, "column": c, "value": value, "similarity": round(score, 3)})
+        matches.sort(key=lambda m: -m["similarity"])
+        return matches[:limit]
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_value_index(db_path: str) -> ValueIndex | None:
+    """Process-wide index per database (None when disabled or unavailable)"""
+    if not VALUE_INDEX_ENABLED:
+        return None
+    key = os.path.abspath(db_path)
+    index = _indexes.get(key)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(key)
+            if index is None:
+                try:
+                    index = ValueIndex(db_path)
+                except sqlite3.Error as e:
+                    print(f"Warning: Value index disabled ({str(e)})")
+                    index = False
+                _indexes[key] = index
+    return index or None
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 3:
+        print("Usage: python -m utils.value_index <db_path> <text>")
+        sys.exit(1)
+    index = get_value_index(sys.argv[1])
+    started = time.perf_counter()
+    index.refresh(force="--rebuild" in sys.argv)
+    print(f"Indexed {len(index.indexed_columns())} columns in {(time.perf_counter() - started) * 1000:.1f} ms")
+    started = time.perf_counter()
+    matches = index.lookup(sys.argv[2])
+    print(f"Lookup took {(time.perf_counter() - started) * 1e6:.0f} µs")
+    for match in matches:
+        print(f"  {match['table']}.{match['column']} = {match['value']!r} ({match['similarity']})")